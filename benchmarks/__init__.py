@@ -0,0 +1 @@
+"""Benchmarks of the node pack against an in-process mock Ollama server."""
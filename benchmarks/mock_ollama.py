@@ -0,0 +1,263 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+NANOSECONDS = 1e9
+# Generated tokens get context ids from here on.
+GENERATED_ID_OFFSET = 100000
+# Vision requests carry base64 images, far above the aiohttp default of 1 MiB.
+MAX_REQUEST_BYTES = 1024 * 1024 * 1024
+
+
+class MockOllamaServer:
+    """
+    In-process HTTP server speaking enough of the Ollama API to drive the nodes without a GPU.
+
+    Serves /api/generate and /api/chat (streaming and not), /api/embed, /api/tags and /api/ps. Every request waits
+    `latency` seconds before the first token (prompt evaluation), then emits `tokens` tokens
+    at `tokens_per_second` (0 emits them instantly). The first request for a model also
+    waits `load_duration` seconds, like a cold model. With `thinking_tokens` the answer is
+    preceded by a <think> section, skipped when the prompt contains /no_think. The
+    `num_predict` option is honoured. Like ollama, raw requests ignore `context` and return
+    none. A raw prompt, or a final assistant message on /api/chat (continued like a
+    prefill), containing </think> is answered without thinking. Chat requests report in
+    `prompt_eval_count` only the messages after the prefix shared with the previous chat
+    request, like the server prompt cache.
+
+    Usage:
+        with MockOllamaServer(latency=0.05, tokens_per_second=200) as server:
+            OllamaGenerate().ollama_generate(..., url=server.url, ...)
+    """
+
+    def __init__(self, latency=0.0, tokens_per_second=0.0, tokens=32, load_duration=0.0, thinking_tokens=0,
+                 models=("mock-model:latest",), host="127.0.0.1", port=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.thinking_tokens = thinking_tokens
+        self.load_duration = load_duration
+        self.models = list(models)
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.loaded = set()
+        self.chat_prompt_tokens = []
+        self.chat_messages = []
+        self.embed_batches = []
+        self._chat_prefix = []
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def config(self):
+        return {"latency": self.latency, "tokens_per_second": self.tokens_per_second, "tokens": self.tokens,
+                "thinking_tokens": self.thinking_tokens, "load_duration": self.load_duration, "models": self.models}
+
+    def _app(self):
+        app = web.Application(client_max_size=MAX_REQUEST_BYTES)
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_post("/api/embed", self.embed)
+        app.router.add_get("/api/tags", self.tags)
+        app.router.add_get("/api/ps", self.ps)
+        return app
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+
+        async def serve():
+            self._runner = web.AppRunner(self._app())
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            self.port = site._server.sockets[0].getsockname()[1]
+
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(serve(), self._loop).result(timeout=10)
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @staticmethod
+    def _timestamp():
+        return datetime.now(timezone.utc).isoformat()
+
+    async def _load(self, model):
+        if model in self.loaded:
+            return 0.0
+        self.loaded.add(model)
+        await asyncio.sleep(self.load_duration)
+        return self.load_duration
+
+    def _sequence(self, prompt, prefill=""):
+        """
+        The full token sequence of the answer and the index this request starts from.
+        """
+        sequence = [f"token{index} " for index in range(self.tokens)]
+        thinks = self.thinking_tokens and "/no_think" not in prompt
+        if thinks:
+            sequence = ["<think>"] + [f"thought{index} " for index in range(self.thinking_tokens)] + ["</think>"] + sequence
+        start = sequence.index("</think>") + 1 if thinks and "</think>" in prefill else 0
+        return sequence, start
+
+    async def generate(self, request):
+        body = await request.json()
+        self.requests += 1
+        model = body.get("model", "")
+        started = time.perf_counter()
+        load_duration = await self._load(model)
+
+        prompt = body.get("prompt") or ""
+        if not prompt and not body.get("images"):
+            # An empty prompt only loads the model.
+            return web.json_response({"model": model, "created_at": self._timestamp(), "response": "", "done": True,
+                                      "done_reason": "load", "total_duration": int(load_duration * NANOSECONDS),
+                                      "load_duration": int(load_duration * NANOSECONDS)})
+
+        await asyncio.sleep(self.latency)
+        prompt_evaluated = time.perf_counter()
+        token_delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        raw = body.get("raw", False)
+        sequence, start = self._sequence(prompt, prompt if raw else "")
+        num_predict = (body.get("options") or {}).get("num_predict") or -1
+        end = len(sequence) if num_predict < 0 else min(start + num_predict, len(sequence))
+        tokens = sequence[start:end]
+        prompt_tokens = len(prompt.split()) + len((body.get("system") or "").split())
+        context = None
+        if not raw:
+            context = list(body.get("context") or []) + list(range(prompt_tokens))
+            context += [GENERATED_ID_OFFSET + index for index in range(start, end)]
+
+        def final(text):
+            finished = time.perf_counter()
+            result = {"model": model, "created_at": self._timestamp(), "response": text, "done": True,
+                      "done_reason": "length" if end < len(sequence) else "stop",
+                      "total_duration": int((finished - started) * NANOSECONDS),
+                      "load_duration": int(load_duration * NANOSECONDS),
+                      "prompt_eval_count": prompt_tokens,
+                      "prompt_eval_duration": int((prompt_evaluated - started - load_duration) * NANOSECONDS),
+                      "eval_count": len(tokens),
+                      "eval_duration": int((finished - prompt_evaluated) * NANOSECONDS)}
+            if context is not None:
+                result["context"] = context
+            return result
+
+        if body.get("stream", True):
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for token in tokens:
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+                chunk = {"model": model, "created_at": self._timestamp(), "response": token, "done": False}
+                await response.write(json.dumps(chunk).encode("utf-8") + b"\n")
+            await response.write(json.dumps(final("")).encode("utf-8") + b"\n")
+            await response.write_eof()
+            return response
+
+        if token_delay:
+            await asyncio.sleep(token_delay * len(tokens))
+        return web.json_response(final("".join(tokens)))
+
+    async def chat(self, request):
+        body = await request.json()
+        self.requests += 1
+        model = body.get("model", "")
+        started = time.perf_counter()
+        load_duration = await self._load(model)
+
+        self.chat_messages.append(body.get("messages") or [])
+        messages = [json.dumps(message, sort_keys=True) for message in body.get("messages") or []]
+        cached = 0
+        while cached < min(len(messages), len(self._chat_prefix)) and messages[cached] == self._chat_prefix[cached]:
+            cached += 1
+        prompt_tokens = sum(len(json.loads(message).get("content", "").split()) for message in messages[cached:])
+        self.chat_prompt_tokens.append(prompt_tokens)
+
+        await asyncio.sleep(self.latency)
+        prompt_evaluated = time.perf_counter()
+        token_delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        turns = body.get("messages") or [{}]
+        prefill = turns[-1].get("content", "") if turns[-1].get("role") == "assistant" else ""
+        prompt = next((turn.get("content", "") for turn in reversed(turns) if turn.get("role") == "user"), "")
+        sequence, start = self._sequence(prompt, prefill)
+        num_predict = (body.get("options") or {}).get("num_predict") or -1
+        end = len(sequence) if num_predict < 0 else min(start + num_predict, len(sequence))
+        tokens = sequence[start:end]
+        reply = {"role": "assistant", "content": "".join(tokens)}
+        self._chat_prefix = messages + [json.dumps(reply, sort_keys=True)]
+
+        def final(text):
+            finished = time.perf_counter()
+            return {"model": model, "created_at": self._timestamp(), "message": {"role": "assistant", "content": text},
+                    "done": True, "done_reason": "length" if end < len(sequence) else "stop",
+                    "total_duration": int((finished - started) * NANOSECONDS),
+                    "load_duration": int(load_duration * NANOSECONDS),
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int((prompt_evaluated - started - load_duration) * NANOSECONDS),
+                    "eval_count": len(tokens),
+                    "eval_duration": int((finished - prompt_evaluated) * NANOSECONDS)}
+
+        if body.get("stream", True):
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+            for token in tokens:
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+                chunk = {"model": model, "created_at": self._timestamp(),
+                         "message": {"role": "assistant", "content": token}, "done": False}
+                await response.write(json.dumps(chunk).encode("utf-8") + b"\n")
+            await response.write(json.dumps(final("")).encode("utf-8") + b"\n")
+            await response.write_eof()
+            return response
+
+        if token_delay:
+            await asyncio.sleep(token_delay * len(tokens))
+        return web.json_response(final(reply["content"]))
+
+    async def embed(self, request):
+        body = await request.json()
+        self.requests += 1
+        model = body.get("model", "")
+        started = time.perf_counter()
+        load_duration = await self._load(model)
+        texts = body.get("input") or []
+        texts = [texts] if isinstance(texts, str) else texts
+        self.embed_batches.append(len(texts))
+        await asyncio.sleep(self.latency)
+        # Deterministic 8 dimensional vectors derived from the text.
+        embeddings = [[((hash_index * 31 + ord(char)) % 97) / 97.0 for hash_index, char in enumerate((text + "........")[:8])]
+                      for text in texts]
+        return web.json_response({"model": model, "embeddings": embeddings,
+                                  "total_duration": int((time.perf_counter() - started) * NANOSECONDS),
+                                  "load_duration": int(load_duration * NANOSECONDS),
+                                  "prompt_eval_count": sum(len(text.split()) for text in texts)})
+
+    async def tags(self, request):
+        return web.json_response({"models": [{"model": model, "name": model, "digest": f"mock-{model}",
+                                              "modified_at": self._timestamp(), "size": 0} for model in self.models]})
+
+    async def ps(self, request):
+        return web.json_response({"models": [{"model": model, "name": model, "digest": f"mock-{model}", "size": 0}
+                                             for model in sorted(self.loaded)]})
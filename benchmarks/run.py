@@ -0,0 +1,186 @@
+"""
+Benchmark the client side overhead of the Ollama nodes against an in-process mock server.
+
+Run from the repository root:
+
+    python -m benchmarks.run --output bench_results.json
+
+Each case is repeated `--repeat` times and reports wall time statistics together with the
+mean client overhead recorded by the metrics collector (encoding plus request time not
+spent inside the mock server).
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from nodes.bcknt import BaseAgent
+from nodes.bcknt.MultiNodeExecutor import MultiNodeExecutor
+from nodes.ollama import OllamaConnectivityV2, OllamaGenerateV2, OllamaVision
+from nodes.ollama.image_encoder import IMAGE_CACHE
+from nodes.ollama.metrics import METRICS
+
+from .mock_ollama import MockOllamaServer
+
+MODEL = "mock-model:latest"
+
+
+def random_images(batch_size, resolution, seed):
+    rng = np.random.default_rng(seed)
+    return rng.random((batch_size, resolution, resolution, 3), dtype=np.float32)
+
+
+def connectivity(server):
+    return {"url": server.url, "model": MODEL, "keep_alive": 5, "keep_alive_unit": "minutes"}
+
+
+def measure(name, params, run, repeat, setup=None):
+    """
+    Time `run(prepared)` `repeat` times, preparing fresh inputs with `setup(iteration)` outside the timing.
+
+    The encoded image cache is cleared first, so every case pays for its own image encoding.
+    """
+    times = []
+    METRICS.reset()
+    IMAGE_CACHE.clear()
+    image_hits = IMAGE_CACHE.stats()["hits"]
+    for iteration in range(repeat):
+        prepared = setup(iteration) if setup is not None else None
+        started = time.perf_counter()
+        run(prepared)
+        times.append(time.perf_counter() - started)
+
+    series = METRICS.summary()
+    requests = sum(entry["requests"] for entry in series)
+    overhead = sum(entry["client_overhead"] for entry in series)
+    return {
+        "benchmark": name,
+        "params": params,
+        "repeat": repeat,
+        "wall_seconds": {
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.fmean(times),
+            "max": max(times),
+        },
+        "requests": requests,
+        "mean_client_overhead_seconds": overhead / requests if requests else 0.0,
+        "image_cache_hits": IMAGE_CACHE.stats()["hits"] - image_hits,
+    }
+
+
+def bench_vision(server, batch_sizes, resolutions, repeat):
+    node = OllamaVision()
+    for mode in ("batch", "per_image"):
+        for batch_size in batch_sizes:
+            for resolution in resolutions:
+                def run(images):
+                    node.ollama_vision(images, "describe", "disable", server.url, MODEL, 0, 5, "text",
+                                       mode=mode, max_concurrency=4)
+                yield measure("OllamaVision", {"mode": mode, "batch_size": batch_size, "resolution": resolution}, run,
+                              repeat, setup=lambda iteration: random_images(batch_size, resolution, iteration))
+
+
+def bench_generate_v2(server, batch_sizes, resolutions, repeat):
+    node = OllamaGenerateV2()
+    for stream in (False, True):
+        def run(_):
+            node.ollama_generate_v2("system", "prompt", "text", False, connectivity=connectivity(server), stream=stream)
+        yield measure("OllamaGenerateV2", {"stream": stream, "batch_size": 0, "resolution": 0}, run, repeat)
+
+        for batch_size in batch_sizes:
+            for resolution in resolutions:
+                def run(images):
+                    node.ollama_generate_v2("system", "prompt", "text", False, connectivity=connectivity(server),
+                                            images=images, stream=stream)
+                yield measure("OllamaGenerateV2", {"stream": stream, "batch_size": batch_size, "resolution": resolution},
+                              run, repeat, setup=lambda iteration: random_images(batch_size, resolution, iteration))
+
+
+def bench_agent(server, repeat):
+    agent = BaseAgent()
+    kwargs = {**connectivity(server), "keep_context": False, "format": "text"}
+    yield measure("BaseAgent.run_agent", {}, lambda _: agent.run_agent(**kwargs), repeat)
+
+
+def bench_executor(server, widths, repeat):
+    for width in widths:
+        configs = [{'node': OllamaConnectivityV2}] + [
+            {
+                'node': OllamaGenerateV2,
+                'fixed_kwargs': {'system': "system", 'prompt': f"prompt {index}"},
+                'inputs': [('OllamaConnectivityV2', [('connection', 'connectivity')])],
+            }
+            for index in range(width)
+        ]
+        executor = MultiNodeExecutor(configs, max_workers=width + 1)
+        kwargs = {**connectivity(server), "keep_context": False, "format": "text"}
+        yield measure("MultiNodeExecutor", {"width": width}, lambda _: executor.execute_nodes(**kwargs), repeat)
+
+
+def run_benchmarks(server, batch_sizes=(1, 4), resolutions=(256, 512), widths=(1, 4), repeat=3):
+    """
+    Run every benchmark against `server`.
+
+    Returns:
+        list[dict]: One result per benchmark case.
+    """
+    # Start the backend loop and open the pooled connection outside the measurements.
+    OllamaGenerateV2().ollama_generate_v2("system", "warm up", "text", False, connectivity=connectivity(server))
+
+    results = []
+    results.extend(bench_vision(server, batch_sizes, resolutions, repeat))
+    results.extend(bench_generate_v2(server, batch_sizes, resolutions, repeat))
+    results.extend(bench_agent(server, repeat))
+    results.extend(bench_executor(server, widths, repeat))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--widths", type=int, nargs="+", default=[1, 4, 8],
+                        help="Number of parallel generate nodes in the executor benchmark.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mock seconds before the first token.")
+    parser.add_argument("--tokens", type=int, default=32, help="Mock tokens per response.")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Mock token rate, 0 is instant.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with MockOllamaServer(latency=args.latency, tokens=args.tokens, tokens_per_second=args.tokens_per_second,
+                          models=(MODEL,)) as server:
+        results = run_benchmarks(server, args.batch_sizes, args.resolutions, args.widths, args.repeat)
+        report = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "environment": {"python": sys.version.split()[0], "platform": platform.platform(),
+                            "machine": platform.machine()},
+            "server": server.config(),
+            "results": results,
+        }
+
+    for result in results:
+        params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['benchmark']:<22} {params:<48} median {result['wall_seconds']['median'] * 1000:8.1f} ms  "
+              f"overhead {result['mean_client_overhead_seconds'] * 1000:7.1f} ms/request", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -16,13 +16,17 @@ from .MultiNodeExecutor import MultiNodeExecutor
     
 class BaseAgent:
     _fine_tune = False
+    _input_types_cache = {}
     
     def __init__(self, options=None):
         self.model_options = options
+        self._executor = None
 
             
     @classmethod 
     def set_fine_tune(cls, fine_tune):
+        if fine_tune != cls._fine_tune:
+            BaseAgent._input_types_cache.pop(cls, None)
         cls._fine_tune = fine_tune
         
     @classmethod
@@ -33,6 +37,14 @@ class BaseAgent:
     
     @classmethod
     def INPUT_TYPES(cls):
+        """
+        The composed schema is cached per agent class, since ComfyUI asks for it on every /object_info call.
+        """
+        is_fine_tune = cls.is_fine_tune()
+        cached = BaseAgent._input_types_cache.get(cls)
+        if cached is not None and cached[0] == is_fine_tune:
+            return cached[1]
+
         connectivity_inputs = OllamaConnectivityV2.INPUT_TYPES()
         generate_inputs = OllamaGenerateV2.INPUT_TYPES()
         options_inputs = OllamaOptionsV2.INPUT_TYPES()
@@ -42,7 +54,6 @@ class BaseAgent:
         generate_inputs = MultiNodeExecutor.remove_inputs(generate_inputs, ['system', 'prompt'])
         system_inputs = MultiNodeExecutor.remove_inputs(system_inputs, [ 'model'])
         action_inputs = MultiNodeExecutor.remove_inputs(action_inputs, [ 'model'])
-        is_fine_tune = cls.is_fine_tune()
         inputs = [
             system_inputs,
             action_inputs,
@@ -52,6 +63,7 @@ class BaseAgent:
         
         inputs = inputs + [options_inputs] if is_fine_tune else inputs 
         inputs = merge_input_types(inputs)
+        BaseAgent._input_types_cache[cls] = (is_fine_tune, inputs)
         return inputs
     
     RETURN_TYPES = ("STRING","STRING", "STRING")
@@ -60,6 +72,17 @@ class BaseAgent:
     FUNCTION = "run_agent"
     
     def run_agent(self, **kwargs):
+        results = self.get_executor().execute_nodes(**kwargs)
+
+        return (results['CleanResponse'], results['SystemPromptLoader'], results['ActionPromptLoader'])
+
+    def get_executor(self):
+        """
+        Build the node graph once per agent instance, so its execution plan is compiled only once.
+        """
+        if self._executor is not None:
+            return self._executor
+
         print("SELF OPTIONS:", self.model_options)
         ollama_options = self.get_default_options(OllamaOptionsV2) if self.model_options is None else self.model_options
         print ("Ollama options:", ollama_options)
@@ -85,10 +108,8 @@ class BaseAgent:
             }
         ]
 
-        executor = MultiNodeExecutor(node_configs)
-        results = executor.execute_nodes(**kwargs)
-
-        return (results['CleanResponse'], results['SystemPromptLoader'], results['ActionPromptLoader'])
+        self._executor = MultiNodeExecutor(node_configs)
+        return self._executor
         
     
     def get_default_options(self, node):
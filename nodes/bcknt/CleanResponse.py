@@ -1,5 +1,6 @@
+from ..utils.think_tags import DEFAULT_THINK_TAGS, ThinkTagStripper
+
 
-import re
 class CleanResponse:
     """
     A class to remove thinking text returned by the model
@@ -14,6 +15,13 @@ class CleanResponse:
                     "default": "",
                     "tooltip": "The response to be cleaned.",
                 }),
+            },
+            "optional": {
+                "tags": ("STRING", {
+                    "multiline": False,
+                    "default": ", ".join(DEFAULT_THINK_TAGS),
+                    "tooltip": "Comma separated names of the tags whose content is removed.",
+                }),
             }
         }
         
@@ -23,20 +31,19 @@ class CleanResponse:
     FUNCTION = "clean_response"
     CATEGORY = "BlackNightTales/utils"
     
-    def clean_response(self, model_response):
+    def clean_response(self, model_response, tags=DEFAULT_THINK_TAGS):
         """
-        Clean the model response by removing thinking text 
-        inside the tags <think></think> or <thinking></thinking> by regexp.
+        Clean the model response by removing thinking text
+        inside the tags <think></think> or <thinking></thinking> in a single pass.
         
         Args:
             model_response (str): The response to be cleaned.
+            tags: Tag names to remove, a list or a comma separated string.
         
         Returns:
             str: The cleaned response.
         """
 
-        cleaned_text = re.sub(r"<think>.*?</think>", "", model_response, flags=re.DOTALL)
-        cleaned_text = re.sub(r"<thinking>.*?</thinking>", "", cleaned_text, flags=re.DOTALL)
+        cleaned_text = ThinkTagStripper(tags).strip(model_response)
         
         return (cleaned_text.strip(),)
-        
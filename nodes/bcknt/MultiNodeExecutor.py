@@ -1,10 +1,36 @@
-from typing import List, Dict, Any, Type, Union, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Any, Type, Union, Tuple, FrozenSet, Mapping
+
+
+@dataclass(frozen=True)
+class NodePlan:
+    """
+    Plan compilado de un nodo: todo lo que no depende de los argumentos de ejecución.
+    """
+    alias: str
+    node_class: Type
+    function_name: str
+    required_params: FrozenSet[str]
+    valid_params: FrozenSet[str]
+    unwrap_params: FrozenSet[str]  # Parámetros cuyo valor en tupla se reduce al primer elemento
+    defaults: Mapping[str, Any]
+    injections: Tuple[Tuple[str, Any], ...]
+    bindings: Tuple[Tuple[str, int, str], ...]  # (alias de la dependencia, índice de salida, parámetro)
+    fixed_kwargs: Mapping[str, Any]
+    dependencies: FrozenSet[str]
+
 
 class MultiNodeExecutor:
-    def __init__(self, node_configs: List[Dict[str, Any]]):
+    def __init__(self, node_configs: List[Dict[str, Any]], max_workers: int = 4):
         """
         Inicializa el ejecutor de nodos.
 
+        Los nodos forman un grafo de dependencias a partir de sus 'inputs' y los nodos
+        independientes se ejecutan en paralelo en un pool de hilos. INPUT_TYPES, alias,
+        valores por defecto e índices de salida se resuelven una sola vez en un plan.
+
         :param node_configs: Lista de configuraciones de nodos. Cada configuración debe incluir:
             - 'node': La clase del nodo (requerido).
             - 'fixed_kwargs': Diccionario de argumentos fijos (opcional, por defecto {}).
@@ -13,6 +39,7 @@ class MultiNodeExecutor:
                 - Una lista de tuplas: [(node_alias, param_name)] para múltiples dependencias.
                 - Un diccionario: {'param_name': value} para inyección directa.
             - 'alias': Alias opcional del nodo (por defecto: nombre de la clase o nombre con índice).
+        :param max_workers: Número máximo de nodos ejecutándose a la vez (1 ejecuta en serie).
         """
         self.node_configs = []
         alias_counter = {}  # Contador para nombres de clase duplicados
@@ -40,201 +67,240 @@ class MultiNodeExecutor:
             self.node_configs.append(config_copy)
 
         self.alias_to_class = alias_to_class
+        self.max_workers = max_workers
+        self.plans = {config['alias']: self._compile_node(config) for config in self.node_configs}
+        self.dependencies = {alias: plan.dependencies for alias, plan in self.plans.items()}
+        self.execution_order = self._topological_order()
         self.results = {}
         self.instances = {}
 
     @staticmethod
     def remove_inputs(input_data: Dict[str, Any], input_names: List[str]) -> Dict[str, Any]:
         """
-        Removes specified inputs from the input dictionary.
+        Returns a copy of the input dictionary without the specified inputs.
 
-        :param input_data: The input dictionary.
+        :param input_data: The input dictionary, left untouched.
         :param input_names: List of input names to remove.
-        :return: The modified input dictionary.
+        :return: The filtered input dictionary.
         """
-        if 'required' in input_data:
-            for name in input_names:
-                input_data['required'].pop(name, None)
-        if 'optional' in input_data:
-            for name in input_names:
-                input_data['optional'].pop(name, None)
-        return input_data
+        filtered = dict(input_data)
+        for section in ('required', 'optional'):
+            if section in input_data:
+                filtered[section] = {k: v for k, v in input_data[section].items() if k not in input_names}
+        return filtered
 
-    def _get_node_params(self, node_class: Type) -> Dict[str, Any]:
+    def _compile_node(self, config: Dict[str, Any]) -> NodePlan:
         """
-        Obtiene los parámetros requeridos y opcionales del nodo basados en INPUT_TYPES.
+        Compila la configuración de un nodo en un NodePlan inmutable.
 
-        :param node_class: La clase del nodo.
-        :return: Diccionario con parámetros 'required' y 'optional'.
+        :param config: La configuración del nodo (con alias ya asignado).
+        :return: El plan del nodo.
         """
+        node_class = config['node']
+        alias = config['alias']
         input_types = node_class.INPUT_TYPES()
-        return {
-            'required': input_types.get('required', {}),
-            'optional': input_types.get('optional', {})
-        }
+        params = {**input_types.get('optional', {}), **input_types.get('required', {})}
+        required_params = frozenset(input_types.get('required', {}).keys())
+        valid_params = frozenset(params.keys())
 
-    def _prepare_node_kwargs(self, node_class: Type, global_kwargs: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Prepara los argumentos clave para el nodo.
-
-        :param node_class: La clase del nodo.
-        :param global_kwargs: Argumentos clave globales.
-        :param config: La configuración del nodo.
-        :return: Diccionario de argumentos clave para el nodo.
-        """
-        params = self._get_node_params(node_class)
-        required_params = set(params['required'].keys())
-        optional_params = set(params['optional'].keys())
-
-        # Inicializar con valores por defecto para parámetros opcionales
-        node_kwargs = {
+        # Valores por defecto para parámetros opcionales
+        defaults = {
             k: v[1]['default']
-            for k, v in params['optional'].items()
-            if 'default' in v[1]
+            for k, v in input_types.get('optional', {}).items()
+            if len(v) > 1 and 'default' in v[1]
         }
+        # Extraer el primer elemento de las tuplas para parámetros que no son listas/tuplas en INPUT_TYPES
+        unwrap_params = frozenset(k for k, v in params.items() if not isinstance(v[0], (list, tuple)))
 
-        # Añadir global_kwargs para parámetros válidos
-        for k in required_params | optional_params:
-            if k in global_kwargs:
-                node_kwargs[k] = global_kwargs[k]
-
-        # Procesar inputs
+        injections = []
+        bindings = []
+        dependencies = set()
         inputs = config.get('inputs', [])
         if isinstance(inputs, dict):
             # Inyección directa
             for param, value in inputs.items():
                 if not isinstance(value, tuple):
                     value = (value,)  # Convertir a tupla si no lo es
-                if param in required_params | optional_params:
-                    node_kwargs[param] = value
-                else:
+                if param not in valid_params:
                     raise ValueError(f"Parámetro '{param}' no válido para {node_class.__name__}")
+                injections.append((param, value))
         else:
             # Dependencias
-            dependencies = [inputs] if isinstance(inputs, tuple) else inputs
-            self._process_dependencies(node_class, dependencies, node_kwargs, required_params, optional_params)
+            for dep in [inputs] if isinstance(inputs, tuple) else inputs:
+                bindings.extend(self._compile_dependency(node_class, alias, dep, valid_params))
+                dependencies.add(dep[0])
+
+        return NodePlan(
+            alias=alias,
+            node_class=node_class,
+            function_name=getattr(node_class, 'FUNCTION', 'execute'),
+            required_params=required_params,
+            valid_params=valid_params,
+            unwrap_params=unwrap_params,
+            defaults=MappingProxyType(defaults),
+            injections=tuple(injections),
+            bindings=tuple(bindings),
+            fixed_kwargs=MappingProxyType(dict(config.get('fixed_kwargs', {}))),
+            dependencies=frozenset(dependencies),
+        )
+
+    def _compile_dependency(self, node_class: Type, alias: str, dep: Tuple[str, Union[str, List[Tuple[str, str]]]], valid_params: FrozenSet[str]) -> List[Tuple[str, int, str]]:
+        """
+        Resuelve una dependencia a pares (índice de salida, parámetro).
 
-        # Añadir fixed_kwargs
-        fixed_kwargs = config.get('fixed_kwargs', {})
-        node_kwargs.update(fixed_kwargs)
+        :param node_class: La clase del nodo.
+        :param alias: El alias del nodo.
+        :param dep: Dependencia (node_alias, param_name) o (node_alias, [(salida, parámetro)]).
+        :param valid_params: Conjunto de nombres de parámetros del nodo.
+        :return: Lista de (alias de la dependencia, índice de salida, parámetro).
+        """
+        if len(dep) != 2:
+            raise ValueError(f"Formato inválido en inputs para {node_class.__name__}: {dep}")
+        dep_node, dep_spec = dep  # dep_node es el alias
+
+        if dep_node not in self.alias_to_class:
+            raise ValueError(f"Dependencia {dep_node} no encontrada para {alias}")
+
+        # Obtener RETURN_NAMES del nodo dependiente
+        return_names = getattr(self.alias_to_class[dep_node], 'RETURN_NAMES', None)
+        if return_names is None:
+            raise ValueError(f"El nodo {dep_node} no tiene RETURN_NAMES definido")
+
+        if isinstance(dep_spec, str):
+            # Caso 1: Coincidencia automática de nombres
+            mapping = [(dep_spec, dep_spec)]
+        elif isinstance(dep_spec, list):
+            # Caso 2: Mapeo explícito
+            mapping = dep_spec
+        else:
+            raise ValueError(f"Especificación de dependencia inválida para {dep_node}: {dep_spec}")
+
+        bindings = []
+        for out_name, in_name in mapping:
+            if out_name not in return_names:
+                raise ValueError(f"'{out_name}' no encontrado en RETURN_NAMES de {dep_node}")
+            if in_name not in valid_params:
+                raise ValueError(f"Input '{in_name}' no válido para {node_class.__name__}")
+            bindings.append((dep_node, return_names.index(out_name), in_name))
+        return bindings
+
+    def _topological_order(self) -> List[str]:
+        """
+        Ordena los alias topológicamente, respetando el orden de la lista ante empates.
 
-        return node_kwargs
+        :return: Lista de alias en un orden de ejecución válido.
+        """
+        pending = {alias: set(deps) for alias, deps in self.dependencies.items()}
+        order = []
+        while pending:
+            ready = [alias for alias, deps in pending.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependencias circulares entre los nodos: {sorted(pending)}")
+            for alias in ready:
+                del pending[alias]
+                order.append(alias)
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return order
+
+    def _prepare_node_kwargs(self, plan: NodePlan, global_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Prepara los argumentos clave para el nodo a partir de su plan.
 
-    def _process_dependencies(self, node_class: Type, dependencies: List[Tuple[str, Union[str, List[Tuple[str, str]]]]], node_kwargs: Dict[str, Any], required_params: set, optional_params: set):
+        :param plan: El plan del nodo.
+        :param global_kwargs: Argumentos clave globales.
+        :return: Diccionario de argumentos clave para el nodo.
         """
-        Procesa las dependencias y añade los valores correspondientes a node_kwargs.
+        node_kwargs = dict(plan.defaults)
 
-        :param node_class: La clase del nodo.
-        :param dependencies: Lista de dependencias.
-        :param node_kwargs: Diccionario a actualizar con valores de dependencias.
-        :param required_params: Conjunto de nombres de parámetros requeridos.
-        :param optional_params: Conjunto de nombres de parámetros opcionales.
-        """
-        for dep in dependencies:
-            if len(dep) != 2:
-                raise ValueError(f"Formato inválido en inputs para {node_class.__name__}: {dep}")
-            dep_node, dep_spec = dep  # dep_node es el alias
-
-            if dep_node not in self.results:
-                raise ValueError(f"Dependencia {dep_node} no encontrada para {node_class.__name__}")
-
-            # Obtener la clase del nodo dependiente
-            dep_class = self.alias_to_class[dep_node]
-
-            # Obtener RETURN_NAMES del nodo dependiente
-            return_names = getattr(dep_class, 'RETURN_NAMES', None)
-            if return_names is None:
-                raise ValueError(f"El nodo {dep_node} no tiene RETURN_NAMES definido")
-
-            # Obtener el resultado del nodo dependiente
-            dep_result = self.results[dep_node]
-
-            if isinstance(dep_spec, str):
-                # Caso 1: Coincidencia automática de nombres
-                if dep_spec in return_names:
-                    index = return_names.index(dep_spec)
-                    if dep_spec in required_params | optional_params:
-                        node_kwargs[dep_spec] = dep_result[index]
-                    else:
-                        raise ValueError(f"Input '{dep_spec}' no válido para {node_class.__name__}")
-                else:
-                    raise ValueError(f"'{dep_spec}' no encontrado en RETURN_NAMES de {dep_node}")
-            elif isinstance(dep_spec, list):
-                # Caso 2: Mapeo explícito
-                for out_name, in_name in dep_spec:
-                    if out_name in return_names:
-                        index = return_names.index(out_name)
-                        if in_name in required_params | optional_params:
-                            node_kwargs[in_name] = dep_result[index]
-                        else:
-                            raise ValueError(f"Input '{in_name}' no válido para {node_class.__name__}")
-                    else:
-                        raise ValueError(f"'{out_name}' no encontrado en RETURN_NAMES de {dep_node}")
-            else:
-                raise ValueError(f"Especificación de dependencia inválida para {dep_node}: {dep_spec}")
+        # Añadir global_kwargs para parámetros válidos
+        for k in plan.valid_params:
+            if k in global_kwargs:
+                node_kwargs[k] = global_kwargs[k]
+
+        node_kwargs.update(plan.injections)
+        for dep_node, index, in_name in plan.bindings:
+            node_kwargs[in_name] = self.results[dep_node][index]
 
-    def _execute_node(self, node_class: Type, node_kwargs: Dict[str, Any], alias: str) -> Any:
+        # Añadir fixed_kwargs
+        node_kwargs.update(plan.fixed_kwargs)
+        return node_kwargs
+
+    def _execute_node(self, plan: NodePlan, node_kwargs: Dict[str, Any]) -> Any:
         """
         Ejecuta el método del nodo con los argumentos clave proporcionados.
 
-        :param node_class: La clase del nodo.
+        :param plan: El plan del nodo.
         :param node_kwargs: Argumentos clave para el método del nodo.
-        :param alias: El alias del nodo.
         :return: El resultado de la ejecución del nodo.
         """
-        # Obtener el nombre del método de ejecución (por defecto 'execute')
-        function_name = getattr(node_class, 'FUNCTION', 'execute')
-
         # Obtener o crear la instancia del nodo
-        if alias not in self.instances:
-            self.instances[alias] = node_class()
-        node_instance = self.instances[alias]
-
-        # Obtener el método del nodo
-        node_method = getattr(node_instance, function_name)
-
-        # Obtener parámetros requeridos y opcionales
-        params = self._get_node_params(node_class)
-        required_params = set(params['required'].keys())
-        optional_params = set(params['optional'].keys())
+        node_instance = self.instances.get(plan.alias)
+        if node_instance is None:
+            node_instance = self.instances[plan.alias] = plan.node_class()
 
         # Verificar parámetros requeridos faltantes
-        missing_params = required_params - set(node_kwargs.keys())
+        missing_params = plan.required_params - node_kwargs.keys()
         if missing_params:
-            raise ValueError(f"Faltan parámetros requeridos para {alias}: {missing_params}")
-
-        # Ajustar node_kwargs: extraer el primer elemento de las tuplas para parámetros que no son listas/tuplas en INPUT_TYPES
-        adjusted_kwargs = {}
-        for param, value in node_kwargs.items():
-            param_info = params['required'].get(param, params['optional'].get(param))
-            if param_info:
-                expected_type = param_info[0]  # Tipo esperado según INPUT_TYPES
-                # Si el valor es una tupla y el tipo esperado no es una lista o tupla, extraer el primer elemento
-                if isinstance(value, tuple) and not isinstance(expected_type, (list, tuple)):
-                    adjusted_kwargs[param] = value[0]
-                else:
-                    adjusted_kwargs[param] = value
-            else:
-                adjusted_kwargs[param] = value  # Mantener el valor original si no hay info de tipo
+            raise ValueError(f"Faltan parámetros requeridos para {plan.alias}: {set(missing_params)}")
+
+        adjusted_kwargs = {
+            param: value[0] if param in plan.unwrap_params and isinstance(value, tuple) else value
+            for param, value in node_kwargs.items()
+        }
 
         # Ejecutar el método con los argumentos ajustados
-        return node_method(**adjusted_kwargs)
+        return getattr(node_instance, plan.function_name)(**adjusted_kwargs)
 
     def execute_nodes(self, **global_kwargs) -> Dict[str, Any]:
         """
         Ejecuta todos los nodos y devuelve un diccionario con los resultados.
 
+        Un nodo se lanza en cuanto sus dependencias han terminado, por lo que los nodos
+        independientes se ejecutan en paralelo hasta `max_workers` a la vez.
+
         :param global_kwargs: Argumentos clave globales disponibles para todos los nodos.
         :return: Diccionario con los resultados de cada nodo, usando el alias como clave.
         """
         self.results = {}
         self.instances = {}
 
-        for config in self.node_configs:
-            node_class = config['node']
-            alias = config['alias']
-            node_kwargs = self._prepare_node_kwargs(node_class, global_kwargs, config)
-            result = self._execute_node(node_class, node_kwargs, alias)
-            self.results[alias] = result
+        if self.max_workers <= 1:
+            for alias in self.execution_order:
+                plan = self.plans[alias]
+                self.results[alias] = self._execute_node(plan, self._prepare_node_kwargs(plan, global_kwargs))
+        else:
+            self._execute_concurrently(global_kwargs)
+
+        # Devolver los resultados en el orden de la configuración
+        return {alias: self.results[alias] for alias in self.plans}
+
+    def _execute_concurrently(self, global_kwargs: Dict[str, Any]):
+        """
+        Ejecuta el grafo en un pool de hilos. Los argumentos se preparan en el hilo principal,
+        de modo que los resultados solo se escriben desde un hilo.
 
-        return self.results
\ No newline at end of file
+        :param global_kwargs: Argumentos clave globales disponibles para todos los nodos.
+        """
+        remaining = {alias: set(deps) for alias, deps in self.dependencies.items()}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcknt-node") as pool:
+            try:
+                while remaining or running:
+                    for alias in [alias for alias in self.execution_order if alias in remaining and not remaining[alias]]:
+                        del remaining[alias]
+                        plan = self.plans[alias]
+                        node_kwargs = self._prepare_node_kwargs(plan, global_kwargs)
+                        running[pool.submit(self._execute_node, plan, node_kwargs)] = alias
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        alias = running.pop(future)
+                        self.results[alias] = future.result()
+                        for deps in remaining.values():
+                            deps.discard(alias)
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
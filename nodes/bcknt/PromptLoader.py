@@ -1,5 +1,75 @@
 from .prompt_paths import SYSTEM_AGENT_PROMPTS_PATH, PROMPT_AGENT_PROMPTS_PATH
 import os
+import re
+import threading
+
+PLACEHOLDER_PATTERN = re.compile(r"\[(\w+)\]")
+
+
+class PromptTemplate:
+    """
+    A prompt pre-parsed into literal segments and [placeholder] names, rendered with a single join.
+    """
+    __slots__ = ("text", "literals", "names")
+
+    def __init__(self, text):
+        self.text = text
+        parts = PLACEHOLDER_PATTERN.split(text)
+        self.literals = parts[0::2]
+        self.names = parts[1::2]
+
+    def render(self, **args):
+        """
+        Replace the placeholders found in `args`, falsy values become empty strings
+        and unknown placeholders are left untouched.
+        """
+        if not self.names:
+            return self.text
+        pieces = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            if name in args:
+                pieces.append(args[name] or "")
+            else:
+                pieces.append(f"[{name}]")
+            pieces.append(literal)
+        return "".join(pieces)
+
+
+class PromptTemplateCache:
+    """
+    Process-wide cache of parsed prompt files, reloaded when their mtime or size changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates = {}
+
+    def get(self, full_path):
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            return PromptTemplate('')
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._templates.get(full_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with open(full_path, 'r') as f:
+            template = PromptTemplate(f.read())
+        with self._lock:
+            self._templates[full_path] = (version, template)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+TEMPLATE_CACHE = PromptTemplateCache()
+
+
 class PromptLoader: 
     def __init__(self, path):
         self.path = path
@@ -43,29 +113,29 @@ class PromptLoader:
     
     CATEGORY = "BlackNightTales/utils"
         
+    def load_template(self, file_name):
+        """
+        Load a parsed prompt template, served from memory until the file changes.
+        
+        Args:
+            file_name (str): Name of the text file, without the .txt extension.
+        
+        Returns:
+            PromptTemplate: The parsed prompt, empty when the file does not exist.
+        """
+        return TEMPLATE_CACHE.get(os.path.join(self.path, f"{file_name}.txt"))
+        
     def load_prompt(self,  file_name):
         """
         Load a prompt from a text file.
         
         Args:
-            text_file_path (str): Path to the text file containing the prompt.
-            base_path (str): Base path to prepend to the text file path.
+            file_name (str): Name of the text file, without the .txt extension.
         
         Returns:
             str: The loaded prompt.
         """
-        
-
-        file_path = f"{file_name}.txt"
-        full_path = os.path.join(self.path, file_path )
-        prompt = ""
-        if not os.path.exists(full_path):
-            return ''
-        with open(full_path, 'r') as f:
-            prompt = f.read()
-            
-        
-        return prompt
+        return self.load_template(file_name).text
     
     def replace_prompt(self, prompt, **args):
         """
@@ -79,15 +149,7 @@ class PromptLoader:
         Returns:
             str: The updated prompt.
         """
-        
-        # Replace the placeholders in the prompt with the new values
-        for key, value in args.items():
-            if value:
-                prompt = prompt.replace(f"[{key}]", value)
-            else:
-                prompt = prompt.replace(f"[{key}]", "")
-        
-        return prompt
+        return PromptTemplate(prompt).render(**args)
     
     
     def run (self, **args):
@@ -104,12 +166,8 @@ class PromptLoader:
             str: The final prompt after replacing the placeholders.
         """
         
-        # Load the prompt
-        self.prompt = self.load_prompt("prompt")
-        self.system = self.load_prompt("context")
-
-        self.prompt = self.replace_prompt(self.prompt, **args)
-        self.system = self.replace_prompt(self.system, **args)
+        self.prompt = self.load_template("prompt").render(**args)
+        self.system = self.load_template("context").render(**args)
         
         return (self.system, self.prompt, )
     
@@ -6,6 +6,10 @@ from .ollama import (
     OllamaGenerate,
     OllamaConnectivityV2,
     OllamaGenerateV2,
+    OllamaGenerateBatch,
+    OllamaChat,
+    OllamaEmbed,
+    OllamaPreload,
     OllamaSaveContext,
     OllamaLoadContext,
 )
@@ -33,6 +37,10 @@ NODE_CLASS_MAPPINGS = {
     "BckntOllamaGenerate": OllamaGenerate,
     "BckntOllamaConnectivityV2": OllamaConnectivityV2,
     "BckntOllamaGenerateV2": OllamaGenerateV2,
+    "BckntOllamaGenerateBatch": OllamaGenerateBatch,
+    "BckntOllamaChat": OllamaChat,
+    "BckntOllamaEmbed": OllamaEmbed,
+    "BckntOllamaPreload": OllamaPreload,
     "BckntOllamaSaveContext": OllamaSaveContext,
     "BckntOllamaLoadContext": OllamaLoadContext,
 }
@@ -52,6 +60,10 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "BckntOllamaOptionsV2": "Ollama Options V2",
     "BckntOllamaConnectivityV2": "Ollama Connectivity V2",
     "BckntOllamaGenerateV2": "Ollama Generate V2",
+    "BckntOllamaGenerateBatch": "Ollama Generate Batch",
+    "BckntOllamaChat": "Ollama Chat",
+    "BckntOllamaEmbed": "Ollama Embed",
+    "BckntOllamaPreload": "Ollama Preload",
     "BckntOllamaSaveContext": "Ollama Save Context",
     "BckntOllamaLoadContext": "Ollama Load Context",
 }
@@ -1,20 +1,34 @@
 import random
 
 import json
+import asyncio
+import inspect
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
-from httpx import request
-from ollama import Client
-import numpy as np
-import base64
-from io import BytesIO
 # from server import PromptServer
 from aiohttp import web
 from pprint import pprint
-from PIL import Image
-from PIL.PngImagePlugin import PngInfo
 import os
 
+import numpy as np
+
+from ollama import AsyncClient
+
+from .chat_history import ChatHistory
+from .clients import OLLAMA_BACKEND, ollama_async_client, ollama_client
+from .host_pool import HOST_POOLS, HOST_STRATEGIES, parse_hosts
+from .context_codec import OllamaContext
+from .context_store import CONTEXT_STORE
+from .embedding_cache import EMBEDDING_CACHE, embedding_cache_inputs, text_hash
+from .image_encoder import IMAGE_CACHE, ImageEncoder, image_encoder_inputs
+from .metrics import METRICS, THINKING_BASELINE, request_metrics
+from .response_cache import MODEL_DIGESTS, RESPONSE_CACHE, response_cache_inputs
+from .session_store import KIND_CHAT, SESSION_STORE, session_inputs
+from ..utils.think_tags import ThinkTagStripper
+
 try:
     from server import PromptServer
     HAS_SERVER = True
@@ -28,27 +42,505 @@ except ImportError:
                     def decorator(func):
                         return func
                     return decorator
+
+                @staticmethod
+                def get(route):
+                    def decorator(func):
+                        return func
+                    return decorator
+
+            @staticmethod
+            def send_sync(event, data, sid=None):
+                pass
     PromptServer = MockPromptServer
     HAS_SERVER = False
 
+try:
+    import comfy.model_management as model_management
+except ImportError:
+    model_management = None
+
+STREAM_EVENT = "bcknt.ollama.stream"
+
+CHAT_TRUNCATION_MODES = ["window", "summarize", "none"]
+THINK_MODES = ["default", "budget", "no_think"]
+# Soft switch understood by hybrid reasoning models (e.g. qwen3) when the client has no `think` flag.
+NO_THINK_SWITCH = "/no_think"
+CLIENT_SUPPORTS_THINK = "think" in inspect.signature(AsyncClient.generate).parameters
+FORCED_THINK_CLOSE = "\n</think>\n\n"
+
+
+def get_model_names(models):
+    try:
+        return [model['model'] for model in models]
+    except Exception:
+        return [model['name'] for model in models]
+
+
+async def fetch_model_names(url):
+    hosts = parse_hosts(url) or [url]
+    if len(hosts) == 1:
+        async with ollama_async_client(url) as client:
+            response = await client.list()
+        return get_model_names(response.get('models', []))
+
+    async def host_models(host):
+        async with ollama_async_client(host) as client:
+            response = await client.list()
+        return get_model_names(response.get('models', []))
+
+    # Pools list every model served by at least one reachable host.
+    results = await asyncio.gather(*(host_models(host) for host in hosts), return_exceptions=True)
+    names = [result for result in results if not isinstance(result, BaseException)]
+    if not names:
+        raise results[0]
+    return list(dict.fromkeys(name for host_names in names for name in host_names))
+
+
+class OllamaModelCache:
+    """
+    Per-url TTL cache of the model names served by an ollama host.
+
+    Concurrent lookups for the same url share a single upstream request, so opening
+    a workflow with many Ollama nodes only lists the models once.
+    """
+
+    def __init__(self, ttl=30.0, fetch=fetch_model_names):
+        self.ttl = ttl
+        self._fetch = fetch
+        self._models = {}
+        self._pending = {}
+
+    async def get(self, url, refresh=False):
+        """
+        Return the model names for `url`, hitting the server only when the cached
+        entry is missing, expired or `refresh` is requested.
+        """
+        cached = self._models.get(url)
+        if not refresh and cached is not None and cached[0] > time.monotonic():
+            return list(cached[1])
+
+        task = self._pending.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url))
+            self._pending[url] = task
+            task.add_done_callback(lambda done: self._store(url, done))
+        return list(await asyncio.shield(task))
+
+    def _store(self, url, task):
+        if self._pending.get(url) is task:
+            del self._pending[url]
+        if not task.cancelled() and task.exception() is None:
+            self._models[url] = (time.monotonic() + self.ttl, task.result())
+
+    def invalidate(self, url=None):
+        if url is None:
+            self._models.clear()
+        else:
+            self._models.pop(url, None)
+
+
+MODEL_CACHE = OllamaModelCache()
+
+
 if HAS_SERVER:
     @PromptServer.instance.routes.post("/ollama/get_models")
     async def get_models_endpoint(request):
         data = await request.json()
         url = data.get("url")
-        client = Client(host=url)
-        models = client.list().get('models', [])
-        try:
-            models = [model['model'] for model in models]
-            return web.json_response(models)
-        except Exception as e:
-            models = [model['name'] for model in models]
-            return web.json_response(models)
+        models = await MODEL_CACHE.get(url, refresh=bool(data.get("refresh", False)))
+        return web.json_response(models)
 else:
     # Versión stub para tests
     async def get_models_endpoint(request):
         return web.json_response(["mock_model1", "mock_model2"])
 
+def exported_families():
+    """
+    Cache and host pool statistics exported next to the request metrics.
+    """
+    image_cache = IMAGE_CACHE.stats()
+    sessions = SESSION_STORE.stats()
+    pools = [(host, stats) for pool in HOST_POOLS.pools().values() for host, stats in pool.stats().items()]
+    return (
+        ("response_cache_hits_total", "counter", "Response cache lookups that returned a stored response.",
+         [({}, RESPONSE_CACHE.hits)]),
+        ("response_cache_misses_total", "counter", "Response cache lookups without a stored response.",
+         [({}, RESPONSE_CACHE.misses)]),
+        ("image_cache_hits_total", "counter", "Image encodes served from the encoded image cache.",
+         [({}, image_cache["hits"])]),
+        ("image_cache_misses_total", "counter", "Image encodes that had to run.",
+         [({}, image_cache["misses"])]),
+        ("embedding_cache_hits_total", "counter", "Embedding vectors served from the vector cache.",
+         [({}, EMBEDDING_CACHE.hits)]),
+        ("embedding_cache_misses_total", "counter", "Embedding vectors that had to be requested.",
+         [({}, EMBEDDING_CACHE.misses)]),
+        ("image_cache_bytes", "gauge", "Bytes held by the encoded image cache.",
+         [({}, image_cache["bytes"])]),
+        ("session_store_bytes", "gauge", "Bytes of conversation state held by the session store.",
+         [({"tier": "memory"}, sessions["bytes"]), ({"tier": "disk"}, sessions["spilled_bytes"])]),
+        ("session_store_entries", "gauge", "Sessions held by the session store.",
+         [({"tier": "memory"}, sessions["entries"]), ({"tier": "disk"}, sessions["spilled_entries"])]),
+        ("host_outstanding_requests", "gauge", "Requests in flight per pooled host.",
+         [({"host": host}, stats["outstanding"]) for host, stats in pools]),
+        ("host_healthy", "gauge", "1 when the pooled host is not backing off after a failure.",
+         [({"host": host}, int(stats["healthy"])) for host, stats in pools]),
+    )
+
+
+@PromptServer.instance.routes.get("/ollama/metrics")
+async def metrics_endpoint(request):
+    text = METRICS.render_prometheus(exported_families())
+    return web.Response(body=text.encode('utf-8'), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def processing_interrupted():
+    return model_management is not None and model_management.processing_interrupted()
+
+
+async def stream_generate(client, on_progress=None, is_interrupted=processing_interrupted, progress_interval=0.1,
+                          stripper=None, keep_raw=False, think_budget=None, **request):
+    """
+    Run a streaming `generate` request and assemble the chunks into a single response.
+
+    Args:
+        client: The ollama async client used for the request.
+        on_progress (callable): Called with (delta, tokens, tokens_per_second, done) at most
+            every `progress_interval` seconds and once more when the stream ends.
+        is_interrupted (callable): Polled on every chunk, the stream is closed as soon as it returns True.
+        stripper (ThinkTagStripper): Drops thinking sections from the chunks before they are buffered
+            or reported. The dropped length is returned in 'thinking_chars' and the number of
+            tokens generated while thinking in 'thinking_tokens'.
+        keep_raw (bool): Also return the text before stripping in 'raw_response'.
+        think_budget (int): With a stripper, close the stream once this many tokens were generated
+            inside a thinking section and set 'thinking_budget_exceeded'.
+        **request: Arguments forwarded to `client.generate`.
+
+    Returns:
+        dict: The final chunk with the full text in 'response', the number of streamed
+            tokens in 'streamed_tokens' and the measured 'time_to_first_token' in seconds.
+            'interrupted' is True when the stream was aborted.
+    """
+    started = time.perf_counter()
+    chunks = await client.generate(stream=True, **request)
+    response = await collect_stream(chunks, lambda chunk: chunk['response'], started, on_progress, is_interrupted,
+                                    progress_interval, stripper, keep_raw, think_budget)
+    response.setdefault('context', None)
+    return response
+
+
+async def stream_chat(client, on_progress=None, is_interrupted=processing_interrupted, progress_interval=0.1,
+                      stripper=None, **request):
+    """
+    Run a streaming `chat` request, like `stream_generate`.
+
+    Returns:
+        dict: The final chunk with the assistant reply in 'message' and in 'response'.
+    """
+    started = time.perf_counter()
+    chunks = await client.chat(stream=True, **request)
+    response = await collect_stream(chunks, lambda chunk: chunk['message']['content'], started, on_progress,
+                                    is_interrupted, progress_interval, stripper)
+    response['message'] = {"role": "assistant", "content": response['response']}
+    return response
+
+
+async def collect_stream(chunks, chunk_text, started, on_progress, is_interrupted, progress_interval, stripper,
+                         keep_raw=False, think_budget=None):
+    """
+    Assemble streamed chunks, see `stream_generate`. `chunk_text` extracts the text of a chunk.
+    """
+    parts = []
+    raw_parts = []
+    pending = []
+    tokens = 0
+    thinking_tokens = 0
+    unresolved_tokens = 0
+    first_token_at = None
+    last_progress = 0.0
+    final = {}
+    interrupted = False
+    exceeded = False
+
+    def tokens_per_second():
+        if first_token_at is None or tokens < 2:
+            return 0.0
+        elapsed = time.perf_counter() - first_token_at
+        return (tokens - 1) / elapsed if elapsed > 0 else 0.0
+
+    try:
+        async for chunk in chunks:
+            text = chunk_text(chunk)
+            if text:
+                tokens += 1
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                if keep_raw:
+                    raw_parts.append(text)
+                if stripper is not None:
+                    thinking = stripper.inside is not None
+                    resolved = stripper.resolved
+                    text = stripper.feed(text)
+                    if not stripper.resolved:
+                        unresolved_tokens += 1
+                    elif not resolved and stripper.leading_thinking:
+                        # The stream started inside a thinking section opened by the template.
+                        thinking_tokens += unresolved_tokens + 1
+                    else:
+                        thinking_tokens += thinking or stripper.inside is not None
+                if text:
+                    parts.append(text)
+                    pending.append(text)
+            if chunk['done']:
+                final = chunk
+                break
+            if is_interrupted is not None and is_interrupted():
+                interrupted = True
+                break
+            if think_budget is not None and stripper.inside is not None and thinking_tokens >= think_budget:
+                exceeded = True
+                break
+            if on_progress is not None and pending and time.perf_counter() - last_progress >= progress_interval:
+                on_progress(''.join(pending), tokens, tokens_per_second(), False)
+                pending = []
+                last_progress = time.perf_counter()
+    finally:
+        # Closing the generator drops the http response, which stops the generation server side.
+        aclose = getattr(chunks, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    if stripper is not None:
+        tail = stripper.flush()
+        parts.append(tail)
+        pending.append(tail)
+
+    if on_progress is not None:
+        on_progress(''.join(pending), tokens, tokens_per_second(), True)
+
+    response = dict(final)
+    response['response'] = ''.join(parts)
+    response['streamed_tokens'] = tokens
+    response['time_to_first_token'] = None if first_token_at is None else first_token_at - started
+    if keep_raw:
+        response['raw_response'] = ''.join(raw_parts)
+    if stripper is not None:
+        response['thinking_chars'] = stripper.dropped
+        response['thinking_tokens'] = thinking_tokens
+    response['interrupted'] = interrupted
+    if think_budget is not None:
+        response['thinking_budget_exceeded'] = exceeded
+    return response
+
+
+def merge_responses(first, second):
+    """
+    Join the responses of a generation split in two requests.
+    """
+    response = dict(second)
+    response['response'] = first['response'] + second['response']
+    for key in ('total_duration', 'load_duration', 'prompt_eval_count', 'prompt_eval_duration', 'eval_count',
+                'eval_duration', 'streamed_tokens', 'thinking_tokens'):
+        response[key] = (first.get(key) or 0) + (second.get(key) or 0)
+    response['time_to_first_token'] = first.get('time_to_first_token')
+    return response
+
+
+async def budget_generate(client, budget, stripper, on_progress=None, is_interrupted=processing_interrupted,
+                          keep_context=False, **request):
+    """
+    Generate with the thinking phase capped at `budget` tokens.
+
+    The request streams with the caller's options and is only closed when `budget` tokens
+    were generated inside a thinking section. The answer is then requested on the chat API
+    with the system prompt, the prompt and the reasoning so far closed by a forced closing
+    tag as the start of the assistant reply, which the model continues. Raw generate
+    requests are not used, ollama ignores `context` on them. The chat API returns no
+    context, so a request carrying a `context`, or whose context is kept, is re-issued
+    asking the model to skip thinking instead.
+
+    Returns:
+        dict: The final response, 'thinking_budget_exceeded' is True when the cap was applied.
+    """
+    # Visible text of the first request is held back until it is known to be kept.
+    first_progress = None
+    if on_progress is not None:
+        first_progress = lambda delta, tokens, tokens_per_second, done: on_progress('', tokens, tokens_per_second, False)
+    first = await stream_generate(client, first_progress, is_interrupted, stripper=stripper, keep_raw=True,
+                                  think_budget=budget, **request)
+    if first['interrupted'] or not first['thinking_budget_exceeded']:
+        if on_progress is not None:
+            on_progress(first['response'], first['streamed_tokens'], 0.0, True)
+        return first
+
+    stripper.close_section()
+    options = request.get('options') or {}
+    num_predict = options.get('num_predict') or -1
+    if num_predict > 0:
+        options = {**options, 'num_predict': max(num_predict - first['streamed_tokens'], 1)}
+
+    if request.get('context') or keep_context:
+        second = await stream_generate(client, on_progress, is_interrupted, stripper=stripper,
+                                       **no_think_request(request))
+    else:
+        if on_progress is not None and first['response']:
+            on_progress(first['response'], first['streamed_tokens'], 0.0, False)
+        messages = []
+        if request.get('system'):
+            messages.append({"role": "system", "content": request['system']})
+        user = {"role": "user", "content": request['prompt']}
+        if request.get('images'):
+            user['images'] = request['images']
+        messages.append(user)
+        messages.append({"role": "assistant", "content": first['raw_response'] + FORCED_THINK_CLOSE})
+        second = await stream_chat(client, on_progress, is_interrupted, stripper=stripper, model=request['model'],
+                                   messages=messages, options=options or None,
+                                   keep_alive=request.get('keep_alive'), format=request.get('format'))
+        second.setdefault('context', None)
+    response = merge_responses(first, second)
+    if request.get('context') or keep_context:
+        # The re-issued request answers from scratch, only its time adds up.
+        response['response'] = second['response']
+    response['interrupted'] = second['interrupted']
+    response['thinking_budget_exceeded'] = True
+    return response
+
+
+def no_think_request(request):
+    """
+    Ask the model to skip its thinking phase, with the client `think` flag when available.
+    """
+    if CLIENT_SUPPORTS_THINK:
+        return {**request, 'think': False}
+    return {**request, 'prompt': f"{request['prompt']} {NO_THINK_SWITCH}"}
+
+
+def without_thinking(response, stripper):
+    """
+    Copy of a complete generate response with the thinking sections removed from its text.
+    """
+    response = dict(response)
+    response['response'] = stripper.strip(response['response'])
+    response['thinking_chars'] = stripper.dropped
+    return response
+
+
+def model_digest(url, model):
+    """
+    Digest of `model` on the host that would serve it, so cache keys change when it is re-pulled.
+    """
+    host = HOST_POOLS.get(url).candidates(model, rotate=False)[0]
+    with ollama_client(host) as client:
+        return MODEL_DIGESTS.get(client, host, model)
+
+
+def cached_generate(url, request, response_cache="disabled", image_hashes=None, generate=None, variant=None):
+    """
+    Run `generate` (by default the request on the async backend) through the persistent response cache.
+
+    Args:
+        response_cache (str): 'disabled' bypasses the cache, 'enabled' looks up and stores,
+            'refresh' always generates and overwrites the stored response.
+        image_hashes (list): Content hashes of the request images, used instead of the payloads.
+        variant (str): Names the post-processing `generate` applies, so it is cached separately.
+
+    Returns:
+        The generate response, a plain dict with 'cached' set to True on a hit.
+    """
+    if generate is None:
+        generate = lambda: OLLAMA_BACKEND.generate(url, **request)
+
+    if response_cache == "disabled":
+        return generate()
+
+    key = RESPONSE_CACHE.make_key(model_digest(url, request['model']), request, image_hashes, variant)
+    if response_cache == "enabled":
+        cached = RESPONSE_CACHE.get(key)
+        if cached is not None:
+            cached['cached'] = True
+            return cached
+
+    response = generate()
+    if not (isinstance(response, dict) and response.get('interrupted')):
+        RESPONSE_CACHE.put(key, response)
+    return response
+
+
+def record_metrics(node, url, model, response, http_time, encode_time=0.0):
+    """
+    Build the metrics of a generate response and add them to the in-process collector.
+    """
+    metrics = request_metrics(response, http_time=http_time, encode_time=encode_time)
+    METRICS.record(metrics, node=node, model=model, host=url)
+    return metrics
+
+
+def first_item(value):
+    """
+    Unwrap a scalar input of a node with INPUT_IS_LIST, which receives every input as a list.
+    """
+    return value[0] if isinstance(value, list) else value
+
+
+def parse_models(models):
+    """
+    Split a models input given one per line or comma separated.
+    """
+    return [model.strip() for model in re.split(r"[,\n]", models or "") if model.strip()]
+
+
+async def preload_model(url, model, keep_alive):
+    """
+    Load `model` on `url` with an empty prompt generate, which only loads the model.
+
+    Returns:
+        dict: The model, the seconds the host spent loading it (0 when it was already loaded)
+            and the total request time.
+    """
+    started = time.perf_counter()
+    response = await OLLAMA_BACKEND.agenerate(url, model=model, prompt="", keep_alive=keep_alive)
+    return {
+        "model": model,
+        "load_duration": (response.get('load_duration') or 0) / 1e9,
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def preload_models(url, models, keep_alive):
+    """
+    Preload `models` concurrently on the async backend without blocking.
+
+    Returns:
+        concurrent.futures.Future: Resolves with the preload_model results in `models` order.
+    """
+    async def preload():
+        return await asyncio.gather(*(preload_model(url, model, keep_alive) for model in models))
+    return OLLAMA_BACKEND.submit(preload())
+
+
+def preload_on_startup():
+    """
+    Preload the models listed in BCKNT_OLLAMA_PRELOAD when ComfyUI imports the nodes, using
+    BCKNT_OLLAMA_PRELOAD_URL and BCKNT_OLLAMA_PRELOAD_KEEP_ALIVE (e.g. "30m").
+    """
+    models = parse_models(os.environ.get("BCKNT_OLLAMA_PRELOAD"))
+    if not models:
+        return None
+    url = os.environ.get("BCKNT_OLLAMA_PRELOAD_URL", "http://127.0.0.1:11434")
+    keep_alive = os.environ.get("BCKNT_OLLAMA_PRELOAD_KEEP_ALIVE", "5m")
+
+    def report(future):
+        try:
+            for result in future.result():
+                print(f"[Ollama Preload] {result['model']} ready on {url} in {result['elapsed']:.2f}s")
+        except Exception as e:
+            print(f"[Ollama Preload] startup preload failed: {e}")
+
+    future = preload_models(url, models, keep_alive)
+    future.add_done_callback(report)
+    return future
+
+
 class OllamaVision:
     def __init__(self):
         pass
@@ -73,35 +565,68 @@ class OllamaVision:
                 "format": (["text", "json", ''],),
                 "seed": ("INT", {"default": seed, "min": 0, "max": 2 ** 31, "step": 1}),
             },
+            "optional": {
+                "mode": (["batch", "per_image"], {
+                    "default": "batch",
+                    "tooltip": "'batch' describes all images in one request, 'per_image' returns one description per frame."
+                }),
+                "max_concurrency": ("INT", {"default": 4, "min": 1, "max": 64, "step": 1,
+                                            "tooltip": "Maximum number of per image requests in flight at once, also capped by "
+                                                       "the per host limit (BCKNT_OLLAMA_MAX_CONCURRENCY_PER_HOST, default 4)."}),
+                **image_encoder_inputs(),
+            },
         }
 
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("description",)
+    OUTPUT_IS_LIST = (True,)
     FUNCTION = "ollama_vision"
     CATEGORY = "BlackNightTales/Ollama"
 
-    def ollama_vision(self, images, query, debug, url, model, seed, keep_alive, format):
-        images_binary = []
-
+    @staticmethod
+    async def describe_per_image(encoder, images, url, max_concurrency, **request):
+        """
+        Describe every frame with its own request.
+
+        All frames start encoding right away on worker threads, so frame k+1 is being
+        encoded while frame k is in flight. At most `max_concurrency` requests run at once.
+
+        Returns:
+            list[str]: One description per frame, in batch order.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        encodings = [loop.run_in_executor(None, encoder.encode, images[index:index + 1]) for index in range(len(images))]
+
+        async def describe(encoding):
+            payloads = await encoding
+            async with semaphore:
+                started = time.perf_counter()
+                response = await OLLAMA_BACKEND.agenerate(url, images=payloads, **request)
+            record_metrics("OllamaVision", url, request['model'], response, time.perf_counter() - started)
+            return response['response']
+
+        return await asyncio.gather(*(describe(encoding) for encoding in encodings))
+
+    def ollama_vision(self, images, query, debug, url, model, seed, keep_alive, format,
+                      mode="batch", max_concurrency=4, image_format="PNG", image_quality=90, image_max_side=0):
         if format == "text":
             format = ''
 
-        for (batch_number, image) in enumerate(images):
-            # Convert tensor to numpy array
-            i = 255. * image.cpu().numpy()
-
-            # Create PIL Image
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+        encoder = ImageEncoder(format=image_format, quality=image_quality, max_side=image_max_side)
 
-            # Save to BytesIO buffer
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
+        if mode == "per_image":
+            descriptions = OLLAMA_BACKEND.run(self.describe_per_image(
+                encoder, images, url, max_concurrency,
+                model=model, prompt=query, keep_alive=str(keep_alive) + "m", format=format))
+            if debug == "enable":
+                print(f"[Ollama Vision]\n{len(descriptions)} descriptions:\n")
+                pprint(descriptions)
+            return (descriptions,)
 
-            # Get binary data
-            img_binary = buffered.getvalue()
-            images_binary.append(img_binary)
-
-        client = Client(host=url)
+        started = time.perf_counter()
+        images_binary = encoder.encode(images)
+        encode_time = time.perf_counter() - started
 
         if debug == "enable":
             print(f"""[Ollama Vision]
@@ -113,13 +638,15 @@ request query params:
 
 """)
 
-        response = client.generate(model=model, prompt=query, images=images_binary, keep_alive=str(keep_alive) + "m", format=format)
+        started = time.perf_counter()
+        response = OLLAMA_BACKEND.generate(url, model=model, prompt=query, images=images_binary, keep_alive=str(keep_alive) + "m", format=format)
+        record_metrics("OllamaVision", url, model, response, time.perf_counter() - started, encode_time)
 
         if debug == "enable":
             print("[Ollama Vision]\nResponse:\n")
             pprint(response)
 
-        return (response['response'],)
+        return ([response['response']],)
 
 
 class OllamaGenerate:
@@ -152,8 +679,6 @@ class OllamaGenerate:
 
     def ollama_generate(self, prompt, debug, url, model, keep_alive, format):
 
-        client = Client(host=url)
-
         if format == "text":
             format = ''
 
@@ -167,7 +692,9 @@ request query params:
 
             """)
 
-        response = client.generate(model=model, prompt=prompt, keep_alive=str(keep_alive) + "m", format=format)
+        started = time.perf_counter()
+        response = OLLAMA_BACKEND.generate(url, model=model, prompt=prompt, keep_alive=str(keep_alive) + "m", format=format)
+        record_metrics("OllamaGenerate", url, model, response, time.perf_counter() - started)
 
         if debug == "enable":
             print("[Ollama Generate]\nResponse:\n")
@@ -215,6 +742,8 @@ class OllamaGenerateAdvance:
                 "format": (["text", "json", ''],),
             }, "optional": {
                 "context": ("STRING", {"forceInput": True}),
+                **response_cache_inputs(),
+                **session_inputs(),
             }
         }
 
@@ -224,9 +753,8 @@ class OllamaGenerateAdvance:
     CATEGORY = "BlackNightTales/Ollama"
 
     def ollama_generate_advance(self, prompt, debug, url, model, system, seed, top_k, top_p, temperature, num_predict,
-                                tfs_z, keep_alive, keep_context, format, context=None):
-
-        client = Client(host=url)
+                                tfs_z, keep_alive, keep_context, format, context=None, response_cache="disabled",
+                                session_id=""):
 
         if format == "text":
             format = ''
@@ -258,12 +786,10 @@ class OllamaGenerateAdvance:
             "tfs_z": tfs_z,
         }
 
-        if context != None and isinstance(context, str):
-            string_list = context.split(',')
-            context = [int(item.strip()) for item in string_list]
+        context = OllamaContext.from_any(context)
 
         if keep_context and context == None:
-            context = self.saved_context
+            context = SESSION_STORE.get(session_id) if session_id else self.saved_context
 
         if debug:
             print(f"""[Ollama Generate Advance]
@@ -275,27 +801,35 @@ request query params:
 - options: {options}
 """)
 
-        response = client.generate(model=model, system=system, prompt=prompt, context=context, options=options,
-                                   keep_alive=str(keep_alive) + "m", format=format)
+        request = dict(model=model, system=system, prompt=prompt, context=None if context is None else context.tolist(),
+                       options=options, keep_alive=str(keep_alive) + "m", format=format)
+        started = time.perf_counter()
+        response = cached_generate(url, request, response_cache)
+        record_metrics("OllamaGenerateAdvance", url, model, response, time.perf_counter() - started)
         if debug:
             print("[Ollama Generate Advance]\nResponse:\n")
             pprint(response)
 
-        if keep_context:
-            self.saved_context = response["context"]
+        response_context = OllamaContext.from_any(response.get('context'))
+        if keep_context and session_id:
+            SESSION_STORE.put(session_id, response_context)
+        elif keep_context:
+            self.saved_context = response_context
 
-        return (response['response'], response['context'],)
+        return (response['response'], response_context,)
 
 
 class OllamaSaveContext:
     def __init__(self):
-        self._base_dir = os.path.dirname(os.path.realpath(__file__)) + os.path.sep + "saved_context"
+        pass
 
     @classmethod
     def INPUT_TYPES(s):
         return {"required":
                     {"context": ("STRING", {"forceInput": True},),
                      "filename": ("STRING", {"default": "context"})},
+                "optional":
+                    {"model": ("STRING", {"forceInput": True},)},
                 }
 
     RETURN_TYPES = ()
@@ -304,29 +838,24 @@ class OllamaSaveContext:
     OUTPUT_NODE = True
     CATEGORY = "BlackNightTales/Ollama"
 
-    def ollama_save_context(self, filename, context=None):
-        path = self._base_dir + os.path.sep + filename
-        metadata = PngInfo()
-
-        metadata.add_text("context", ','.join(map(str, context)))
+    def ollama_save_context(self, filename, context=None, model=""):
+        context = OllamaContext.from_any(context) or OllamaContext()
+        CONTEXT_STORE.save(filename, context, model=model)
 
-        image = Image.new('RGB', (100, 100), (255, 255, 255))  # Creates a 100x100 white image
-
-        image.save(path + ".png", pnginfo=metadata)
-
-        return {"ui": {"context": context}}
+        return {"ui": {"context": [f"{filename}: {len(context)} tokens"]}}
 
 
 class OllamaLoadContext:
     def __init__(self):
-        self._base_dir = os.path.dirname(os.path.realpath(__file__)) + os.path.sep + "saved_context"
+        pass
 
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = os.path.dirname(os.path.realpath(__file__)) + os.path.sep + "saved_context"
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f)) and f != ".keep"]
         return {"required":
-                    {"context_file": (files, {})},
+                    {"context_file": (CONTEXT_STORE.names(), {})},
+                "optional":
+                    {"last_tokens": ("INT", {"default": 0, "min": 0, "max": 2 ** 31, "step": 1,
+                                             "tooltip": "Only load the trailing tokens, 0 loads the whole context."})},
                 }
 
     CATEGORY = "BlackNightTales/Ollama"
@@ -335,11 +864,8 @@ class OllamaLoadContext:
     RETURN_TYPES = ("STRING",)
     FUNCTION = "ollama_load_context"
 
-    def ollama_load_context(self, context_file):
-        with Image.open(self._base_dir + os.path.sep + context_file) as img:
-            info = img.info
-            res = info.get('context', '')
-        return (res,)
+    def ollama_load_context(self, context_file, last_tokens=0):
+        return (CONTEXT_STORE.load(context_file, last_tokens=last_tokens),)
 
 
 class OllamaOptionsV2:
@@ -421,12 +947,25 @@ class OllamaConnectivityV2:
             "required": {
                 "url": ("STRING", {
                     "multiline": False,
-                    "default": "http://127.0.0.1:11434"
+                    "default": "http://127.0.0.1:11434",
+                    "tooltip": "Ollama host, or several comma separated hosts to balance requests across."
                 }),
                 "model": ((), {}),
                 "keep_alive": ("INT", {"default": 5, "min": -1, "max": 120, "step": 1}),
                 "keep_alive_unit": (["minutes", "hours"],),
             },
+            "optional": {
+                "strategy": (HOST_STRATEGIES, {
+                    "default": HOST_STRATEGIES[0],
+                    "tooltip": "How requests pick a host when several are given: prefer hosts with the model loaded, "
+                               "the least busy host, or rotate through them."
+                }),
+                "max_requests_per_host": ("INT", {
+                    "default": 0, "min": 0, "max": 64, "step": 1,
+                    "tooltip": "Requests in flight at once on each host, shared by every node using this url. "
+                               "0 leaves the current limit of the url, by default 4 or BCKNT_OLLAMA_MAX_CONCURRENCY_PER_HOST."
+                }),
+            },
         }
 
     RETURN_TYPES = ("OLLAMA_CONNECTIVITY", "STRING")
@@ -434,12 +973,19 @@ class OllamaConnectivityV2:
     FUNCTION = "ollama_connectivity"
     CATEGORY = "BlackNightTales/Ollama"
 
-    def ollama_connectivity(self, url, model, keep_alive, keep_alive_unit):
+    def ollama_connectivity(self, url, model, keep_alive, keep_alive_unit, strategy=HOST_STRATEGIES[0],
+                            max_requests_per_host=0):
+        # Consumers keep passing the url around, the shared pool and backend carry the strategy and limit.
+        HOST_POOLS.get(url, strategy)
+        if max_requests_per_host > 0:
+            OLLAMA_BACKEND.set_host_limit(url, max_requests_per_host)
         data = {
             "url": url,
             "model": model,
             "keep_alive": keep_alive,
             "keep_alive_unit": keep_alive_unit,
+            "strategy": strategy,
+            "max_requests_per_host": max_requests_per_host,
         }
 
         return (data, model,)
@@ -471,11 +1017,27 @@ class OllamaGenerateV2:
                 "images": ("IMAGE", {"forceInput": False},),
                 "context": ("OLLAMA_CONTEXT", {"forceInput": False},),
                 "meta": ("OLLAMA_META", {"forceInput": False},),
-            }
+                "stream": ("BOOLEAN", {"default": False, "tooltip": "Stream tokens to the UI while generating."}),
+                "strip_thinking": ("BOOLEAN", {"default": False,
+                                               "tooltip": "Drop <think> sections from the result, while streaming they are never buffered."}),
+                "think_mode": (THINK_MODES, {
+                    "default": "default",
+                    "tooltip": "'budget' caps the thinking phase at think_budget tokens and then forces the answer, "
+                               "'no_think' asks hybrid reasoning models to skip thinking. Both strip the thinking output."
+                }),
+                "think_budget": ("INT", {"default": 1024, "min": 1, "max": 32768, "step": 1,
+                                         "tooltip": "Maximum thinking tokens in 'budget' mode."}),
+                **image_encoder_inputs(),
+                **response_cache_inputs(),
+                **session_inputs(),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
         }
 
-    RETURN_TYPES = ("STRING", "OLLAMA_CONTEXT", "OLLAMA_META",)
-    RETURN_NAMES = ("result", "context", "meta",)
+    RETURN_TYPES = ("STRING", "OLLAMA_CONTEXT", "OLLAMA_META", "STRING",)
+    RETURN_NAMES = ("result", "context", "meta", "metrics",)
     FUNCTION = "ollama_generate_v2"
     CATEGORY = "BlackNightTales/Ollama"
 
@@ -500,8 +1062,11 @@ class OllamaGenerateV2:
 
         return response
 
-    def ollama_generate_v2(self, system, prompt, format, keep_context, context = None, options=None, connectivity=None, images=None, meta=None):
-
+    @staticmethod
+    def resolve_meta(connectivity=None, options=None, meta=None):
+        """
+        Merge the connectivity and options inputs into the meta passed between generate nodes.
+        """
         if connectivity is None and meta is None:
             raise Exception("Required input connectivity or meta.")
 
@@ -515,38 +1080,86 @@ class OllamaGenerateV2:
                 meta["options"] = options
         else:
             meta = {"options": options, "connectivity": connectivity}
+        return meta
+
+    @staticmethod
+    def get_keep_alive(connectivity):
+        keep_alive_unit =  'm' if connectivity['keep_alive_unit'] == "minutes" else 'h'
+        return str(connectivity['keep_alive']) + keep_alive_unit
+
+    @staticmethod
+    async def stream(url, on_progress, request, stripper=None):
+        return await OLLAMA_BACKEND.acall(
+            url, lambda client: stream_generate(client, on_progress=on_progress, stripper=stripper, **request),
+            request['model'])
+
+    @staticmethod
+    async def budget_stream(url, on_progress, request, stripper, budget, keep_context=False):
+        # The answer request reuses the host that already holds the prompt in its cache.
+        return await OLLAMA_BACKEND.acall(
+            url, lambda client: budget_generate(client, budget, stripper, on_progress, keep_context=keep_context,
+                                                **request), request['model'])
+
+    @staticmethod
+    def record_thinking(model, think_mode, response):
+        """
+        Feed the uncapped thinking baseline, or estimate the tokens a cap saved into the response.
+        """
+        thinking_tokens = response.get('thinking_tokens')
+        if thinking_tokens is None and response.get('thinking_chars') == 0:
+            # Not streamed, so tokens were not counted, but nothing was dropped either.
+            thinking_tokens = 0
+        if response.get('cached') or thinking_tokens is None:
+            return
+        if think_mode == "no_think" or response.get('thinking_budget_exceeded'):
+            response['thinking_tokens_saved'] = THINKING_BASELINE.estimate_saved(model, thinking_tokens)
+        else:
+            THINKING_BASELINE.observe(model, thinking_tokens)
+
+    @staticmethod
+    def stream_progress(unique_id):
+        def send(delta, tokens, tokens_per_second, done):
+            PromptServer.instance.send_sync(STREAM_EVENT, {
+                "node": unique_id,
+                "delta": delta,
+                "tokens": tokens,
+                "tokens_per_second": round(tokens_per_second, 2),
+                "done": done,
+            })
+        return send
+
+    def ollama_generate_v2(self, system, prompt, format, keep_context, context = None, options=None, connectivity=None, images=None, meta=None,
+                           stream=False, image_format="PNG", image_quality=90, image_max_side=0,
+                           response_cache="disabled", unique_id=None, strip_thinking=False, think_mode="default",
+                           think_budget=1024, session_id=""):
+
+        meta = self.resolve_meta(connectivity, options, meta)
 
         url = meta['connectivity']['url']
         model = meta['connectivity']['model']
-        client = Client(host=url)
 
         debug_print = True if meta['options'] is not None and meta['options']['debug'] else False
 
         if format == "text":
             format = ''
 
-        if context is not None and isinstance(context, str):
-            string_list = context.split(',')
-            context = [int(item.strip()) for item in string_list]
+        context = OllamaContext.from_any(context)
 
         if keep_context and context is None:
-            context = self.saved_context
+            context = SESSION_STORE.get(session_id) if session_id else self.saved_context
 
-        keep_alive_unit =  'm' if meta['connectivity']['keep_alive_unit'] == "minutes" else 'h'
-        request_keep_alive = str(meta['connectivity']['keep_alive']) + keep_alive_unit
+        request_keep_alive = self.get_keep_alive(meta['connectivity'])
 
         request_options = self.get_request_options(options)
 
         images_b64 = None
+        image_hashes = None
+        encode_time = 0.0
         if images is not None:
-            images_b64 = []
-            for (batch_number, image) in enumerate(images):
-                i = 255. * image.cpu().numpy()
-                img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-                buffered = BytesIO()
-                img.save(buffered, format="PNG")
-                img_bytes = base64.b64encode(buffered.getvalue())
-                images_b64.append(str(img_bytes, 'utf-8'))
+            started = time.perf_counter()
+            encoder = ImageEncoder(format=image_format, quality=image_quality, max_side=image_max_side)
+            images_b64, image_hashes = encoder.encode_batch(images, as_base64=True)
+            encode_time = time.perf_counter() - started
 
         if debug_print:
             print(f"""
@@ -564,28 +1177,475 @@ format: {format}
 ---------------------------------------------------------
 """)
 
-        response = client.generate(
+        request = dict(
             model=model,
             system=system,
             prompt=prompt,
             images=images_b64,
-            context=context,
+            context=None if context is None else context.tolist(),
             options=request_options,
             keep_alive= request_keep_alive,
             format=format,
         )
 
+        if think_mode == "no_think":
+            request = no_think_request(request)
+
+        on_progress = self.stream_progress(unique_id) if stream else None
+        stripper = ThinkTagStripper() if strip_thinking or think_mode != "default" else None
+        variant = None if stripper is None else "strip_thinking"
+        generate = None
+        if think_mode == "budget":
+            variant = f"think_budget:{think_budget}"
+            generate = lambda: OLLAMA_BACKEND.run(self.budget_stream(url, on_progress, request, stripper, think_budget,
+                                                                     keep_context))
+        elif stream:
+            generate = lambda: OLLAMA_BACKEND.run(self.stream(url, on_progress, request, stripper))
+        elif stripper is not None:
+            generate = lambda: without_thinking(OLLAMA_BACKEND.generate(url, **request), stripper)
+        started = time.perf_counter()
+        response = cached_generate(url, request, response_cache, image_hashes, generate, variant)
+        self.record_thinking(model, think_mode, response)
+        metrics = record_metrics("OllamaGenerateV2", url, model, response, time.perf_counter() - started, encode_time)
+
+        if stream and response.get('cached'):
+            on_progress(response['response'], response.get('eval_count') or 0, 0.0, True)
+
+        if response.get('interrupted'):
+            if debug_print:
+                print("ollama generate v2 stream interrupted.")
+            if model_management is not None:
+                model_management.throw_exception_if_processing_interrupted()
+            raise Exception("Ollama generate v2 stream was interrupted.")
+
         if debug_print:
             print("\n--- ollama generate v2 response:")
             pprint(response)
+            print("--- metrics:")
+            pprint(metrics)
             print("---------------------------------------------------------")
 
-        if keep_context:
-            self.saved_context = response["context"]
+        response_context = OllamaContext.from_any(response.get('context'))
+        if keep_context and session_id:
+            SESSION_STORE.put(session_id, response_context)
+            if debug_print:
+                print(f"saving context to session '{session_id}'.")
+        elif keep_context:
+            self.saved_context = response_context
             if debug_print:
                 print("saving context to node memory.")
 
-        return response['response'], response['context'], meta,
+        meta["metrics"] = metrics
+        return response['response'], response_context, meta, json.dumps(metrics, indent=2),
+
+
+SPLIT_MODES = ["auto", "lines", "json", "none"]
+
+
+def split_inputs():
+    """
+    Optional node input choosing how a text input is split into several texts.
+    """
+    return {
+        "split": (SPLIT_MODES, {
+            "default": "auto",
+            "tooltip": "How each text is split: one per line, a JSON list of strings, kept whole, or 'auto' "
+                       "for a JSON list when the text is one and lines otherwise. Use 'none' to keep "
+                       "connected multi-line texts whole.",
+        }),
+    }
+
+
+class OllamaGenerateBatch(OllamaGenerateV2):
+    """
+    Generates one response per prompt, dispatching the prompts concurrently.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "system": ("STRING", {
+                    "multiline": True,
+                    "default": "You are an AI artist."
+                }),
+                "prompts": ("STRING", {
+                    "multiline": True,
+                    "default": "What is art?\nWhat is music?",
+                    "tooltip": "Prompts split according to split, or a connected list output."
+                }),
+                "format": (["text", "json"],),
+                "max_concurrency": ("INT", {"default": 4, "min": 1, "max": 64, "step": 1,
+                                            "tooltip": "Maximum number of prompts in flight at once, also capped by the per host "
+                                                       "limit set with max_requests_per_host on Connectivity V2."}),
+            },
+            "optional": {
+                "connectivity": ("OLLAMA_CONNECTIVITY", {"forceInput": False},),
+                "options": ("OLLAMA_OPTIONS", {"forceInput": False},),
+                "meta": ("OLLAMA_META", {"forceInput": False},),
+                **response_cache_inputs(),
+                **split_inputs(),
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "FLOAT", "OLLAMA_META",)
+    RETURN_NAMES = ("results", "latencies", "meta",)
+    # Upstream list outputs arrive whole instead of running the node once per item.
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True, True, False,)
+    FUNCTION = "ollama_generate_batch"
+    CATEGORY = "BlackNightTales/Ollama"
+
+    @staticmethod
+    def parse_prompts(prompts, split="auto"):
+        """
+        Split the prompts input into a list of texts.
+
+        Every text of a list input, such as an upstream list output, is split the same way:
+        'lines' keeps one text per non empty line, 'json' expects a JSON list of strings,
+        'none' keeps the text whole and 'auto' reads a JSON list if the text is one, else lines.
+        """
+        texts = []
+        for prompt in prompts if isinstance(prompts, (list, tuple)) else [prompts]:
+            text = str(prompt)
+            if split == "none":
+                texts.append(text)
+                continue
+            if split == "json" or (split == "auto" and text.strip().startswith('[')):
+                try:
+                    parsed = json.loads(text)
+                except ValueError:
+                    parsed = None
+                if isinstance(parsed, list):
+                    texts.extend(str(item) for item in parsed)
+                    continue
+                if split == "json":
+                    raise ValueError(f"Expected a JSON list of strings, got: {text[:80]!r}")
+            texts.extend(line.strip() for line in text.splitlines() if line.strip())
+        return texts
+
+    def ollama_generate_batch(self, system, prompts, format, max_concurrency, options=None, connectivity=None, meta=None,
+                              response_cache="disabled", split="auto"):
+        system, format, max_concurrency, options, connectivity, meta, response_cache, split = map(
+            first_item, (system, format, max_concurrency, options, connectivity, meta, response_cache, split))
+        meta = self.resolve_meta(connectivity, options, meta)
+        url = meta['connectivity']['url']
+        debug_print = True if meta['options'] is not None and meta['options']['debug'] else False
+
+        base_request = dict(
+            model=meta['connectivity']['model'],
+            system=system,
+            options=self.get_request_options(meta['options']),
+            keep_alive=self.get_keep_alive(meta['connectivity']),
+            format='' if format == "text" else format,
+        )
+
+        def generate(prompt):
+            started = time.perf_counter()
+            response = cached_generate(url, {**base_request, "prompt": prompt}, response_cache)
+            latency = time.perf_counter() - started
+            metrics = record_metrics("OllamaGenerateBatch", url, base_request['model'], response, latency)
+            return response['response'], latency, metrics
+
+        prompt_list = self.parse_prompts(prompts, split)
+        started = time.perf_counter()
+        # Requests are also capped by the backend per host limit.
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="bcknt-batch") as pool:
+            outputs = list(pool.map(generate, prompt_list))
+
+        if debug_print:
+            print(f"--- ollama generate batch: {len(prompt_list)} prompts in {time.perf_counter() - started:.2f}s")
+            for index, (_, latency, metrics) in enumerate(outputs):
+                print(f"  [{index}] {latency:.2f}s, {metrics['tokens_per_second']:.1f} tok/s")
+
+        meta["metrics"] = [output[2] for output in outputs]
+        return [output[0] for output in outputs], [output[1] for output in outputs], meta,
+
+
+class OllamaEmbed(OllamaGenerateV2):
+    """
+    Embeds a list of texts into a float32 matrix, one row per text.
+
+    Texts are deduplicated, looked up in the on-disk vector cache and the rest is sent in
+    as few `embed` requests as `batch_size` allows, dispatched concurrently.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "texts": ("STRING", {
+                    "multiline": True,
+                    "default": "What is art?\nWhat is music?",
+                    "tooltip": "Texts split according to split, or a connected list output."
+                }),
+                "batch_size": ("INT", {"default": 256, "min": 1, "max": 4096, "step": 1,
+                                       "tooltip": "Maximum number of texts per embed request."}),
+            },
+            "optional": {
+                "connectivity": ("OLLAMA_CONNECTIVITY", {"forceInput": False},),
+                "meta": ("OLLAMA_META", {"forceInput": False},),
+                "truncate": ("BOOLEAN", {"default": True,
+                                         "tooltip": "Truncate texts longer than the model context instead of failing."}),
+                **embedding_cache_inputs(),
+                **split_inputs(),
+            },
+        }
+
+    RETURN_TYPES = ("OLLAMA_EMBEDDINGS", "OLLAMA_META", "STRING",)
+    RETURN_NAMES = ("embeddings", "meta", "metrics",)
+    # Upstream list outputs arrive whole instead of running the node once per item.
+    INPUT_IS_LIST = True
+    FUNCTION = "ollama_embed"
+    CATEGORY = "BlackNightTales/Ollama"
+
+    @staticmethod
+    async def embed_batches(url, texts, batch_size, **request):
+        # Batches run concurrently, still capped by the backend per host limit.
+        return await asyncio.gather(*(OLLAMA_BACKEND.aembed(url, input=texts[start:start + batch_size], **request)
+                                      for start in range(0, len(texts), batch_size)))
+
+    def ollama_embed(self, texts, batch_size, connectivity=None, meta=None, truncate=True, vector_cache="enabled",
+                     split="auto"):
+        batch_size, connectivity, meta, truncate, vector_cache, split = map(
+            first_item, (batch_size, connectivity, meta, truncate, vector_cache, split))
+        meta = self.resolve_meta(connectivity, None, meta)
+        url = meta['connectivity']['url']
+        model = meta['connectivity']['model']
+        debug_print = True if meta['options'] is not None and meta['options']['debug'] else False
+
+        text_list = OllamaGenerateBatch.parse_prompts(texts, split)
+        hashes = [text_hash(text) for text in text_list]
+
+        started = time.perf_counter()
+        digest = None if vector_cache == "disabled" else model_digest(url, model)
+        vectors = EMBEDDING_CACHE.get_many(digest, hashes) if vector_cache == "enabled" else {}
+        cached = len(vectors)
+
+        missing = {key: text for key, text in zip(hashes, text_list) if key not in vectors}
+        responses = []
+        if missing:
+            responses = OLLAMA_BACKEND.run(self.embed_batches(
+                url, list(missing.values()), batch_size, model=model, truncate=truncate,
+                keep_alive=self.get_keep_alive(meta['connectivity'])))
+            embedded = np.asarray([vector for response in responses for vector in response['embeddings']],
+                                  dtype=np.float32)
+            if digest is not None:
+                EMBEDDING_CACHE.put_many(digest, list(missing), embedded)
+            vectors.update(zip(missing, embedded))
+
+        embeddings = np.stack([vectors[key] for key in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+
+        response = {key: sum(response.get(key) or 0 for response in responses)
+                    for key in ('total_duration', 'load_duration', 'prompt_eval_count')}
+        metrics = record_metrics("OllamaEmbed", url, model, response, time.perf_counter() - started)
+        metrics["texts"] = len(text_list)
+        metrics["cached_vectors"] = cached
+        metrics["embed_requests"] = len(responses)
+
+        if debug_print:
+            print(f"--- ollama embed: {len(text_list)} texts, {cached} cached, {len(missing)} embedded in "
+                  f"{len(responses)} requests, matrix {embeddings.shape}")
+
+        meta["metrics"] = metrics
+        return embeddings, meta, json.dumps(metrics, indent=2),
+
+
+class OllamaChat(OllamaGenerateV2):
+    """
+    Multi-turn chat on the chat API, passing the conversation as an OLLAMA_CHAT history.
+
+    Each run appends the new user turn and the reply to a new history object, so the messages
+    sent to the server only grow at the end and its prompt cache is reused across turns,
+    instead of round-tripping the context token array.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "prompt": ("STRING", {
+                    "multiline": True,
+                    "default": "What is art?"
+                }),
+                "format": (["text", "json"],),
+            },
+            "optional": {
+                "system": ("STRING", {
+                    "multiline": True,
+                    "default": "You are an AI artist.",
+                    "tooltip": "System prompt, replaces the one of the connected chat when changed."
+                }),
+                "chat": ("OLLAMA_CHAT", {"forceInput": False},),
+                "connectivity": ("OLLAMA_CONNECTIVITY", {"forceInput": False},),
+                "options": ("OLLAMA_OPTIONS", {"forceInput": False},),
+                "images": ("IMAGE", {"forceInput": False},),
+                "meta": ("OLLAMA_META", {"forceInput": False},),
+                "stream": ("BOOLEAN", {"default": False, "tooltip": "Stream tokens to the UI while generating."}),
+                "truncation": (CHAT_TRUNCATION_MODES, {
+                    "default": "window",
+                    "tooltip": "What happens when the history exceeds max_history_tokens: 'window' drops the oldest "
+                               "turns, 'summarize' folds them into a running summary, 'none' sends everything."
+                }),
+                "max_history_tokens": ("INT", {
+                    "default": 8192, "min": 256, "max": 1048576, "step": 256,
+                    "tooltip": "Estimated token budget of the history. Turns are dropped in blocks down to half of it, "
+                               "so the prompt prefix stays cacheable for the following turns."
+                }),
+                **image_encoder_inputs(),
+                **session_inputs(),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
+        }
+
+    RETURN_TYPES = ("STRING", "OLLAMA_CHAT", "OLLAMA_META", "STRING",)
+    RETURN_NAMES = ("result", "chat", "meta", "metrics",)
+    FUNCTION = "ollama_chat"
+    CATEGORY = "BlackNightTales/Ollama"
+
+    @staticmethod
+    async def chat_stream(url, on_progress, request):
+        return await OLLAMA_BACKEND.acall(
+            url, lambda client: stream_chat(client, on_progress=on_progress, **request), request['model'])
+
+    @staticmethod
+    def summarize(url, model, keep_alive, history, dropped):
+        response = OLLAMA_BACKEND.chat(url, model=model, messages=history.summary_request(dropped),
+                                       keep_alive=keep_alive)
+        return response['message']['content'].strip()
+
+    def ollama_chat(self, prompt, format, system="", chat=None, connectivity=None, options=None, images=None,
+                    meta=None, stream=False, truncation="window", max_history_tokens=8192, image_format="PNG",
+                    image_quality=90, image_max_side=0, unique_id=None, session_id=""):
+
+        meta = self.resolve_meta(connectivity, options, meta)
+
+        url = meta['connectivity']['url']
+        model = meta['connectivity']['model']
+
+        debug_print = True if meta['options'] is not None and meta['options']['debug'] else False
+
+        request_keep_alive = self.get_keep_alive(meta['connectivity'])
+
+        images_b64 = None
+        encode_time = 0.0
+        if images is not None:
+            started = time.perf_counter()
+            encoder = ImageEncoder(format=image_format, quality=image_quality, max_side=image_max_side)
+            images_b64, _ = encoder.encode_batch(images, as_base64=True)
+            encode_time = time.perf_counter() - started
+
+        if chat is None and session_id:
+            chat = SESSION_STORE.get(session_id, KIND_CHAT)
+        history = (chat or ChatHistory()).with_system(system).append("user", prompt, images=images_b64)
+        dropped = ()
+        if truncation != "none":
+            history, dropped = history.window(max_history_tokens)
+            if dropped and truncation == "summarize":
+                history = history.with_summary(self.summarize(url, model, request_keep_alive, history, dropped))
+
+        request = dict(
+            model=model,
+            messages=history.request_messages(),
+            options=self.get_request_options(meta['options']),
+            keep_alive=request_keep_alive,
+            format='' if format == "text" else format,
+        )
+
+        if debug_print:
+            print(f"""
+--- ollama chat request: 
+
+url: {url}
+model: {model}
+history: {history}
+dropped messages: {len(dropped)}
+options: {request['options']}
+keep alive: {request_keep_alive}
+format: {format}
+---------------------------------------------------------
+""")
+
+        started = time.perf_counter()
+        if stream:
+            response = OLLAMA_BACKEND.run(self.chat_stream(url, self.stream_progress(unique_id), request))
+        else:
+            response = OLLAMA_BACKEND.chat(url, **request)
+        metrics = record_metrics("OllamaChat", url, model, response, time.perf_counter() - started, encode_time)
+
+        if response.get('interrupted'):
+            if model_management is not None:
+                model_management.throw_exception_if_processing_interrupted()
+            raise Exception("Ollama chat stream was interrupted.")
+
+        if debug_print:
+            print("\n--- ollama chat response:")
+            pprint(response)
+            print("---------------------------------------------------------")
+
+        reply = response['message']['content']
+        history = history.append("assistant", reply, tokens=response.get('eval_count'))
+        if session_id:
+            SESSION_STORE.put(session_id, history, KIND_CHAT)
+
+        meta["metrics"] = metrics
+        return reply, history, meta, json.dumps(metrics, indent=2),
+
+
+class OllamaPreload:
+    """
+    Loads models ahead of the generate nodes so the load time overlaps with upstream work.
+    """
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "connectivity": ("OLLAMA_CONNECTIVITY", {"forceInput": False},),
+                "wait": ("BOOLEAN", {"default": True,
+                                     "tooltip": "Wait for the models to load. When disabled the load runs in the background "
+                                                "and the next request on the host queues behind it."}),
+            },
+            "optional": {
+                "models": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Models to preload, one per line. Empty preloads the connectivity model."
+                }),
+            },
+        }
+
+    RETURN_TYPES = ("OLLAMA_CONNECTIVITY", "STRING", "FLOAT",)
+    RETURN_NAMES = ("connectivity", "report", "load_duration",)
+    FUNCTION = "ollama_preload"
+    CATEGORY = "BlackNightTales/Ollama"
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        # Always run, the model may have been unloaded since the last execution.
+        return float("nan")
+
+    def ollama_preload(self, connectivity, wait, models=""):
+        url = connectivity['url']
+        model_list = parse_models(models) or [connectivity['model']]
+        keep_alive = OllamaGenerateV2.get_keep_alive(connectivity)
+
+        future = preload_models(url, model_list, keep_alive)
+        if not wait:
+            return connectivity, f"Preloading {', '.join(model_list)} on {url} in the background.", 0.0,
+
+        results = future.result()
+        report = "\n".join(f"{result['model']}: loaded in {result['load_duration']:.2f}s "
+                           f"({result['elapsed']:.2f}s total)" for result in results)
+        return connectivity, report, sum(result['load_duration'] for result in results),
+
+
+preload_on_startup()
 
 
 NODE_CLASS_MAPPINGS = {
@@ -595,6 +1655,10 @@ NODE_CLASS_MAPPINGS = {
     "BckntOllamaGenerate": OllamaGenerate,
     "BckntOllamaConnectivityV2": OllamaConnectivityV2,
     "BckntOllamaGenerateV2": OllamaGenerateV2,
+    "BckntOllamaGenerateBatch": OllamaGenerateBatch,
+    "BckntOllamaChat": OllamaChat,
+    "BckntOllamaEmbed": OllamaEmbed,
+    "BckntOllamaPreload": OllamaPreload,
     "BckntOllamaSaveContext": OllamaSaveContext,
     "BckntOllamaLoadContext": OllamaLoadContext,
 }
@@ -606,6 +1670,10 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "BckntOllamaOptionsV2": "Ollama Options V2",
     "BckntOllamaConnectivityV2": "Ollama Connectivity V2",
     "BckntOllamaGenerateV2": "Ollama Generate V2",
+    "BckntOllamaGenerateBatch": "Ollama Generate Batch",
+    "BckntOllamaChat": "Ollama Chat",
+    "BckntOllamaEmbed": "Ollama Embed",
+    "BckntOllamaPreload": "Ollama Preload",
     "BckntOllamaSaveContext": "Ollama Save Context",
     "BckntOllamaLoadContext": "Ollama Load Context",
 }
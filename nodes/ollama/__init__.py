@@ -5,6 +5,10 @@ from .CompfyuiOllama import (
     OllamaGenerate,
     OllamaConnectivityV2,
     OllamaGenerateV2,
+    OllamaGenerateBatch,
+    OllamaChat,
+    OllamaEmbed,
+    OllamaPreload,
     OllamaSaveContext,
     OllamaLoadContext,
 )
\ No newline at end of file
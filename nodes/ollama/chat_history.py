@@ -0,0 +1,125 @@
+SUMMARY_PROMPT = ("Summarize the conversation below in a few sentences. Keep names, decisions, facts and open "
+                  "questions that later turns may rely on. Reply with the summary only.")
+
+
+def estimate_tokens(text):
+    """
+    Rough token count of a text, about four characters per token.
+    """
+    return max(1, len(text or "") // 4)
+
+
+class ChatHistory:
+    """
+    Immutable chat history passed between chat nodes as OLLAMA_CHAT.
+
+    Each turn returns a new history sharing the previous messages, so re-running an upstream
+    node never sees turns appended downstream. Messages carry a token estimate (exact for
+    assistant replies) used to truncate the history to a token budget. Older turns are dropped
+    in blocks down to `keep_ratio` of the budget, so the prompt prefix stays identical for
+    several turns and the server can reuse its prompt cache. Dropped turns can be replaced by
+    a running summary, rendered right after the system message.
+    """
+
+    __slots__ = ("system", "messages", "tokens", "summary")
+
+    def __init__(self, system="", messages=(), tokens=(), summary=""):
+        self.system = system or ""
+        self.messages = tuple(messages)
+        self.tokens = tuple(tokens) if tokens else tuple(estimate_tokens(message['content']) for message in self.messages)
+        self.summary = summary or ""
+
+    def _replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return ChatHistory(**values)
+
+    def with_system(self, system):
+        return self if system == self.system else self._replace(system=system)
+
+    def with_summary(self, summary):
+        return self._replace(summary=summary)
+
+    def append(self, role, content, images=None, tokens=None):
+        """
+        Return a new history with one more message.
+        """
+        message = {"role": role, "content": content}
+        if images:
+            message["images"] = list(images)
+        return self._replace(messages=self.messages + (message,),
+                             tokens=self.tokens + (tokens or estimate_tokens(content),))
+
+    @property
+    def total_tokens(self):
+        return estimate_tokens(self.system) + estimate_tokens(self.summary) + sum(self.tokens)
+
+    def request_messages(self):
+        """
+        Messages for `client.chat`: system prompt, summary of dropped turns, then the turns.
+        """
+        prefix = []
+        if self.system:
+            prefix.append({"role": "system", "content": self.system})
+        if self.summary:
+            prefix.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        return prefix + list(self.messages)
+
+    def window(self, max_tokens, keep_ratio=0.5):
+        """
+        Drop the oldest turns once the history exceeds `max_tokens`.
+
+        Returns:
+            tuple: The truncated history and the dropped messages. The latest message is always kept.
+        """
+        if self.total_tokens <= max_tokens or len(self.messages) < 2:
+            return self, ()
+
+        target = max_tokens * keep_ratio
+        total = self.total_tokens
+        start = 0
+        while start < len(self.messages) - 1 and total > target:
+            total -= self.tokens[start]
+            start += 1
+        # Never start on an assistant reply without the message it answers.
+        while start < len(self.messages) - 1 and self.messages[start]['role'] == "assistant":
+            start += 1
+        return (self._replace(messages=self.messages[start:], tokens=self.tokens[start:]), self.messages[:start])
+
+    def summary_request(self, dropped):
+        """
+        Messages asking the model to fold the dropped turns into the running summary.
+        """
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in dropped)
+        if self.summary:
+            transcript = f"Earlier summary: {self.summary}\n{transcript}"
+        return [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}]
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the texts and images of the history.
+        """
+        return (len(self.system) + len(self.summary)
+                + sum(len(message['content']) + sum(len(image) for image in message.get('images', ()))
+                      for message in self.messages))
+
+    def to_dict(self):
+        return {"system": self.system, "messages": list(self.messages), "tokens": list(self.tokens),
+                "summary": self.summary}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("system", ""), data.get("messages", ()), data.get("tokens", ()), data.get("summary", ""))
+
+    def last_reply(self):
+        for message in reversed(self.messages):
+            if message['role'] == "assistant":
+                return message['content']
+        return ""
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __repr__(self):
+        return f"ChatHistory({len(self.messages)} messages, ~{self.total_tokens} tokens)"
@@ -0,0 +1,368 @@
+import asyncio
+import atexit
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+from ollama import AsyncClient, Client, ResponseError
+
+from .host_pool import HOST_POOLS, parse_hosts
+from .metrics import METRICS
+
+# Errors raised before a request reaches the server, safe to retry on another host.
+FAILOVER_ERRORS = (ConnectionError, httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class OllamaClientRegistry:
+    """
+    Process-wide registry of pooled, keep-alive ollama clients.
+
+    Clients are keyed by host, timeout and headers so every node talking to the same
+    server shares one httpx connection pool instead of opening a new one per execution.
+    Async clients are additionally keyed by their event loop, since an httpx async pool
+    can only be used from the loop that created it.
+    Clients that have not been leased for `idle_timeout` seconds are closed and evicted.
+    """
+
+    def __init__(self, max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0, idle_timeout=600.0):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.configure(max_connections=max_connections,
+                       max_keepalive_connections=max_keepalive_connections,
+                       keepalive_expiry=keepalive_expiry,
+                       idle_timeout=idle_timeout)
+
+    def configure(self, max_connections=None, max_keepalive_connections=None, keepalive_expiry=None, idle_timeout=None):
+        """
+        Update pool limits. Only clients created after this call use the new limits.
+        """
+        with self._lock:
+            if max_connections is not None:
+                self.max_connections = max_connections
+            if max_keepalive_connections is not None:
+                self.max_keepalive_connections = max_keepalive_connections
+            if keepalive_expiry is not None:
+                self.keepalive_expiry = keepalive_expiry
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+
+    @staticmethod
+    def _key(loop, url, timeout, headers):
+        return id(loop) if loop is not None else None, url, timeout, tuple(sorted((headers or {}).items()))
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry)
+
+    def _acquire(self, loop, url, timeout, headers):
+        key = self._key(loop, url, timeout, headers)
+        stale = None
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None and entry["loop"] is not loop:
+                # A new loop reused the id of a collected one, its client is unusable here.
+                stale = self._clients.pop(key)
+                entry = None
+            if entry is None:
+                client_class = Client if loop is None else AsyncClient
+                client = client_class(host=url, timeout=timeout, headers=headers, limits=self._limits())
+                entry = {"client": client, "loop": loop, "leases": 0, "last_used": time.monotonic()}
+                self._clients[key] = entry
+            entry["leases"] += 1
+        if stale is not None:
+            self._close_entry(stale)
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry["leases"] -= 1
+            entry["last_used"] = time.monotonic()
+        self.evict_idle()
+
+    @contextmanager
+    def lease(self, url, timeout=None, headers=None):
+        """
+        Borrow the shared client for `url`. Leased clients are never evicted.
+        """
+        entry = self._acquire(None, url, timeout, headers)
+        try:
+            yield entry["client"]
+        finally:
+            self._release(entry)
+
+    @asynccontextmanager
+    async def async_lease(self, url, timeout=None, headers=None):
+        """
+        Borrow the shared async client for `url` on the running event loop.
+        """
+        entry = self._acquire(asyncio.get_running_loop(), url, timeout, headers)
+        try:
+            yield entry["client"]
+        finally:
+            self._release(entry)
+
+    @staticmethod
+    def _close_entry(entry):
+        loop = entry["loop"]
+        if loop is None:
+            entry["client"]._client.close()
+        elif not loop.is_closed():
+            # Async pools must be closed from the loop that owns them.
+            # The coroutine is only created once the loop runs the callback.
+            http_client = entry["client"]._client
+            loop.call_soon_threadsafe(lambda: loop.create_task(http_client.aclose()))
+
+    def evict_idle(self):
+        """
+        Close clients that are not leased and have been idle longer than `idle_timeout`.
+        """
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for key, entry in list(self._clients.items()):
+                if entry["leases"] == 0 and now - entry["last_used"] >= self.idle_timeout:
+                    evicted.append(self._clients.pop(key))
+        for entry in evicted:
+            self._close_entry(entry)
+        return len(evicted)
+
+    def close(self):
+        """
+        Close every pooled client, used on interpreter shutdown.
+        """
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+        for entry in entries:
+            self._close_entry(entry)
+
+    def __len__(self):
+        return len(self._clients)
+
+
+CLIENT_REGISTRY = OllamaClientRegistry()
+atexit.register(CLIENT_REGISTRY.close)
+
+
+def ollama_client(url, timeout=None, headers=None):
+    return CLIENT_REGISTRY.lease(url, timeout=timeout, headers=headers)
+
+
+def ollama_async_client(url, timeout=None, headers=None):
+    return CLIENT_REGISTRY.async_lease(url, timeout=timeout, headers=headers)
+
+
+class HostLimiter:
+    """
+    Request slots of one host. The limit is read on every acquire, so it can change while
+    requests are waiting.
+    """
+
+    def __init__(self, limit):
+        self._limit = limit
+        self.active = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self._limit())
+            self.active += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    async def wake(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+
+class AsyncOllamaBackend:
+    """
+    Runs ollama AsyncClient requests on one shared background event loop.
+
+    Node code stays synchronous: `generate` blocks the calling worker thread, while
+    `submit` returns a future so several requests can be in flight at once. Requests
+    to the same host are capped by `max_concurrency_per_host`, or a per-host limit set with
+    `set_host_limit`, and can be bounded by a timeout. Urls listing several hosts are spread
+    over a HostPool with failover.
+    """
+
+    def __init__(self, max_concurrency_per_host=4, timeout=None):
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._limiters = {}
+        self._host_limits = {}
+
+    def configure(self, max_concurrency_per_host=None, timeout=None):
+        """
+        Update the default per-host limit and timeout, waiting requests see the new limit.
+        """
+        if max_concurrency_per_host is not None:
+            self.max_concurrency_per_host = max_concurrency_per_host
+            self._wake_limiters()
+        if timeout is not None:
+            self.timeout = timeout
+
+    def set_host_limit(self, url, limit=None):
+        """
+        Cap the requests in flight on every host of `url` at `limit`, None restores the default.
+        """
+        with self._lock:
+            for host in {url, *parse_hosts(url)}:
+                if limit:
+                    self._host_limits[host] = limit
+                else:
+                    self._host_limits.pop(host, None)
+        self._wake_limiters()
+
+    def host_limit(self, url):
+        return self._host_limits.get(url, self.max_concurrency_per_host)
+
+    def _wake_limiters(self):
+        loop = self._loop
+        # Limiters of a stopped loop have no waiters to wake and the coroutine would never run.
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return
+
+        async def wake():
+            for limiter in list(self._limiters.values()):
+                await limiter.wake()
+
+        asyncio.run_coroutine_threadsafe(wake(), loop)
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._limiters = {}
+                self._thread = threading.Thread(target=self._loop.run_forever, name="bcknt-ollama-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _limiter(self, url):
+        # Only touched from the backend loop, so no lock is needed.
+        limiter = self._limiters.get(url)
+        if limiter is None:
+            limiter = self._limiters[url] = HostLimiter(lambda: self.host_limit(url))
+        return limiter
+
+    @asynccontextmanager
+    async def session(self, url):
+        """
+        Wait for a free slot on `url`, then lease the pooled async client for it.
+        """
+        async with self._limiter(url):
+            async with ollama_async_client(url) as client:
+                yield client
+
+    async def check_hosts(self, pool):
+        """
+        Probe the pool hosts with stale health information, recording the models they have loaded.
+        """
+        async def check(host):
+            try:
+                async with ollama_async_client(host) as client:
+                    response = await asyncio.wait_for(client.ps(), pool.check_timeout)
+            except (*FAILOVER_ERRORS, asyncio.TimeoutError):
+                pool.mark_failure(host)
+            else:
+                pool.mark_success(host, loaded_models=[entry['model'] for entry in response.get('models') or []])
+
+        await asyncio.gather(*(check(host) for host in pool.claim_checks()))
+
+    async def acall(self, url, call, model=None):
+        """
+        Await `call(client)` on the host behind `url`.
+
+        When `url` lists several hosts they are tried in the pool strategy order, moving
+        on to the next host on connection errors or when a host does not have `model`.
+        """
+        pool = HOST_POOLS.get(url)
+        if len(pool) == 1:
+            try:
+                async with self.session(url) as client:
+                    return await call(client)
+            except Exception as failure:
+                METRICS.record_error(url, model or "", failure)
+                raise
+
+        await self.check_hosts(pool)
+        error = None
+        for host in pool.candidates(model):
+            with pool.track(host):
+                try:
+                    async with self.session(host) as client:
+                        result = await call(client)
+                except FAILOVER_ERRORS as failure:
+                    METRICS.record_error(host, model or "", failure)
+                    pool.mark_failure(host)
+                    error = failure
+                    continue
+                except ResponseError as failure:
+                    METRICS.record_error(host, model or "", failure)
+                    if failure.status_code != 404:
+                        raise
+                    error = failure
+                    continue
+                except Exception as failure:
+                    METRICS.record_error(host, model or "", failure)
+                    raise
+            pool.mark_success(host, model)
+            return result
+        raise ConnectionError(f"No Ollama host in '{url}' could serve the request.") from error
+
+    async def agenerate(self, url, **request):
+        return await self.acall(url, lambda client: asyncio.wait_for(client.generate(**request), self.timeout),
+                                request.get('model'))
+
+    async def achat(self, url, **request):
+        return await self.acall(url, lambda client: asyncio.wait_for(client.chat(**request), self.timeout),
+                                request.get('model'))
+
+    async def aembed(self, url, **request):
+        return await self.acall(url, lambda client: asyncio.wait_for(client.embed(**request), self.timeout),
+                                request.get('model'))
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the backend loop.
+
+        Returns:
+            concurrent.futures.Future: Resolves with the coroutine result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """
+        Run a coroutine on the backend loop and block until it finishes.
+        """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AsyncOllamaBackend.run cannot be called from the backend loop, await the coroutine instead.")
+        return self.submit(coro).result()
+
+    def generate(self, url, **request):
+        return self.run(self.agenerate(url, **request))
+
+    def chat(self, url, **request):
+        return self.run(self.achat(url, **request))
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(loop.stop)
+
+
+OLLAMA_BACKEND = AsyncOllamaBackend(
+    max_concurrency_per_host=int(os.environ.get("BCKNT_OLLAMA_MAX_CONCURRENCY_PER_HOST", 4)))
+atexit.register(OLLAMA_BACKEND.close)
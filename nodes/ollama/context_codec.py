@@ -0,0 +1,146 @@
+import base64
+import struct
+import sys
+import zlib
+from array import array
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Binary layout: magic, version, compression, token count, then little endian int32 tokens.
+MAGIC = b"OCTX"
+VERSION = 1
+HEADER = struct.Struct("<4sBBI")
+STRING_PREFIX = "octx1:"
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+
+def _compress(data, compression):
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data, 1)
+    return data
+
+
+def _decompress(data, compression):
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("Context is zstd compressed but the 'zstandard' package is not installed.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def default_compression():
+    return COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+
+
+class OllamaContext:
+    """
+    Compact, int32 backed token context returned by ollama generate requests.
+
+    Serializes to a versioned binary blob (optionally compressed) and to a short base64
+    string for STRING sockets, while still parsing the legacy comma separated format.
+    """
+
+    __slots__ = ("tokens",)
+
+    def __init__(self, tokens=()):
+        self.tokens = tokens if isinstance(tokens, array) and tokens.typecode == 'i' else array('i', tokens)
+
+    @classmethod
+    def from_any(cls, value):
+        """
+        Build a context from None, an OllamaContext, a token list, bytes or a string.
+
+        Returns:
+            OllamaContext: The parsed context, None when `value` is None or empty.
+        """
+        if value is None or isinstance(value, cls):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return cls.from_bytes(value)
+        if isinstance(value, str):
+            return cls.from_string(value)
+        return cls(value)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, compression, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not an ollama context blob.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported ollama context version {version}.")
+        tokens = array('i')
+        tokens.frombytes(_decompress(bytes(data[HEADER.size:]), compression))
+        if sys.byteorder == "big":
+            tokens.byteswap()
+        if len(tokens) != count:
+            raise ValueError(f"Corrupted ollama context, expected {count} tokens but got {len(tokens)}.")
+        return cls(tokens)
+
+    @classmethod
+    def from_string(cls, text):
+        text = text.strip()
+        if not text:
+            return None
+        if text.startswith(STRING_PREFIX):
+            return cls.from_bytes(base64.b64decode(text[len(STRING_PREFIX):]))
+        # Legacy format: comma separated token ids.
+        return cls(map(int, text.split(',')))
+
+    def to_bytes(self, compression=None):
+        if compression is None:
+            compression = default_compression()
+        tokens = self.tokens
+        if sys.byteorder == "big":
+            tokens = array('i', tokens)
+            tokens.byteswap()
+        return HEADER.pack(MAGIC, VERSION, compression, len(tokens)) + _compress(tokens.tobytes(), compression)
+
+    def to_string(self, compression=None):
+        return STRING_PREFIX + str(base64.b64encode(self.to_bytes(compression)), 'utf-8')
+
+    def to_legacy_string(self):
+        return ','.join(map(str, self.tokens))
+
+    def tolist(self):
+        return self.tokens.tolist()
+
+    def to_numpy(self):
+        return np.frombuffer(self.tokens, dtype=np.int32)
+
+    @property
+    def nbytes(self):
+        return len(self.tokens) * self.tokens.itemsize
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __getitem__(self, index):
+        return self.tokens[index]
+
+    def __eq__(self, other):
+        if isinstance(other, OllamaContext):
+            return self.tokens == other.tokens
+        if isinstance(other, (list, tuple)):
+            return self.tokens.tolist() == list(other)
+        return NotImplemented
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        return f"OllamaContext({len(self.tokens)} tokens)"
@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import threading
+import time
+
+from .context_codec import COMPRESSION_NONE, HEADER, MAGIC, VERSION, OllamaContext
+
+
+class ContextStore:
+    """
+    Indexed SQLite store of named OllamaContext entries.
+
+    Listing and metadata reads never touch the token blobs, and writes are atomic
+    transactions. Legacy PNG contexts found in the store directory are imported once each.
+    """
+
+    def __init__(self, path=None, compression=COMPRESSION_NONE):
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "saved_context", "contexts.sqlite")
+        self.path = path
+        # Uncompressed blobs allow partial loads straight from SQLite.
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._connection = None
+        # Unreadable legacy files by modification time, retried once they change.
+        self._skipped = {}
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS contexts (
+                        name TEXT PRIMARY KEY,
+                        model TEXT NOT NULL DEFAULT '',
+                        token_count INTEGER NOT NULL,
+                        compression INTEGER NOT NULL,
+                        created REAL NOT NULL,
+                        data BLOB NOT NULL
+                    )""")
+                connection.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+                connection.execute("CREATE TABLE IF NOT EXISTS legacy_files (name TEXT PRIMARY KEY)")
+            self._connection = connection
+            self._import_legacy(connection)
+        return self._connection
+
+    def _import_legacy(self, connection):
+        """
+        Import the legacy PNG contexts of the store directory not imported before.
+
+        Imported file names are recorded, so entries deleted later are not brought back. The
+        directory is scanned when the store is opened and each time the names are listed, so
+        PNGs copied in later are picked up. Unreadable files are skipped with a warning and
+        retried once modified.
+        """
+        directory = os.path.dirname(self.path)
+        legacy = [f for f in os.listdir(directory) if f.lower().endswith(".png")]
+        with connection:
+            if connection.execute("SELECT 1 FROM settings WHERE key = 'legacy_imported'").fetchone() is not None:
+                # Stores written by the one-time import: the PNGs present then were already handled.
+                connection.executemany("INSERT OR IGNORE INTO legacy_files (name) VALUES (?)",
+                                       [(file_name,) for file_name in legacy])
+                connection.execute("DELETE FROM settings WHERE key = 'legacy_imported'")
+        seen = {row[0] for row in connection.execute("SELECT name FROM legacy_files").fetchall()}
+        legacy = [file_name for file_name in legacy if file_name not in seen]
+        if not legacy:
+            return
+
+        from PIL import Image
+
+        for file_name in legacy:
+            path = os.path.join(directory, file_name)
+            try:
+                created = os.path.getmtime(path)
+            except OSError:
+                continue
+            if self._skipped.get(file_name) == created:
+                continue
+            try:
+                with Image.open(path) as img:
+                    context = OllamaContext.from_string(img.info.get('context', ''))
+            except Exception as e:
+                print(f"[Ollama Context] skipped legacy context {file_name}: {e}")
+                self._skipped[file_name] = created
+                continue
+            with connection:
+                if context is not None:
+                    self._insert(connection, file_name, context, "", created, replace=False)
+                connection.execute("INSERT OR IGNORE INTO legacy_files (name) VALUES (?)", (file_name,))
+
+    def _insert(self, connection, name, context, model, created, replace=True):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        connection.execute(f"{verb} INTO contexts (name, model, token_count, compression, created, data) VALUES (?, ?, ?, ?, ?, ?)",
+                           (name, model or "", len(context), self.compression, created, context.to_bytes(self.compression)))
+
+    def save(self, name, context, model=""):
+        """
+        Atomically store `context` under `name`, replacing any previous entry.
+        """
+        context = OllamaContext.from_any(context) or OllamaContext()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                self._insert(connection, name, context, model, time.time())
+
+    def names(self):
+        """
+        Names of the stored contexts, read from the index only.
+        """
+        with self._lock:
+            connection = self._connect()
+            self._import_legacy(connection)
+            rows = connection.execute("SELECT name FROM contexts ORDER BY name").fetchall()
+        return [row[0] for row in rows]
+
+    def info(self, name):
+        """
+        Metadata of a stored context without loading its tokens.
+
+        Returns:
+            dict: name, model, token_count and created, or None when missing.
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT name, model, token_count, created FROM contexts WHERE name = ?",
+                                          (name,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("name", "model", "token_count", "created"), row))
+
+    def load(self, name, last_tokens=0):
+        """
+        Load a stored context.
+
+        Args:
+            name (str): The entry name.
+            last_tokens (int): Only load the trailing tokens when greater than 0.
+
+        Returns:
+            OllamaContext: The stored tokens.
+        """
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT token_count, compression FROM contexts WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(f"Context '{name}' not found in {self.path}")
+            token_count, compression = row
+            start = max(token_count - last_tokens, 0) if last_tokens > 0 else 0
+
+            if compression == COMPRESSION_NONE and start > 0:
+                # Read only the tail of the blob and rebuild a header for it.
+                tail = connection.execute("SELECT substr(data, ?) FROM contexts WHERE name = ?",
+                                          (HEADER.size + start * 4 + 1, name)).fetchone()[0]
+                header = HEADER.pack(MAGIC, VERSION, COMPRESSION_NONE, token_count - start)
+                return OllamaContext.from_bytes(header + tail)
+
+            data = connection.execute("SELECT data FROM contexts WHERE name = ?", (name,)).fetchone()[0]
+        context = OllamaContext.from_bytes(data)
+        return OllamaContext(context.tokens[start:]) if start else context
+
+    def delete(self, name):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM contexts WHERE name = ?", (name,))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+CONTEXT_STORE = ContextStore()
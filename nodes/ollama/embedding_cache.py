@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+EMBEDDING_CACHE_MODES = ["enabled", "disabled", "refresh"]
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_CHUNK = 500
+
+
+def embedding_cache_inputs():
+    """
+    Optional node input toggling the on-disk vector cache.
+    """
+    return {
+        "vector_cache": (EMBEDDING_CACHE_MODES, {
+            "default": "enabled",
+            "tooltip": "Reuse stored vectors for texts already embedded with the same model. "
+                       "'refresh' skips the lookup but stores the new vectors.",
+        }),
+    }
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of embedding vectors keyed by model digest and text hash.
+
+    Vectors of a model are appended as little endian float32 rows to one flat file and
+    read back through a memory map, so reloading thousands of vectors costs a single
+    fancy-indexed copy. A SQLite index maps each text hash to its row. Rows are written
+    before they are indexed, and rows left unindexed by a crash are overwritten by the
+    next append.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "embedding_cache")
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._maps = {}
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(self.path, exist_ok=True)
+            connection = sqlite3.connect(os.path.join(self.path, "index.sqlite"), check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS models (
+                        model TEXT PRIMARY KEY,
+                        file TEXT NOT NULL,
+                        dimension INTEGER NOT NULL,
+                        rows INTEGER NOT NULL
+                    )""")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS vectors (
+                        model TEXT NOT NULL,
+                        hash TEXT NOT NULL,
+                        row INTEGER NOT NULL,
+                        PRIMARY KEY (model, hash)
+                    )""")
+            self._connection = connection
+        return self._connection
+
+    def _matrix(self, model, file, dimension, rows):
+        """
+        Memory map of the first `rows` vectors of a model, reopened once more rows are indexed.
+        """
+        cached = self._maps.get(model)
+        if cached is None or cached.shape[0] < rows:
+            cached = np.memmap(os.path.join(self.path, file), dtype='<f4', mode='r', shape=(rows, dimension))
+            self._maps[model] = cached
+        return cached
+
+    def get_many(self, model, hashes):
+        """
+        Look up the vectors of `hashes`.
+
+        Returns:
+            dict: Text hash to float32 vector for the cached entries.
+        """
+        with self._lock:
+            connection = self._connect()
+            info = connection.execute("SELECT file, dimension, rows FROM models WHERE model = ?", (model,)).fetchone()
+            found = {}
+            if info is not None:
+                unique = list(dict.fromkeys(hashes))
+                for start in range(0, len(unique), _LOOKUP_CHUNK):
+                    chunk = unique[start:start + _LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    found.update(connection.execute(
+                        f"SELECT hash, row FROM vectors WHERE model = ? AND hash IN ({placeholders})",
+                        (model, *chunk)).fetchall())
+
+            self.hits += len(found)
+            self.misses += len(set(hashes)) - len(found)
+            if not found:
+                return {}
+            matrix = self._matrix(model, *info)
+            keys = list(found)
+            vectors = np.array(matrix[[found[key] for key in keys]], dtype=np.float32)
+        return dict(zip(keys, vectors))
+
+    def put_many(self, model, hashes, vectors):
+        """
+        Store one vector per hash, replacing the index entries of hashes already stored.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype='<f4')
+        if len(hashes) == 0:
+            return
+        with self._lock:
+            connection = self._connect()
+            info = connection.execute("SELECT file, dimension, rows FROM models WHERE model = ?", (model,)).fetchone()
+            if info is None:
+                info = (hashlib.sha256(model.encode('utf-8')).hexdigest()[:32] + ".f32", vectors.shape[1], 0)
+            file, dimension, rows = info
+            if vectors.shape[1] != dimension:
+                raise ValueError(f"Embedding dimension changed for {model}: {vectors.shape[1]} instead of {dimension}.")
+
+            path = os.path.join(self.path, file)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(rows * dimension * 4)
+                f.write(vectors.tobytes())
+                f.truncate()
+
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO models (model, file, dimension, rows) VALUES (?, ?, ?, ?)",
+                                   (model, file, dimension, rows + len(vectors)))
+                connection.executemany("INSERT OR REPLACE INTO vectors (model, hash, row) VALUES (?, ?, ?)",
+                                       [(model, key, rows + index) for index, key in enumerate(hashes)])
+
+    def clear(self):
+        with self._lock:
+            connection = self._connect()
+            files = [row[0] for row in connection.execute("SELECT file FROM models").fetchall()]
+            with connection:
+                connection.execute("DELETE FROM vectors")
+                connection.execute("DELETE FROM models")
+            self._maps.clear()
+            for file in files:
+                path = os.path.join(self.path, file)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def stats(self):
+        with self._lock:
+            connection = self._connect()
+            entries = connection.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            size = connection.execute("SELECT COALESCE(SUM(rows * dimension * 4), 0) FROM models").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._maps.clear()
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+EMBEDDING_CACHE = EmbeddingCache()
@@ -0,0 +1,173 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+HOST_STRATEGIES = ["model_affinity", "least_outstanding", "round_robin"]
+
+
+def parse_hosts(url):
+    """
+    Split a connectivity url into its hosts. Several hosts can be given separated by commas,
+    semicolons or whitespace, e.g. "http://gpu-1:11434, http://gpu-2:11434".
+    """
+    hosts = []
+    for host in re.split(r"[,;\s]+", url or ""):
+        if host and host not in hosts:
+            hosts.append(host)
+    return hosts
+
+
+class HostState:
+    __slots__ = ("outstanding", "failures", "retry_at", "checked", "models")
+
+    def __init__(self):
+        self.outstanding = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.checked = float("-inf")
+        self.models = set()
+
+
+class HostPool:
+    """
+    Set of interchangeable ollama hosts with health tracking.
+
+    `candidates` orders the hosts for a request according to `strategy`:
+    'round_robin' rotates through them, 'least_outstanding' prefers the host with the fewest
+    requests in flight and 'model_affinity' prefers hosts that already have the model loaded,
+    then the least busy one. Failed hosts are pushed to the back of the order until their
+    exponential backoff expires.
+    """
+
+    def __init__(self, hosts, strategy="model_affinity", check_interval=30.0, check_timeout=2.0,
+                 backoff=1.0, max_backoff=60.0):
+        if not hosts:
+            raise ValueError("A host pool needs at least one host.")
+        if strategy not in HOST_STRATEGIES:
+            raise ValueError(f"Unknown host strategy '{strategy}', expected one of {HOST_STRATEGIES}.")
+        self.hosts = list(hosts)
+        self.strategy = strategy
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._states = {host: HostState() for host in self.hosts}
+        self._turn = 0
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def candidates(self, model=None, rotate=True):
+        """
+        Hosts in the order they should be tried for a request on `model`.
+
+        With `rotate` False the order is only peeked: the rotation does not advance, so the
+        next request still gets the same order.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # Rotating first spreads requests across hosts that tie on the strategy key.
+            offset = self._turn % len(self.hosts)
+            if rotate:
+                self._turn += 1
+            ordered = self.hosts[offset:] + self.hosts[:offset]
+            states = self._states
+            if self.strategy == "least_outstanding":
+                ordered.sort(key=lambda host: states[host].outstanding)
+            elif self.strategy == "model_affinity":
+                ordered.sort(key=lambda host: (model not in states[host].models, states[host].outstanding))
+            available = [host for host in ordered if states[host].retry_at <= now]
+            backing_off = sorted((host for host in ordered if states[host].retry_at > now),
+                                 key=lambda host: states[host].retry_at)
+        return available + backing_off
+
+    @contextmanager
+    def track(self, host):
+        """
+        Count a request as outstanding on `host` while the block runs.
+        """
+        state = self._states[host]
+        with self._lock:
+            state.outstanding += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                state.outstanding -= 1
+
+    def claim_checks(self):
+        """
+        Hosts whose health information is stale. They are marked as checked right away so
+        concurrent requests do not probe the same host twice.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [host for host, state in self._states.items()
+                     if state.retry_at <= now and now - state.checked >= self.check_interval]
+            for host in stale:
+                self._states[host].checked = now
+        return stale
+
+    def mark_success(self, host, model=None, loaded_models=None):
+        with self._lock:
+            state = self._states[host]
+            state.failures = 0
+            state.retry_at = 0.0
+            if loaded_models is not None:
+                state.models = set(loaded_models)
+            if model:
+                state.models.add(model)
+
+    def mark_failure(self, host):
+        with self._lock:
+            state = self._states[host]
+            state.failures += 1
+            state.retry_at = time.monotonic() + min(self.backoff * 2 ** (state.failures - 1), self.max_backoff)
+            state.models = set()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {host: {"outstanding": state.outstanding,
+                           "failures": state.failures,
+                           "healthy": state.retry_at <= now,
+                           "models": sorted(state.models)}
+                    for host, state in self._states.items()}
+
+
+class HostPoolRegistry:
+    """
+    Process-wide host pools keyed by the connectivity url, so every node using the same
+    url shares outstanding counts and health information.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def get(self, url, strategy=None):
+        """
+        Return the pool for `url`, switching it to `strategy` when one is given.
+        """
+        with self._lock:
+            pool = self._pools.get(url)
+            if pool is None:
+                pool = self._pools[url] = HostPool(parse_hosts(url) or [url], strategy or HOST_STRATEGIES[0])
+            elif strategy is not None and strategy != pool.strategy:
+                if strategy not in HOST_STRATEGIES:
+                    raise ValueError(f"Unknown host strategy '{strategy}', expected one of {HOST_STRATEGIES}.")
+                pool.strategy = strategy
+            return pool
+
+    def pools(self):
+        with self._lock:
+            return dict(self._pools)
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+
+HOST_POOLS = HostPoolRegistry()
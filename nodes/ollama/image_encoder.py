@@ -0,0 +1,221 @@
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+IMAGE_FORMATS = ["PNG", "JPEG", "WEBP"]
+
+EncodedBatch = namedtuple("EncodedBatch", ["payloads", "hashes"])
+
+# Pillow releases the GIL while compressing, so frames encode in parallel on threads.
+_ENCODE_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="bcknt-image-encoder")
+
+
+def image_encoder_inputs():
+    """
+    Optional node inputs controlling how IMAGE tensors are encoded before upload.
+    """
+    return {
+        "image_format": (IMAGE_FORMATS, {"default": "PNG", "tooltip": "Encoding used to upload images."}),
+        "image_quality": ("INT", {"default": 90, "min": 1, "max": 100, "step": 1,
+                                  "tooltip": "JPEG/WEBP quality, ignored for PNG."}),
+        "image_max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "step": 8,
+                                   "tooltip": "Downscale images so their longest side fits, 0 keeps the original size."}),
+    }
+
+
+def to_numpy(images):
+    if hasattr(images, "cpu"):
+        images = images.cpu().numpy()
+    return np.asarray(images)
+
+
+def frame_hash(frame):
+    """
+    Fast content hash of a single frame, including its shape and dtype.
+    """
+    frame = np.ascontiguousarray(frame)
+    hasher = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    hasher.update(f"{frame.shape}{frame.dtype}".encode())
+    hasher.update(memoryview(frame).cast("B"))
+    return hasher.hexdigest()
+
+
+class EncodedImageCache:
+    """
+    Thread-safe LRU of encoded image payloads bounded by their total size in bytes.
+
+    Keys combine the frame content hash with the encoder settings, so re-running a
+    workflow with the same input image skips the encode entirely.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = payload
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Hit/miss counters and current size, used to tune `max_bytes`.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+IMAGE_CACHE = EncodedImageCache()
+
+
+def to_uint8(images):
+    """
+    Convert a batch of float images in [0, 1] to uint8 in a single vectorized pass.
+
+    Args:
+        images: IMAGE tensor or numpy array shaped (batch, height, width, channels).
+
+    Returns:
+        np.ndarray: uint8 array with the same shape.
+    """
+    pixels = np.asarray(to_numpy(images), dtype=np.float32) * 255.
+    np.clip(pixels, 0, 255, out=pixels)
+    return pixels.astype(np.uint8)
+
+
+class ImageEncoder:
+    """
+    Encodes IMAGE batches to PNG, JPEG or WEBP bytes, frames in parallel.
+
+    Encoded frames are looked up in `cache` by content hash first, pass `cache=None` to disable it.
+    """
+
+    def __init__(self, format="PNG", quality=90, max_side=0, compress_level=1, cache=IMAGE_CACHE):
+        if format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format '{format}', expected one of {IMAGE_FORMATS}")
+        self.format = format
+        self.quality = quality
+        self.max_side = max_side
+        self.compress_level = compress_level
+        self.cache = cache
+
+    @property
+    def settings(self):
+        return self.format, self.quality, self.max_side, self.compress_level
+
+    def _save_options(self):
+        if self.format == "PNG":
+            return {"compress_level": self.compress_level}
+        return {"quality": self.quality}
+
+    def encode_frame(self, frame):
+        """
+        Encode a single uint8 frame shaped (height, width, channels).
+        """
+        if frame.ndim == 3 and frame.shape[-1] == 1:
+            frame = frame[..., 0]
+        img = Image.fromarray(frame)
+        if self.format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        if self.max_side and max(img.size) > self.max_side:
+            img.thumbnail((self.max_side, self.max_side), Image.Resampling.BILINEAR)
+
+        buffered = BytesIO()
+        img.save(buffered, format=self.format, **self._save_options())
+        return buffered.getvalue()
+
+    def encode_batch(self, images, as_base64=False):
+        """
+        Encode every frame of an IMAGE batch, reusing cached payloads.
+
+        Returns:
+            EncodedBatch: The payloads (bytes, or str when `as_base64`) and frame hashes in batch order.
+        """
+        frames = to_numpy(images)
+        hashes = [frame_hash(frame) for frame in frames]
+        payloads = [None] * len(frames)
+        keys = [(frame_hash_value, self.settings, as_base64) for frame_hash_value in hashes]
+
+        if self.cache is not None:
+            for index, key in enumerate(keys):
+                payloads[index] = self.cache.get(key)
+        missing = [index for index, payload in enumerate(payloads) if payload is None]
+
+        if missing:
+            pixels = to_uint8(frames[missing])
+            if len(pixels) == 1:
+                encoded = [self.encode_frame(pixels[0])]
+            else:
+                encoded = list(_ENCODE_POOL.map(self.encode_frame, pixels))
+            for index, data in zip(missing, encoded):
+                if as_base64:
+                    data = str(base64.b64encode(data), 'utf-8')
+                payloads[index] = data
+                if self.cache is not None:
+                    self.cache.put(keys[index], data)
+
+        return EncodedBatch(payloads, hashes)
+
+    def encode(self, images):
+        """
+        Encode every frame of an IMAGE batch.
+
+        Returns:
+            list[bytes]: The encoded frames in batch order.
+        """
+        return self.encode_batch(images).payloads
+
+    def encode_base64(self, images):
+        """
+        Encode every frame of an IMAGE batch as base64 strings.
+        """
+        return self.encode_batch(images, as_base64=True).payloads
@@ -0,0 +1,271 @@
+import bisect
+import threading
+from collections import deque
+
+# Ollama reports durations in nanoseconds.
+NANOSECONDS = 1e9
+DURATION_KEYS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+COUNT_KEYS = ("prompt_eval_count", "eval_count")
+# Metrics summed by the collector, averages are derived from these totals.
+SUMMED_KEYS = DURATION_KEYS + COUNT_KEYS + ("time_to_first_token", "http_time", "encode_time", "client_overhead",
+                                           "thinking_tokens", "thinking_tokens_saved")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+ENCODE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Histogram name, observed metric and buckets.
+HISTOGRAMS = (
+    ("request_seconds", "http_time", LATENCY_BUCKETS),
+    ("time_to_first_token_seconds", "time_to_first_token", LATENCY_BUCKETS),
+    ("encode_seconds", "encode_time", ENCODE_BUCKETS),
+)
+PREFIX = "bcknt_ollama_"
+
+
+def request_metrics(response, http_time=0.0, encode_time=0.0):
+    """
+    Structured timing and throughput of one generate response.
+
+    Durations are converted to seconds and derived values are added: tokens_per_second and
+    prompt_tokens_per_second, time_to_first_token (measured on streams, otherwise load plus
+    prompt evaluation), http_time (client side time of the whole request), encode_time
+    (image encoding) and client_overhead (encoding plus request time not spent inside ollama).
+    thinking_tokens and thinking_tokens_saved are copied when the response counted them.
+
+    Args:
+        response: The generate response, a dict or an ollama GenerateResponse.
+        http_time (float): Seconds the client waited for the response.
+        encode_time (float): Seconds spent encoding the request images.
+
+    Returns:
+        dict: The request metrics.
+    """
+    get = response.get
+    metrics = {key: (get(key) or 0) / NANOSECONDS for key in DURATION_KEYS}
+    metrics.update({key: get(key) or 0 for key in COUNT_KEYS})
+
+    eval_duration = metrics["eval_duration"]
+    prompt_eval_duration = metrics["prompt_eval_duration"]
+    metrics["tokens_per_second"] = metrics["eval_count"] / eval_duration if eval_duration else 0.0
+    metrics["prompt_tokens_per_second"] = metrics["prompt_eval_count"] / prompt_eval_duration if prompt_eval_duration else 0.0
+
+    time_to_first_token = get('time_to_first_token')
+    if time_to_first_token is None:
+        time_to_first_token = metrics["load_duration"] + prompt_eval_duration
+    metrics["time_to_first_token"] = time_to_first_token
+
+    cached = bool(get('cached'))
+    metrics["http_time"] = http_time
+    metrics["encode_time"] = encode_time
+    # Cached responses never reached ollama, so the whole request is client side work.
+    server_time = 0.0 if cached else metrics["total_duration"]
+    metrics["client_overhead"] = encode_time + max(http_time - server_time, 0.0)
+    metrics["cached"] = cached
+    metrics["thinking_tokens"] = get('thinking_tokens') or 0
+    metrics["thinking_tokens_saved"] = get('thinking_tokens_saved') or 0
+    return metrics
+
+
+class ThinkingBaseline:
+    """
+    Running mean of the thinking tokens per model on requests without a thinking cap, used to
+    estimate the tokens a budget or no-think request saved.
+    """
+
+    def __init__(self, window=50):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def observe(self, model, thinking_tokens):
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window)
+            samples.append(thinking_tokens)
+
+    def mean(self, model):
+        with self._lock:
+            samples = self._samples.get(model)
+            return sum(samples) / len(samples) if samples else None
+
+    def estimate_saved(self, model, thinking_tokens):
+        """
+        Tokens saved compared to the uncapped mean, 0 until an uncapped request was seen.
+        """
+        mean = self.mean(model)
+        return max(round(mean - thinking_tokens), 0) if mean is not None else 0
+
+
+class Histogram:
+    """
+    Cumulative bucket counts in the Prometheus layout, the last bucket is +Inf.
+    """
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for upper, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield upper, total
+
+
+class MetricsCollector:
+    """
+    Thread safe, in-process aggregate of request metrics per node, model and host,
+    with latency histograms and error counters for the Prometheus endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._histograms = {}
+        self._errors = {}
+
+    def record(self, metrics, node="", model="", host=""):
+        key = (node, model, host)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"requests": 0, "cached": 0, **dict.fromkeys(SUMMED_KEYS, 0)}
+                self._histograms[key] = {name: Histogram(buckets) for name, _, buckets in HISTOGRAMS}
+            series["requests"] += 1
+            series["cached"] += int(metrics.get("cached", False))
+            for name in SUMMED_KEYS:
+                series[name] += metrics.get(name) or 0
+            histograms = self._histograms[key]
+            for name, metric, _ in HISTOGRAMS:
+                histograms[name].observe(metrics.get(metric) or 0.0)
+
+    def record_error(self, host="", model="", error=""):
+        """
+        Count a failed request, `error` is the exception or its type name.
+        """
+        if isinstance(error, BaseException):
+            error = type(error).__name__
+        key = (host, model, error)
+        with self._lock:
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    def errors(self):
+        with self._lock:
+            return dict(self._errors)
+
+    def summary(self):
+        """
+        Totals and averages per series.
+
+        Returns:
+            list[dict]: One entry per node, model and host with the summed metrics, the
+                mean of every duration and the overall generation throughput.
+        """
+        with self._lock:
+            items = [(key, dict(series)) for key, series in self._series.items()]
+
+        summary = []
+        for (node, model, host), series in items:
+            requests = series["requests"]
+            entry = {"node": node, "model": model, "host": host, **series}
+            for name in DURATION_KEYS + ("time_to_first_token", "http_time", "encode_time", "client_overhead"):
+                entry["mean_" + name] = series[name] / requests
+            entry["tokens_per_second"] = series["eval_count"] / series["eval_duration"] if series["eval_duration"] else 0.0
+            summary.append(entry)
+        return summary
+
+    def render_prometheus(self, families=()):
+        """
+        Render the collected metrics in the Prometheus text exposition format.
+
+        Args:
+            families: Extra (name, type, help, samples) metric families, where samples is a list
+                of (labels dict, value) pairs, e.g. cache statistics owned by other modules.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            series = [(key, dict(values)) for key, values in self._series.items()]
+            histograms = {key: {name: (list(histogram.cumulative()), histogram.sum)
+                                for name, histogram in values.items()}
+                          for key, values in self._histograms.items()}
+            errors = dict(self._errors)
+
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        def sample(name, labels, value):
+            lines.append(f"{PREFIX}{name}{format_labels(labels)} {format_value(value)}")
+
+        def request_labels(key):
+            return dict(zip(("node", "model", "host"), key))
+
+        counters = (
+            ("requests_total", "requests", "Generate requests by node, model and host."),
+            ("cached_requests_total", "cached", "Requests answered by the response cache."),
+            ("prompt_tokens_total", "prompt_eval_count", "Prompt tokens evaluated."),
+            ("generated_tokens_total", "eval_count", "Tokens generated."),
+            ("load_seconds_total", "load_duration", "Seconds hosts spent loading models."),
+            ("client_overhead_seconds_total", "client_overhead", "Seconds of client side work and transport."),
+            ("thinking_tokens_total", "thinking_tokens", "Tokens generated inside thinking sections."),
+            ("thinking_tokens_saved_total", "thinking_tokens_saved", "Estimated thinking tokens saved by budgets and no-think mode."),
+        )
+        for name, key, help_text in counters:
+            family(name, "counter", help_text)
+            for labels, values in series:
+                sample(name, request_labels(labels), values[key])
+
+        for name, metric, _ in HISTOGRAMS:
+            family(name, "histogram", f"Distribution of the request {metric} in seconds.")
+            for labels, values in histograms.items():
+                buckets, total = values[name]
+                for upper, count in buckets:
+                    sample(name + "_bucket", {**request_labels(labels), "le": format_value(upper)}, count)
+                sample(name + "_sum", request_labels(labels), total)
+                sample(name + "_count", request_labels(labels), buckets[-1][1])
+
+        family("errors_total", "counter", "Failed requests by host, model and error type.")
+        for (host, model, error), count in errors.items():
+            sample("errors_total", {"host": host, "model": model, "error": error}, count)
+
+        for name, kind, help_text, samples in families:
+            family(name, kind, help_text)
+            for labels, value in samples:
+                sample(name, labels, value)
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._histograms.clear()
+            self._errors.clear()
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+METRICS = MetricsCollector()
+THINKING_BASELINE = ThinkingBaseline()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+RESPONSE_CACHE_MODES = ["disabled", "enabled", "refresh"]
+
+# Keys that do not change what the model generates.
+_IGNORED_REQUEST_KEYS = ("images", "keep_alive", "stream")
+
+
+def response_cache_inputs():
+    """
+    Optional node input toggling the persistent response cache.
+    """
+    return {
+        "response_cache": (RESPONSE_CACHE_MODES, {
+            "default": "disabled",
+            "tooltip": "Reuse stored responses for identical requests, only useful with a fixed seed. "
+                       "'refresh' skips the lookup but stores the new response.",
+        }),
+    }
+
+
+class ModelDigests:
+    """
+    Short lived memo of model digests per host, so cache keys change when a model is re-pulled.
+    """
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._digests = {}
+
+    def get(self, client, url, model):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._digests.get(url)
+        if cached is None or cached[0] <= now:
+            models = client.list().get('models', [])
+            digests = {entry['model']: entry['digest'] for entry in models}
+            cached = (now + self.ttl, digests)
+            with self._lock:
+                self._digests[url] = cached
+        return cached[1].get(model, model)
+
+
+MODEL_DIGESTS = ModelDigests()
+
+
+class ResponseCache:
+    """
+    On-disk SQLite cache of generate responses keyed by everything that determines the output.
+
+    Entries expire after `ttl` seconds and the least recently used ones are evicted once
+    the stored responses exceed `max_bytes`.
+    """
+
+    def __init__(self, path=None, max_bytes=512 * 1024 * 1024, ttl=7 * 24 * 3600):
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "response_cache", "responses.sqlite")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def make_key(model_digest, request, image_hashes=None, variant=None):
+        """
+        Hash the model digest, the generate request (without transport settings) and the image hashes.
+        `variant` names a post-processing applied to the stored response, such as stripped thinking.
+        """
+        payload = {k: v for k, v in request.items() if k not in _IGNORED_REQUEST_KEYS}
+        payload["context"] = list(payload["context"]) if payload.get("context") is not None else None
+        payload["model_digest"] = model_digest
+        payload["image_hashes"] = list(image_hashes or [])
+        if variant:
+            payload["variant"] = variant
+        encoded = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                if row is not None:
+                    connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        value = json.dumps(dict(response), default=str)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute("INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                               (key, value, len(value), now, now))
+            self._evict(connection, now)
+
+    def _evict(self, connection, now):
+        connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+RESPONSE_CACHE = ResponseCache()
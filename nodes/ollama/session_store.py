@@ -0,0 +1,240 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .chat_history import ChatHistory
+from .context_codec import OllamaContext
+
+KIND_CONTEXT = "context"
+KIND_CHAT = "chat"
+
+
+def session_inputs():
+    """
+    Optional node input naming the session whose conversation state the node reads and updates.
+    """
+    return {
+        "session_id": ("STRING", {
+            "multiline": False,
+            "default": "",
+            "tooltip": "Keep the conversation state under this id in the process-wide session store, shared by "
+                       "every node using the same id and kept across queue runs. Empty keeps it in the node only.",
+        }),
+    }
+
+
+def encode_value(value):
+    """
+    Serialize a session value for the spill file.
+
+    Returns:
+        tuple: The value kind and its bytes.
+    """
+    if isinstance(value, OllamaContext):
+        return KIND_CONTEXT, value.to_bytes()
+    if isinstance(value, ChatHistory):
+        return KIND_CHAT, json.dumps(value.to_dict()).encode('utf-8')
+    raise TypeError(f"Cannot store {type(value).__name__} in the session store.")
+
+
+def decode_value(kind, data):
+    if kind == KIND_CONTEXT:
+        return OllamaContext.from_bytes(data)
+    if kind == KIND_CHAT:
+        return ChatHistory.from_dict(json.loads(bytes(data).decode('utf-8')))
+    raise ValueError(f"Unknown session value kind '{kind}'.")
+
+
+class SessionStore:
+    """
+    Process-wide LRU of conversation state (contexts and chat histories) keyed by session id.
+
+    Entries stay in memory up to `max_bytes`. The least recently used ones are then spilled
+    to an SQLite file when `spill_path` is set, and moved back to memory on their next
+    access, otherwise they are dropped. The spill file is capped at `max_spill_bytes`,
+    dropping the least recently used sessions. Each session id holds one value per
+    namespace, so a generate context and a chat history can share an id.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, spill_path=None, max_spill_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._connection = None
+
+    def _spill_file(self, create=False):
+        """
+        The spill database, None when spilling is disabled or, unless `create`, nothing was spilled yet.
+        """
+        if self.spill_path is None:
+            return None
+        if self._connection is None and not create and not os.path.exists(self.spill_path):
+            return None
+        return self._connect()
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            connection = sqlite3.connect(self.spill_path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    namespace TEXT NOT NULL,
+                    session TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (namespace, session)
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)")
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _size(value):
+        return value.nbytes
+
+    def get(self, session_id, namespace=KIND_CONTEXT):
+        """
+        The value stored for `session_id`, None when unknown.
+        """
+        key = (namespace, session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            value = self._unspill(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value)
+            return value
+
+    def put(self, session_id, value, namespace=KIND_CONTEXT):
+        """
+        Store `value` for `session_id`, spilling or evicting least recently used sessions.
+        """
+        key = (namespace, session_id)
+        with self._lock:
+            self._discard(key)
+            connection = self._spill_file()
+            if connection is not None:
+                connection.execute("DELETE FROM sessions WHERE namespace = ? AND session = ?", key)
+            if value is not None:
+                self._store(key, value)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _store(self, key, value):
+        size = self._size(value)
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            evicted_key, (evicted, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+            if self.spill_path is not None:
+                self._spill(evicted_key, evicted)
+
+    def _spill(self, key, value):
+        kind, data = encode_value(value)
+        connection = self._spill_file(create=True)
+        connection.execute("INSERT OR REPLACE INTO sessions (namespace, session, kind, size, accessed, data) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", (*key, kind, len(data), time.time(), data))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+        if total <= self.max_spill_bytes:
+            return
+        for namespace, session, size in connection.execute(
+                "SELECT namespace, session, size FROM sessions ORDER BY accessed").fetchall():
+            connection.execute("DELETE FROM sessions WHERE namespace = ? AND session = ?", (namespace, session))
+            total -= size
+            if total <= self.max_spill_bytes:
+                break
+
+    def _unspill(self, key):
+        connection = self._spill_file()
+        if connection is None:
+            return None
+        row = connection.execute("SELECT kind, data FROM sessions WHERE namespace = ? AND session = ?", key).fetchone()
+        if row is None:
+            return None
+        connection.execute("DELETE FROM sessions WHERE namespace = ? AND session = ?", key)
+        return decode_value(*row)
+
+    def delete(self, session_id):
+        """
+        Forget every value of `session_id`.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == session_id]:
+                self._discard(key)
+            connection = self._spill_file()
+            if connection is not None:
+                connection.execute("DELETE FROM sessions WHERE session = ?", (session_id,))
+
+    def sessions(self):
+        """
+        Session ids held in memory or in the spill file.
+        """
+        with self._lock:
+            ids = {key[1] for key in self._entries}
+            connection = self._spill_file()
+            if connection is not None:
+                ids.update(row[0] for row in connection.execute("SELECT DISTINCT session FROM sessions"))
+        return sorted(ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            connection = self._spill_file()
+            if connection is not None:
+                connection.execute("DELETE FROM sessions")
+
+    def stats(self):
+        """
+        Hit/miss counters and the size of both tiers, used to tune `max_bytes`.
+        The disk tier reads as empty until the spill file is opened.
+        """
+        with self._lock:
+            spilled, spilled_bytes = 0, 0
+            if self._connection is not None:
+                spilled, spilled_bytes = self._connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "spilled_entries": spilled,
+                "spilled_bytes": spilled_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+SESSION_STORE = SessionStore(
+    spill_path=os.path.join(os.path.dirname(os.path.realpath(__file__)), "session_store", "sessions.sqlite"))
@@ -1,9 +1,50 @@
+class FrozenDict(dict):
+    """
+    Read-only dict, so composed INPUT_TYPES schemas can be cached and shared safely.
+    Being a dict subclass it still serializes with json like any other schema.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Input type schemas are immutable, copy them with dict() before editing.")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __ior__(self, other):
+        self._readonly()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze_input_types(value):
+    """
+    Recursively freeze the dicts of a schema, including the options dict inside each input spec.
+    """
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze_input_types(v)) for k, v in value.items())
+    if isinstance(value, tuple):
+        return tuple(freeze_input_types(v) for v in value)
+    if isinstance(value, list):
+        # Combo choices are lists in INPUT_TYPES, keep them as lists for ComfyUI.
+        return [freeze_input_types(v) for v in value]
+    return value
+
+
 def merge_input_types(inputTypes: list) -> dict:
     """
-    Merges a list of input types into a single type.
+    Merges a list of input types into a single, immutable type.
     """
     if len(inputTypes) == 1:
-        return inputTypes[0]
+        return freeze_input_types(inputTypes[0])
     
     mergedTypes = {"required": {}, "optional": {}}
     
@@ -13,4 +54,4 @@ def merge_input_types(inputTypes: list) -> dict:
         if "optional" in inputType:
             mergedTypes["optional"].update(inputType["optional"])
     
-    return mergedTypes
\ No newline at end of file
+    return freeze_input_types(mergedTypes)
@@ -0,0 +1,116 @@
+import re
+
+DEFAULT_THINK_TAGS = ("think", "thinking")
+
+
+def parse_tags(tags):
+    """
+    Split a comma or whitespace separated list of tag names, e.g. "think, thinking".
+    """
+    if isinstance(tags, str):
+        tags = re.split(r"[,\s]+", tags)
+    return tuple(tag.strip("<>/ ") for tag in tags if tag.strip("<>/ ")) or DEFAULT_THINK_TAGS
+
+
+class ThinkTagStripper:
+    """
+    Single pass scanner removing reasoning sections such as <think>...</think> from model output.
+
+    `feed` accepts the text in arbitrary chunks (e.g. streamed tokens) and returns only the
+    visible part, so thinking text is dropped as it arrives instead of being buffered. Text
+    before the first tag is held back until that tag is seen: a closing tag first means the
+    opening tag was part of the prompt template, so everything before it is thinking. After
+    that at most a possible partial tag is held back between chunks. An opening tag that is
+    never closed hides everything after it, and stray closing tags are removed.
+    """
+
+    def __init__(self, tags=DEFAULT_THINK_TAGS):
+        self.tags = parse_tags(tags)
+        names = "|".join(re.escape(tag) for tag in sorted(self.tags, key=len, reverse=True))
+        self._pattern = re.compile(rf"<(/?)({names})>")
+        self._tag_texts = tuple(f"<{prefix}{tag}>" for tag in self.tags for prefix in ("", "/"))
+        self._hold = max(len(text) for text in self._tag_texts) - 1
+        self.reset()
+
+    def reset(self):
+        self.inside = None
+        self.dropped = 0
+        # False until the first tag tells whether the leading text is thinking.
+        self.resolved = False
+        self.leading_thinking = False
+        self._head = []
+        self._pending = ""
+
+    def _partial_tag_start(self, buffer, position):
+        start = buffer.rfind("<", max(position, len(buffer) - self._hold))
+        if start != -1 and any(text.startswith(buffer[start:]) for text in self._tag_texts):
+            return start
+        return len(buffer)
+
+    def feed(self, text):
+        """
+        Scan the next chunk and return its visible text.
+        """
+        buffer = self._pending + text
+        visible = []
+        position = 0
+        for match in self._pattern.finditer(buffer):
+            closing, name = match.groups()
+            if not self.resolved:
+                self.resolved = True
+                head = "".join(self._head) + buffer[position:match.start()]
+                self._head = []
+                if closing:
+                    self.leading_thinking = True
+                    self.dropped += len(head)
+                else:
+                    visible.append(head)
+                    self.inside = name
+                position = match.end()
+                continue
+            if self.inside is None:
+                visible.append(buffer[position:match.start()])
+                if not closing:
+                    self.inside = name
+            else:
+                self.dropped += match.start() - position
+                if closing and name == self.inside:
+                    self.inside = None
+            position = match.end()
+
+        end = self._partial_tag_start(buffer, position)
+        if not self.resolved:
+            self._head.append(buffer[position:end])
+        elif self.inside is None:
+            visible.append(buffer[position:end])
+        else:
+            self.dropped += end - position
+        self._pending = buffer[end:]
+        return "".join(visible)
+
+    def close_section(self):
+        """
+        Leave the open thinking section, used when the closing tag is injected into the prompt.
+        """
+        if self.inside is not None:
+            self.dropped += len(self._pending)
+            self._pending = ""
+            self.inside = None
+
+    def flush(self):
+        """
+        Return the text held back at the end of the stream, dropping it inside an unclosed tag.
+        """
+        pending, self._pending = "".join(self._head) + self._pending, ""
+        self._head = []
+        if self.inside is not None:
+            self.dropped += len(pending)
+            return ""
+        return pending
+
+    def strip(self, text):
+        """
+        Remove the thinking sections of a complete response, like feeding it in one chunk.
+        """
+        self.reset()
+        return self.feed(text) + self.flush()
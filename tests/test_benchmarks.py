@@ -0,0 +1,48 @@
+"""Smoke test of the benchmark harness and its mock Ollama server."""
+
+from benchmarks.mock_ollama import MockOllamaServer
+from benchmarks.run import MODEL, random_images, run_benchmarks
+from nodes.ollama import OllamaGenerateV2, OllamaVision
+from nodes.ollama.clients import ollama_client
+
+
+def test_mock_server_speaks_the_ollama_api():
+    """Test generate, streaming and model listing against the mock server with the real client."""
+    with MockOllamaServer(tokens=4, models=(MODEL,)) as server:
+        with ollama_client(server.url) as client:
+            assert [model['model'] for model in client.list()['models']] == [MODEL]
+            response = client.generate(model=MODEL, prompt="hello there")
+            chunks = list(client.generate(model=MODEL, prompt="hello", stream=True))
+
+        assert response['response'] == "token0 token1 token2 token3 "
+        assert response['eval_count'] == 4 and response['prompt_eval_count'] == 2
+        assert "".join(chunk['response'] for chunk in chunks) == response['response']
+        assert chunks[-1]['done']
+
+        result, context, meta, metrics = OllamaGenerateV2().ollama_generate_v2(
+            "system", "prompt", "text", False, stream=True,
+            connectivity={"url": server.url, "model": MODEL, "keep_alive": 5, "keep_alive_unit": "minutes"})
+        assert result == response['response']
+        assert len(context) == 6
+
+
+def test_benchmarks_emit_results_for_every_node():
+    """Test that a minimal benchmark run covers every benchmarked node."""
+    with MockOllamaServer(tokens=2, models=(MODEL,)) as server:
+        results = run_benchmarks(server, batch_sizes=(1,), resolutions=(16,), widths=(2,), repeat=2)
+
+    assert {result["benchmark"] for result in results} == {
+        "OllamaVision", "OllamaGenerateV2", "BaseAgent.run_agent", "MultiNodeExecutor"}
+    assert all(result["wall_seconds"]["min"] > 0 for result in results)
+    # Every case encodes its own images instead of reusing the previous case's.
+    assert all(result["image_cache_hits"] == 0 for result in results)
+    executor = next(result for result in results if result["benchmark"] == "MultiNodeExecutor")
+    assert executor["requests"] == 4
+
+
+def test_mock_server_accepts_full_size_vision_requests():
+    """Test a vision request well above the aiohttp default body limit of 1 MiB."""
+    with MockOllamaServer(tokens=2, models=(MODEL,)) as server:
+        (result,) = OllamaVision().ollama_vision(random_images(2, 1024, 0), "describe", "disable", server.url, MODEL,
+                                                 0, 5, "text")
+    assert result == ["token0 token1 "]
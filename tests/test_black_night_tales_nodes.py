@@ -2,8 +2,11 @@
 
 """Tests for `black_night_tales_nodes` package."""
 
+import threading
+
 import pytest
 from nodes.bcknt import SystemPromptLoader, CleanResponse
+from nodes.bcknt.MultiNodeExecutor import MultiNodeExecutor
 
 
 @pytest.fixture
@@ -58,4 +61,213 @@ def test_clean_respones_return_types(clean_response_node):
     
     assert isinstance(cleaned_response, tuple)
     assert len(cleaned_response) == 1
-    assert isinstance(cleaned_response[0], str)
\ No newline at end of file
+    assert isinstance(cleaned_response[0], str)
+
+class SlowSourceNode:
+    """Test node waiting on a shared barrier, so it only finishes when run concurrently."""
+    barrier = None
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("STRING", {"default": ""})}}
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("value",)
+    FUNCTION = "run"
+
+    def run(self, value):
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        return (value,)
+
+
+class JoinNode:
+    """Test node concatenating two inputs."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"left": ("STRING",), "right": ("STRING",)}}
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("joined",)
+    FUNCTION = "run"
+
+    def run(self, left, right):
+        return (left + right,)
+
+
+def join_configs():
+    return [
+        {
+            'node': JoinNode,
+            'inputs': [('SlowSourceNode', [('value', 'left')]), ('SlowSourceNode_2', [('value', 'right')])],
+        },
+        {'node': SlowSourceNode, 'fixed_kwargs': {'value': 'a'}},
+        {'node': SlowSourceNode, 'fixed_kwargs': {'value': 'b'}},
+    ]
+
+
+def test_executor_runs_independent_nodes_concurrently(monkeypatch):
+    """Test that independent nodes overlap and dependants run after them."""
+    monkeypatch.setattr(SlowSourceNode, "barrier", threading.Barrier(2))
+
+    results = MultiNodeExecutor(join_configs(), max_workers=2).execute_nodes()
+
+    assert results == {'JoinNode': ('ab',), 'SlowSourceNode': ('a',), 'SlowSourceNode_2': ('b',)}
+    assert list(results) == ['JoinNode', 'SlowSourceNode', 'SlowSourceNode_2']
+
+
+def test_executor_sequential_mode_follows_dependencies():
+    """Test that max_workers=1 still runs dependencies first."""
+    executor = MultiNodeExecutor(join_configs(), max_workers=1)
+
+    assert executor.execution_order == ['SlowSourceNode', 'SlowSourceNode_2', 'JoinNode']
+    assert executor.execute_nodes()['JoinNode'] == ('ab',)
+
+
+def test_executor_rejects_dependency_cycles():
+    """Test that circular dependencies are reported."""
+    configs = [
+        {'node': JoinNode, 'alias': 'first', 'inputs': [('second', [('joined', 'left')])]},
+        {'node': JoinNode, 'alias': 'second', 'inputs': [('first', [('joined', 'left')])]},
+    ]
+
+    with pytest.raises(ValueError):
+        MultiNodeExecutor(configs)
+
+
+def test_executor_compiles_input_types_once(monkeypatch):
+    """Test that INPUT_TYPES is only read when the plan is compiled."""
+    calls = []
+    original = JoinNode.INPUT_TYPES.__func__
+
+    def counting_input_types(cls):
+        calls.append(cls)
+        return original(cls)
+
+    monkeypatch.setattr(JoinNode, "INPUT_TYPES", classmethod(counting_input_types))
+    executor = MultiNodeExecutor(join_configs())
+    executor.execute_nodes()
+    executor.execute_nodes()
+
+    assert len(calls) == 1
+    assert executor.plans['JoinNode'].bindings == (('SlowSourceNode', 0, 'left'), ('SlowSourceNode_2', 0, 'right'))
+
+
+def test_executor_reports_invalid_bindings_at_construction():
+    """Test that unknown outputs or inputs fail when the plan is compiled."""
+    with pytest.raises(ValueError):
+        MultiNodeExecutor([
+            {'node': SlowSourceNode},
+            {'node': JoinNode, 'inputs': [('SlowSourceNode', [('missing', 'left')])]},
+        ])
+
+
+def test_agent_input_types_are_cached_until_fine_tune_changes():
+    """Test that the composed agent schema is reused and rebuilt only when fine tune toggles."""
+    from nodes.bcknt import BaseAgent
+
+    first = BaseAgent.INPUT_TYPES()
+    assert BaseAgent.INPUT_TYPES() is first
+    assert 'enable_mirostat' not in first['required']
+
+    BaseAgent.set_fine_tune(True)
+    try:
+        fine_tuned = BaseAgent.INPUT_TYPES()
+        assert fine_tuned is not first
+        assert 'enable_mirostat' in fine_tuned['required']
+    finally:
+        BaseAgent.set_fine_tune(False)
+
+    assert 'system' not in BaseAgent.INPUT_TYPES()['required']
+
+
+def test_merged_input_types_are_immutable():
+    """Test that merged schemas cannot be mutated and still serialize to json."""
+    import json
+    from nodes.utils.merge_input_types import merge_input_types
+
+    merged = merge_input_types([JoinNode.INPUT_TYPES(), SlowSourceNode.INPUT_TYPES()])
+
+    with pytest.raises(TypeError):
+        merged['required']['extra'] = ("STRING",)
+    with pytest.raises(TypeError):
+        merged['required']['value'][1]['default'] = "changed"
+    assert json.loads(json.dumps(merged))['required']['value'] == ["STRING", {"default": ""}]
+
+
+def test_remove_inputs_does_not_mutate():
+    """Test that remove_inputs returns a filtered copy."""
+    inputs = JoinNode.INPUT_TYPES()
+
+    filtered = MultiNodeExecutor.remove_inputs(inputs, ['left'])
+
+    assert 'left' in inputs['required']
+    assert list(filtered['required']) == ['right']
+
+
+def test_prompt_template_renders_in_one_pass():
+    """Test that placeholders are replaced once and unknown ones are kept."""
+    from nodes.bcknt.PromptLoader import PromptTemplate
+
+    template = PromptTemplate("Do [task]. Avoid [negative_prompt]. Keep [unknown].")
+
+    rendered = template.render(task="[negative_prompt] art", negative_prompt=None)
+
+    assert rendered == "Do [negative_prompt] art. Avoid . Keep [unknown]."
+
+
+def test_prompt_loader_reloads_changed_files(tmp_path):
+    """Test that cached prompts are reused until the file changes."""
+    import os
+    from nodes.bcknt.PromptLoader import PromptLoader
+
+    prompt_file = tmp_path / "prompt.txt"
+    prompt_file.write_text("Task: [task]")
+    loader = PromptLoader(str(tmp_path))
+
+    assert loader.run(task="paint") == ('', "Task: paint")
+    assert loader.load_template("prompt") is loader.load_template("prompt")
+
+    prompt_file.write_text("New task: [task]")
+    os.utime(prompt_file, ns=(0, os.stat(prompt_file).st_mtime_ns + 1_000_000))
+
+    assert loader.run(task="paint") == ('', "New task: paint")
+
+
+def test_think_tag_stripper_handles_chunk_boundaries():
+    """Test that streamed chunks give the same result as the whole text, whatever the split."""
+    from nodes.utils.think_tags import ThinkTagStripper
+
+    text = "Intro <think>plan <b> a</think>visible <thinking>more</thinking> end <think >kept"
+    expected = ThinkTagStripper().strip(text)
+    assert expected == "Intro visible  end <think >kept"
+
+    for size in range(1, 12):
+        stripper = ThinkTagStripper()
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert "".join(stripper.feed(chunk) for chunk in chunks) + stripper.flush() == expected
+
+
+def test_think_tag_stripper_unclosed_orphan_and_custom_tags():
+    """Test unclosed opening tags, leading closing tags and configurable tag names."""
+    from nodes.utils.think_tags import ThinkTagStripper
+
+    assert ThinkTagStripper().strip("Answer <think>cut off reasoning") == "Answer "
+    assert ThinkTagStripper().strip("reasoning from the template</think>Answer") == "Answer"
+    for size in range(1, 8):
+        stripper = ThinkTagStripper()
+        text = "reasoning from the template</think>Answer <think>x</think>end"
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        streamed = "".join(stripper.feed(chunk) for chunk in chunks) + stripper.flush()
+        assert streamed == ThinkTagStripper().strip(text) == "Answer end"
+    stripper = ThinkTagStripper()
+    assert stripper.feed("no tags ") + stripper.feed("at all") + stripper.flush() == "no tags at all"
+    assert ThinkTagStripper("reason, scratchpad").strip("<reason>x</reason>A<scratchpad>y</scratchpad>B<think>z</think>") \
+        == "AB<think>z</think>"
+
+    stripper = ThinkTagStripper()
+    stripper.feed("<think>" + "x" * 1000)
+    assert len(stripper._pending) < 16
+    assert stripper.dropped == 1000
+    assert CleanResponse().clean_response("<r>x</r> y", tags="r") == ("y",)
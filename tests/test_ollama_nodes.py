@@ -0,0 +1,1037 @@
+"""Tests for the `nodes.ollama` helpers that do not need a running Ollama server."""
+
+import asyncio
+import base64
+import json
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from nodes.ollama import response_cache as response_cache_module
+from nodes.ollama import context_codec
+from nodes.ollama.context_codec import OllamaContext
+from nodes.ollama.context_store import ContextStore
+from nodes.ollama.response_cache import ResponseCache
+from nodes.ollama.image_encoder import EncodedImageCache, ImageEncoder, to_uint8
+from nodes.ollama.clients import AsyncOllamaBackend, OllamaClientRegistry
+from nodes.ollama.CompfyuiOllama import OllamaModelCache, cached_generate, stream_generate
+
+
+@pytest.fixture
+def client_registry():
+    """Fixture to create an isolated client registry."""
+    registry = OllamaClientRegistry(idle_timeout=60)
+    yield registry
+    registry.close()
+
+
+def test_client_registry_reuses_clients(client_registry):
+    """Test that the same host gets the same pooled client."""
+    with client_registry.lease("http://127.0.0.1:11434") as first:
+        pass
+    with client_registry.lease("http://127.0.0.1:11434") as second:
+        pass
+
+    assert first is second
+    assert len(client_registry) == 1
+
+
+def test_client_registry_replaces_clients_of_a_dead_loop(client_registry, monkeypatch):
+    """Test that a loop reusing the id of a collected loop gets its own client."""
+    # Emulate the id reuse: both loops map to the same key.
+    monkeypatch.setattr(client_registry, "_key", lambda loop, url, timeout, headers: ("loop", url))
+    dead, current = asyncio.new_event_loop(), asyncio.new_event_loop()
+    try:
+        stale = client_registry._acquire(dead, "http://127.0.0.1:11434", None, None)
+        client_registry._release(stale)
+        dead.close()
+        entry = client_registry._acquire(current, "http://127.0.0.1:11434", None, None)
+        client_registry._release(entry)
+
+        assert entry["loop"] is current and entry["client"] is not stale["client"]
+        assert len(client_registry) == 1
+    finally:
+        current.close()
+
+
+def test_client_registry_keys_by_timeout_and_headers(client_registry):
+    """Test that different timeouts or headers get separate clients."""
+    with client_registry.lease("http://127.0.0.1:11434") as default:
+        pass
+    with client_registry.lease("http://127.0.0.1:11434", timeout=5.0) as timed:
+        pass
+    with client_registry.lease("http://127.0.0.1:11434", headers={"x-test": "1"}) as with_headers:
+        pass
+
+    assert len({id(default), id(timed), id(with_headers)}) == 3
+
+
+def test_client_registry_evicts_idle_clients(client_registry):
+    """Test that idle clients are evicted but leased ones are kept."""
+    client_registry.configure(idle_timeout=0)
+
+    with client_registry.lease("http://127.0.0.1:11434"):
+        assert client_registry.evict_idle() == 0
+        assert len(client_registry) == 1
+
+    assert len(client_registry) == 0
+
+
+def test_client_registry_keys_async_clients_by_loop(client_registry):
+    """Test that async clients are pooled per event loop and kept apart from sync ones."""
+    async def lease_twice():
+        async with client_registry.async_lease("http://127.0.0.1:11434") as first:
+            pass
+        async with client_registry.async_lease("http://127.0.0.1:11434") as second:
+            pass
+        return first, second
+
+    first, second = asyncio.run(lease_twice())
+    with client_registry.lease("http://127.0.0.1:11434") as sync_client:
+        pass
+
+    assert first is second
+    assert sync_client is not first
+
+
+class CountingFetch:
+    """Fake model fetcher counting upstream calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, url):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [f"{url}-model"]
+
+
+def test_model_cache_coalesces_concurrent_requests():
+    """Test that concurrent lookups for one url issue a single upstream call."""
+    fetch = CountingFetch()
+    cache = OllamaModelCache(ttl=60, fetch=fetch)
+
+    async def lookup():
+        return await asyncio.gather(*[cache.get("http://host") for _ in range(30)])
+
+    results = asyncio.run(lookup())
+
+    assert fetch.calls == 1
+    assert all(models == ["http://host-model"] for models in results)
+
+
+def test_model_cache_ttl_and_refresh():
+    """Test that cached models are reused until expired or refreshed."""
+    fetch = CountingFetch()
+    cache = OllamaModelCache(ttl=60, fetch=fetch)
+
+    async def lookup():
+        await cache.get("http://host")
+        await cache.get("http://host")
+        await cache.get("http://host", refresh=True)
+        cache.ttl = 0
+        await cache.get("http://other")
+        await cache.get("http://other")
+
+    asyncio.run(lookup())
+
+    assert fetch.calls == 4
+
+
+class FakeStreamClient:
+    """Fake ollama async client yielding one chunk per word."""
+
+    def __init__(self, words):
+        self.words = words
+        self.closed = False
+        self.request = None
+
+    async def generate(self, stream=False, **request):
+        self.request = request
+
+        async def chunks():
+            try:
+                for word in self.words:
+                    yield {"response": word, "done": False}
+                yield {"response": "", "done": True, "context": [1, 2, 3], "eval_count": len(self.words)}
+            finally:
+                self.closed = True
+
+        return chunks()
+
+
+def test_stream_generate_assembles_chunks():
+    """Test that streamed chunks are joined and progress reports every token."""
+    client = FakeStreamClient(["Art ", "is ", "life."])
+    progress = []
+
+    response = asyncio.run(stream_generate(client, on_progress=lambda *args: progress.append(args), is_interrupted=None,
+                                           progress_interval=0, model="m", prompt="What is art?"))
+
+    assert response["response"] == "Art is life."
+    assert response["context"] == [1, 2, 3]
+    assert response["streamed_tokens"] == 3
+    assert response["interrupted"] is False
+    assert "".join(delta for delta, *_ in progress) == "Art is life."
+    assert progress[-1][3] is True
+    assert client.request == {"model": "m", "prompt": "What is art?"}
+
+
+def test_stream_generate_drops_thinking_before_buffering():
+    """Test that a stripper removes thinking chunks from the response and the progress deltas."""
+    from nodes.utils.think_tags import ThinkTagStripper
+
+    client = FakeStreamClient(["<thi", "nk>", "long ", "reasoning", "</th", "ink>", "Answer", "."])
+    progress = []
+
+    response = asyncio.run(stream_generate(client, on_progress=lambda *args: progress.append(args), is_interrupted=None,
+                                           progress_interval=0, stripper=ThinkTagStripper(), model="m", prompt="p"))
+
+    assert response["response"] == "Answer."
+    assert "".join(delta for delta, *_ in progress) == "Answer."
+    assert response["thinking_chars"] == len("long reasoning")
+    assert response["streamed_tokens"] == 8
+
+
+def test_stream_generate_drops_thinking_opened_by_the_template():
+    """Test that text before a leading closing tag is treated as thinking while streaming."""
+    from nodes.utils.think_tags import ThinkTagStripper
+
+    client = FakeStreamClient(["long ", "reasoning", "</th", "ink>", "Answer", "."])
+
+    response = asyncio.run(stream_generate(client, is_interrupted=None, progress_interval=0,
+                                           stripper=ThinkTagStripper(), think_budget=100, model="m", prompt="p"))
+
+    assert response["response"] == "Answer."
+    assert response["thinking_tokens"] == 4
+
+
+def test_stream_generate_stops_on_interrupt():
+    """Test that an interrupted stream is closed early."""
+    client = FakeStreamClient(["a"] * 100)
+    seen = []
+
+    def interrupted():
+        seen.append(True)
+        return len(seen) >= 3
+
+    response = asyncio.run(stream_generate(client, is_interrupted=interrupted, model="m", prompt="p"))
+
+    assert response["interrupted"] is True
+    assert response["streamed_tokens"] == 3
+    assert client.closed
+
+
+def test_async_backend_limits_concurrency_per_host():
+    """Test that the shared loop runs requests concurrently but caps them per host."""
+    backend = AsyncOllamaBackend(max_concurrency_per_host=2)
+    active = {"now": 0, "peak": 0}
+
+    async def request(url):
+        async with backend._limiter(url):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.02)
+            active["now"] -= 1
+            return url
+
+    try:
+        futures = [backend.submit(request("http://host")) for _ in range(6)]
+        assert [future.result(timeout=5) for future in futures] == ["http://host"] * 6
+        assert active["peak"] == 2
+        assert backend.run(request("http://other")) == "http://other"
+
+        # A per host limit overrides the default for every host of the url.
+        backend.set_host_limit("http://host, http://third", 4)
+        assert backend.host_limit("http://third") == 4 and backend.host_limit("http://other") == 2
+        active["peak"] = 0
+        futures = [backend.submit(request("http://host")) for _ in range(8)]
+        assert [future.result(timeout=5) for future in futures] == ["http://host"] * 8
+        assert active["peak"] == 4
+
+        backend.set_host_limit("http://host, http://third")
+        assert backend.host_limit("http://host") == 2
+    finally:
+        backend.close()
+
+
+def test_connectivity_keeps_a_host_limit_set_by_another_node():
+    """Test that a connectivity node left at 0 does not reset the limit of its url."""
+    from nodes.ollama.CompfyuiOllama import OLLAMA_BACKEND, OllamaConnectivityV2
+
+    url = "http://limited-host"
+    node = OllamaConnectivityV2()
+    try:
+        node.ollama_connectivity(url, "model", 5, "minutes", max_requests_per_host=3)
+        node.ollama_connectivity(url, "model", 5, "minutes")
+        assert OLLAMA_BACKEND.host_limit(url) == 3
+    finally:
+        OLLAMA_BACKEND.set_host_limit(url)
+
+
+def test_async_backend_skips_waking_a_stopped_loop():
+    """Test that changing a limit while the backend loop is stopped schedules nothing on it."""
+    backend = AsyncOllamaBackend(max_concurrency_per_host=2)
+    backend._loop = asyncio.new_event_loop()
+    try:
+        backend.set_host_limit("http://host", 3)
+        # Nothing was handed to the loop, so no "coroutine was never awaited" warning on close.
+        assert not backend._loop._ready
+    finally:
+        backend._loop.close()
+        backend._loop = None
+
+
+def test_image_encoder_vectorized_uint8():
+    """Test that the whole batch is converted to uint8 at once."""
+    images = np.array([[[[0.0, 0.5, 1.5]]], [[[-1.0, 1.0, 0.25]]]], dtype=np.float32)
+
+    pixels = to_uint8(images)
+
+    assert pixels.dtype == np.uint8
+    assert pixels.tolist() == [[[[0, 127, 255]]], [[[0, 255, 63]]]]
+
+
+@pytest.mark.parametrize("image_format", ["PNG", "JPEG", "WEBP"])
+def test_image_encoder_formats(image_format):
+    """Test that every frame of a batch is encoded in order in the requested format."""
+    images = np.random.rand(3, 32, 48, 3).astype(np.float32)
+
+    encoded = ImageEncoder(format=image_format, quality=80).encode(images)
+
+    assert len(encoded) == 3
+    for data in encoded:
+        with Image.open(BytesIO(data)) as img:
+            assert img.format == image_format
+            assert img.size == (48, 32)
+
+
+def test_image_encoder_downscales_to_max_side():
+    """Test that frames larger than max_side are downscaled keeping the aspect ratio."""
+    images = np.random.rand(1, 100, 200, 3).astype(np.float32)
+
+    encoded = ImageEncoder(max_side=50).encode_base64(images)
+
+    with Image.open(BytesIO(base64.b64decode(encoded[0]))) as img:
+        assert img.size == (50, 25)
+
+
+def test_image_encoder_cache_skips_repeated_encodes():
+    """Test that the same frames and settings are served from the cache."""
+    cache = EncodedImageCache()
+    images = np.random.rand(2, 16, 16, 3).astype(np.float32)
+    encoder = ImageEncoder(cache=cache)
+
+    first = encoder.encode_batch(images, as_base64=True)
+    second = encoder.encode_batch(images.copy(), as_base64=True)
+    ImageEncoder(format="JPEG", cache=cache).encode(images)
+
+    assert second.payloads == first.payloads
+    assert second.hashes == first.hashes
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 4
+
+
+def test_image_cache_is_bounded_by_bytes():
+    """Test that least recently used payloads are evicted past max_bytes."""
+    cache = EncodedImageCache(max_bytes=10)
+
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.get("a")
+    cache.put("c", b"12345")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 10
+
+
+@pytest.fixture
+def response_cache(tmp_path, monkeypatch):
+    """Fixture to create a response cache in a temporary directory."""
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    monkeypatch.setattr(response_cache_module, "RESPONSE_CACHE", cache)
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.RESPONSE_CACHE", cache)
+    yield cache
+    cache.close()
+
+
+def test_response_cache_key_ignores_transport_settings():
+    """Test that keep_alive and image payloads do not change the key, but image hashes do."""
+    request = {"model": "m", "prompt": "p", "options": {"seed": 1}, "keep_alive": "5m", "images": ["a"]}
+    key = ResponseCache.make_key("sha256:1", request, ["h1"])
+
+    assert key == ResponseCache.make_key("sha256:1", {**request, "keep_alive": "1h", "images": ["b"]}, ["h1"])
+    assert key != ResponseCache.make_key("sha256:1", request, ["h2"])
+    assert key != ResponseCache.make_key("sha256:2", request, ["h1"])
+    assert key != ResponseCache.make_key("sha256:1", {**request, "options": {"seed": 2}}, ["h1"])
+
+
+def test_response_cache_ttl_and_size_eviction(response_cache):
+    """Test that expired entries are dropped and least recently used ones are evicted past max_bytes."""
+    response_cache.put("a", {"response": "x" * 100})
+    response_cache.put("b", {"response": "y" * 100})
+    assert response_cache.get("a") == {"response": "x" * 100}
+
+    response_cache.max_bytes = 250
+    response_cache.put("c", {"response": "z" * 100})
+    assert response_cache.get("b") is None
+    assert response_cache.get("a") is not None
+
+    response_cache.ttl = -1
+    assert response_cache.get("c") is None
+    assert response_cache.stats()["entries"] == 1
+
+
+class FakeDigests:
+    """Fake model digest lookup."""
+
+    def get(self, client, url, model):
+        return "sha256:1"
+
+
+@pytest.mark.parametrize("mode, expected_calls", [("disabled", 2), ("enabled", 1), ("refresh", 2)])
+def test_cached_generate_modes(response_cache, monkeypatch, mode, expected_calls):
+    """Test that only the 'enabled' mode serves repeated requests from the cache."""
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.MODEL_DIGESTS", FakeDigests())
+    calls = []
+
+    def generate():
+        calls.append(True)
+        return {"response": f"answer {len(calls)}", "context": [1, 2]}
+
+    request = {"model": "m", "prompt": "p", "options": {"seed": 1}}
+    first = cached_generate("http://cache-host", request, mode, generate=generate)
+    second = cached_generate("http://cache-host", request, mode, generate=generate)
+
+    assert len(calls) == expected_calls
+    assert second.get("cached", False) == (mode == "enabled")
+    assert first["context"] == second["context"]
+
+
+@pytest.mark.parametrize("compression", [context_codec.COMPRESSION_NONE, context_codec.COMPRESSION_ZLIB])
+def test_context_binary_round_trip(compression):
+    """Test that contexts survive a binary and string round trip."""
+    context = OllamaContext(range(-5, 32000))
+
+    assert OllamaContext.from_bytes(context.to_bytes(compression)) == context
+    assert OllamaContext.from_any(context.to_string(compression)) == context
+    assert context.to_numpy().dtype == np.int32
+    assert len(context.to_string()) < len(context.to_legacy_string())
+
+
+def test_context_parses_legacy_comma_format():
+    """Test that old comma separated contexts are still accepted."""
+    context = OllamaContext.from_any("1, 2,3 ,42")
+
+    assert context == [1, 2, 3, 42]
+    assert context.to_legacy_string() == "1,2,3,42"
+    assert OllamaContext.from_any("") is None
+    assert OllamaContext.from_any(None) is None
+    assert OllamaContext.from_any([7, 8]).tolist() == [7, 8]
+
+
+def test_context_rejects_unknown_versions():
+    """Test that blobs from a future format version are rejected."""
+    data = bytearray(OllamaContext([1, 2]).to_bytes(context_codec.COMPRESSION_NONE))
+    data[4] = context_codec.VERSION + 1
+
+    with pytest.raises(ValueError):
+        OllamaContext.from_bytes(bytes(data))
+
+
+@pytest.fixture
+def context_store(tmp_path):
+    """Fixture to create a context store in a temporary directory."""
+    store = ContextStore(path=str(tmp_path / "contexts.sqlite"))
+    yield store
+    store.close()
+
+
+def test_context_store_save_list_and_load(context_store):
+    """Test that saved contexts are listed with metadata and loaded back."""
+    context_store.save("b", OllamaContext(range(10)), model="mistral")
+    context_store.save("a", [1, 2, 3])
+    context_store.save("a", [4, 5])
+
+    assert context_store.names() == ["a", "b"]
+    assert context_store.info("b")["model"] == "mistral"
+    assert context_store.info("b")["token_count"] == 10
+    assert context_store.load("a") == [4, 5]
+    assert context_store.load("b", last_tokens=3) == [7, 8, 9]
+    assert context_store.load("b", last_tokens=50) == list(range(10))
+
+
+def test_context_store_imports_legacy_png_contexts(tmp_path):
+    """Test that contexts saved as PNG metadata by older versions are imported once."""
+    from PIL.PngImagePlugin import PngInfo
+
+    metadata = PngInfo()
+    metadata.add_text("context", "1,2,3")
+    Image.new('RGB', (1, 1)).save(tmp_path / "old.png", pnginfo=metadata)
+
+    store = ContextStore(path=str(tmp_path / "contexts.sqlite"))
+    try:
+        assert store.names() == ["old.png"]
+        assert store.load("old.png") == [1, 2, 3]
+    finally:
+        store.close()
+
+
+def test_context_store_skips_broken_and_picks_up_new_legacy_pngs(tmp_path):
+    """Test that an unreadable PNG does not break the store and later PNGs are still imported."""
+    from PIL.PngImagePlugin import PngInfo
+
+    def save_png(name, context):
+        metadata = PngInfo()
+        metadata.add_text("context", context)
+        Image.new('RGB', (1, 1)).save(tmp_path / name, pnginfo=metadata)
+
+    (tmp_path / "broken.png").write_bytes(b"not a png")
+    save_png("bad_tokens.png", "1,x")
+    save_png("old.png", "1,2,3")
+
+    store = ContextStore(path=str(tmp_path / "contexts.sqlite"))
+    try:
+        assert store.names() == ["old.png"]
+        store.delete("old.png")
+        save_png("later.png", "4,5")
+        assert store.names() == ["later.png"]
+        assert store.load("later.png") == [4, 5]
+    finally:
+        store.close()
+
+
+def connectivity():
+    return {"url": "http://batch-host", "model": "m", "keep_alive": 5, "keep_alive_unit": "minutes"}
+
+
+def test_generate_batch_parses_prompt_lists():
+    """Test that prompts are split by the chosen mode, the same way for every item of a list."""
+    from nodes.ollama import OllamaGenerateBatch
+
+    assert OllamaGenerateBatch.parse_prompts("a\n\n b \n") == ["a", "b"]
+    assert OllamaGenerateBatch.parse_prompts('["a\\nb", "c"]') == ["a\nb", "c"]
+    assert OllamaGenerateBatch.parse_prompts(["x", "y"]) == ["x", "y"]
+    assert OllamaGenerateBatch.parse_prompts(["a\nb"]) == ["a", "b"]
+    assert OllamaGenerateBatch.parse_prompts(["a\nb", "c"]) == ["a", "b", "c"]
+    # A connected multi-line text stays one text, whether it arrives alone or in a list.
+    assert OllamaGenerateBatch.parse_prompts(["Para one.\nPara two."], "none") == ["Para one.\nPara two."]
+    assert OllamaGenerateBatch.parse_prompts(["a\nb", "c"], "none") == ["a\nb", "c"]
+    assert OllamaGenerateBatch.parse_prompts('["a", "b"]', "lines") == ['["a", "b"]']
+    assert OllamaGenerateBatch.parse_prompts(['["a"]', '["b", "c"]'], "json") == ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        OllamaGenerateBatch.parse_prompts("a\nb", "json")
+
+
+def test_generate_batch_takes_upstream_lists_in_one_run(monkeypatch):
+    """Test the INPUT_IS_LIST call shape: every input is a list and only prompts keeps all its items."""
+    from nodes.ollama import OllamaGenerateBatch
+
+    assert OllamaGenerateBatch.INPUT_IS_LIST is True
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.cached_generate",
+                        lambda url, request, response_cache="disabled": {"response": request["prompt"].upper()})
+
+    results, latencies, meta = OllamaGenerateBatch().ollama_generate_batch(
+        ["system"], ["first caption\nsecond line", "other caption"], ["text"], [2], connectivity=[connectivity()],
+        response_cache=["disabled"], split=["none"])
+
+    assert results == ["FIRST CAPTION\nSECOND LINE", "OTHER CAPTION"]
+    assert meta["connectivity"]["url"] == "http://batch-host"
+
+
+def test_generate_batch_runs_concurrently_and_keeps_order(monkeypatch):
+    """Test that batch prompts overlap and results stay aligned to the input order."""
+    from nodes.ollama import OllamaGenerateBatch
+
+    barrier = threading.Barrier(3)
+    requests = []
+
+    def fake_cached_generate(url, request, response_cache="disabled", image_hashes=None, generate=None):
+        requests.append((url, request))
+        barrier.wait(timeout=5)
+        time.sleep(0.01 * len(request["prompt"]))
+        return {"response": request["prompt"].upper()}
+
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.cached_generate", fake_cached_generate)
+
+    results, latencies, meta = OllamaGenerateBatch().ollama_generate_batch(
+        "system", "ccc\nb\naa", "text", 3, connectivity=connectivity())
+
+    assert results == ["CCC", "B", "AA"]
+    assert len(latencies) == 3
+    assert meta["connectivity"]["url"] == "http://batch-host"
+    assert all(request["keep_alive"] == "5m" and request["format"] == "" for _, request in requests)
+
+
+def test_vision_per_image_mode_keeps_batch_order(monkeypatch):
+    """Test that per image captions are capped in flight and aligned to the batch index."""
+    from nodes.ollama import OllamaVision
+    from nodes.ollama.CompfyuiOllama import OLLAMA_BACKEND
+
+    images = np.stack([np.full((8, 8, 3), index / 4, dtype=np.float32) for index in range(4)])
+    frames = [ImageEncoder(cache=None).encode(images[index:index + 1])[0] for index in range(4)]
+    active = {"now": 0, "peak": 0}
+
+    async def fake_agenerate(url, images=None, **request):
+        index = frames.index(images[0])
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        # Later frames answer first so completion order differs from batch order.
+        await asyncio.sleep(0.01 * (4 - index))
+        active["now"] -= 1
+        return {"response": f"{request['prompt']} {index}"}
+
+    monkeypatch.setattr(OLLAMA_BACKEND, "agenerate", fake_agenerate)
+
+    (descriptions,) = OllamaVision().ollama_vision(
+        images, "frame", "disable", "http://vision-host", "m", 0, 5, "text",
+        mode="per_image", max_concurrency=2)
+
+    assert descriptions == ["frame 0", "frame 1", "frame 2", "frame 3"]
+    assert active["peak"] == 2
+
+
+def test_host_pool_strategies_and_backoff():
+    """Test host ordering per strategy and that failed hosts move to the back until their backoff expires."""
+    from nodes.ollama.host_pool import HostPool, parse_hosts
+
+    hosts = parse_hosts("http://a, http://b;http://c http://a")
+    assert hosts == ["http://a", "http://b", "http://c"]
+
+    round_robin = HostPool(hosts, "round_robin")
+    assert [round_robin.candidates()[0] for _ in range(4)] == ["http://a", "http://b", "http://c", "http://a"]
+    # Peeking shows the next host without moving the rotation past it.
+    assert [round_robin.candidates(rotate=False)[0] for _ in range(2)] == ["http://b", "http://b"]
+    assert round_robin.candidates()[0] == "http://b"
+
+    least = HostPool(hosts, "least_outstanding")
+    with least.track("http://a"), least.track("http://b"):
+        assert least.candidates()[0] == "http://c"
+
+    affinity = HostPool(hosts, "model_affinity", backoff=0.05)
+    affinity.mark_success("http://b", loaded_models=["llama"])
+    assert all(affinity.candidates("llama")[0] == "http://b" for _ in range(3))
+
+    affinity.mark_failure("http://b")
+    assert affinity.candidates("llama")[-1] == "http://b"
+    time.sleep(0.06)
+    assert "http://b" in affinity.candidates("llama")[:2]
+
+
+def test_async_backend_fails_over_between_hosts(monkeypatch):
+    """Test that connection errors move the request to the next host and mark the failed host."""
+    from contextlib import asynccontextmanager
+    from nodes.ollama import clients
+    from nodes.ollama.host_pool import HostPoolRegistry
+
+    calls = []
+
+    class FakeAsyncClient:
+        def __init__(self, host):
+            self.host = host
+
+        async def ps(self):
+            if self.host == "http://down":
+                raise ConnectionError("down")
+            return {"models": [{"model": "m"}] if self.host == "http://loaded" else []}
+
+        async def generate(self, **request):
+            calls.append(self.host)
+            if self.host == "http://flaky":
+                raise ConnectionError("refused")
+            return {"response": self.host}
+
+    @asynccontextmanager
+    async def fake_async_client(url, timeout=None, headers=None):
+        yield FakeAsyncClient(url)
+
+    registry = HostPoolRegistry()
+    monkeypatch.setattr(clients, "HOST_POOLS", registry)
+    monkeypatch.setattr(clients, "ollama_async_client", fake_async_client)
+    backend = AsyncOllamaBackend()
+    try:
+        url = "http://down,http://flaky,http://loaded"
+        assert backend.generate(url, model="m", prompt="p")["response"] == "http://loaded"
+        assert "http://down" not in calls
+
+        registry.get(url, "round_robin")
+        calls.clear()
+        responses = [backend.generate(url, model="m", prompt="p")["response"] for _ in range(3)]
+        assert responses == ["http://loaded"] * 3
+        stats = registry.get(url).stats()
+        assert not stats["http://down"]["healthy"] and not stats["http://flaky"]["healthy"]
+    finally:
+        backend.close()
+
+
+def test_preload_node_loads_models_and_reports_duration(monkeypatch):
+    """Test that the preload node sends empty prompts with the connectivity keep alive."""
+    from nodes.ollama import OllamaPreload
+    from nodes.ollama.CompfyuiOllama import OLLAMA_BACKEND
+
+    requests = []
+
+    async def fake_agenerate(url, **request):
+        requests.append((url, request))
+        return {"load_duration": 1.5e9 if request["model"] == "cold" else 0}
+
+    monkeypatch.setattr(OLLAMA_BACKEND, "agenerate", fake_agenerate)
+    connection = {"url": "http://preload-host", "model": "m", "keep_alive": 2, "keep_alive_unit": "hours"}
+
+    passthrough, report, load_duration = OllamaPreload().ollama_preload(connection, True, "cold\nwarm")
+
+    assert passthrough is connection
+    assert load_duration == pytest.approx(1.5)
+    assert report.splitlines()[0].startswith("cold: loaded in 1.50s")
+    assert [request for _, request in requests] == [
+        {"model": "cold", "prompt": "", "keep_alive": "2h"},
+        {"model": "warm", "prompt": "", "keep_alive": "2h"},
+    ]
+
+    requests.clear()
+    OllamaPreload().ollama_preload(connection, True)
+    assert requests == [("http://preload-host", {"model": "m", "prompt": "", "keep_alive": "2h"})]
+
+
+def test_request_metrics_and_collector():
+    """Test derived throughput, time to first token, client overhead and the aggregated summary."""
+    from nodes.ollama.metrics import MetricsCollector, request_metrics
+
+    response = {"total_duration": 2e9, "load_duration": 0.5e9, "prompt_eval_count": 10, "prompt_eval_duration": 0.25e9,
+                "eval_count": 50, "eval_duration": 1e9}
+    metrics = request_metrics(response, http_time=2.5, encode_time=0.1)
+
+    assert metrics["tokens_per_second"] == pytest.approx(50)
+    assert metrics["prompt_tokens_per_second"] == pytest.approx(40)
+    assert metrics["time_to_first_token"] == pytest.approx(0.75)
+    assert metrics["client_overhead"] == pytest.approx(0.6)
+    assert request_metrics({**response, "time_to_first_token": 0.3})["time_to_first_token"] == 0.3
+    assert request_metrics({**response, "cached": True}, http_time=0.01)["client_overhead"] == pytest.approx(0.01)
+
+    collector = MetricsCollector()
+    collector.record(metrics, node="n", model="m", host="h")
+    collector.record(request_metrics({**response, "cached": True}), node="n", model="m", host="h")
+    (summary,) = collector.summary()
+    assert summary["requests"] == 2 and summary["cached"] == 1 and summary["eval_count"] == 100
+    assert summary["tokens_per_second"] == pytest.approx(50)
+    assert summary["mean_http_time"] == pytest.approx(1.25)
+
+
+def test_generate_v2_outputs_metrics(monkeypatch):
+    """Test that OllamaGenerateV2 returns its request metrics and stores them in the meta."""
+    from nodes.ollama import OllamaGenerateV2
+
+    def fake_cached_generate(url, request, response_cache="disabled", image_hashes=None, generate=None, variant=None):
+        return {"response": "ok", "context": [1, 2], "eval_count": 20, "eval_duration": 0.5e9}
+
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.cached_generate", fake_cached_generate)
+
+    result, context, meta, metrics = OllamaGenerateV2().ollama_generate_v2(
+        "system", "prompt", "text", False, connectivity=connectivity())
+
+    assert result == "ok" and context == [1, 2]
+    assert meta["metrics"]["tokens_per_second"] == pytest.approx(40)
+    assert json.loads(metrics) == meta["metrics"]
+
+
+def test_metrics_endpoint_renders_prometheus_text(monkeypatch):
+    """Test the /ollama/metrics exposition with counters, histograms, errors and cache families."""
+    from nodes.ollama import CompfyuiOllama
+    from nodes.ollama.metrics import MetricsCollector, request_metrics
+
+    collector = MetricsCollector()
+    monkeypatch.setattr(CompfyuiOllama, "METRICS", collector)
+    collector.record(request_metrics({"eval_count": 7, "prompt_eval_count": 3}, http_time=0.3),
+                     node="OllamaGenerateV2", model="m", host='http://h"1')
+    collector.record_error("http://h2", "m", ConnectionError("refused"))
+
+    response = asyncio.run(CompfyuiOllama.metrics_endpoint(None))
+    text = response.body.decode('utf-8')
+
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    labels = 'node="OllamaGenerateV2",model="m",host="http://h\\"1"'
+    assert f"bcknt_ollama_requests_total{{{labels}}} 1" in text
+    assert f"bcknt_ollama_generated_tokens_total{{{labels}}} 7" in text
+    assert f'bcknt_ollama_request_seconds_bucket{{{labels},le="0.25"}} 0' in text
+    assert f'bcknt_ollama_request_seconds_bucket{{{labels},le="0.5"}} 1' in text
+    assert f'bcknt_ollama_request_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert 'bcknt_ollama_errors_total{host="http://h2",model="m",error="ConnectionError"} 1' in text
+    assert "# TYPE bcknt_ollama_response_cache_hits_total counter" in text
+
+
+def generate_v2_on(server, model, **kwargs):
+    from nodes.ollama import OllamaGenerateV2
+
+    connection = {"url": server.url, "model": model, "keep_alive": 5, "keep_alive_unit": "minutes"}
+    result, _, meta, _ = OllamaGenerateV2().ollama_generate_v2("system", "prompt", "text", False,
+                                                                connectivity=connection, **kwargs)
+    return result, meta["metrics"]
+
+
+def test_think_budget_forces_the_answer_and_reports_saved_tokens():
+    """Test the thinking cap against the mock server, including the saved token estimate."""
+    from benchmarks.mock_ollama import MockOllamaServer
+
+    model = "think-budget-model"
+    answer = "".join(f"token{index} " for index in range(5))
+    with MockOllamaServer(tokens=5, thinking_tokens=40, models=(model,)) as server:
+        result, metrics = generate_v2_on(server, model, stream=True, strip_thinking=True)
+        assert result == answer and metrics["thinking_tokens"] == 42
+
+        result, metrics = generate_v2_on(server, model, think_mode="budget", think_budget=10)
+        assert result == answer
+        assert metrics["thinking_tokens"] == 10
+        assert metrics["thinking_tokens_saved"] == 32
+        assert server.requests == 3
+        # The answer is requested with the whole conversation, the reasoning so far is the reply prefill.
+        messages = server.chat_messages[-1]
+        assert [message["role"] for message in messages] == ["system", "user", "assistant"]
+        assert messages[0]["content"] == "system" and messages[1]["content"] == "prompt"
+        prefill = messages[2]["content"]
+        assert prefill.startswith("<think>thought0 ") and prefill.endswith("thought8 \n</think>\n\n")
+
+        result, metrics = generate_v2_on(server, model, think_mode="no_think")
+        assert result == answer and metrics["thinking_tokens_saved"] == 42
+
+
+def test_think_budget_keeps_an_answer_that_fits(monkeypatch):
+    """Test that thinking within the budget costs a single request, even when the answer is longer than the budget."""
+    from benchmarks.mock_ollama import MockOllamaServer
+    from nodes.ollama import CompfyuiOllama
+
+    deltas = []
+    monkeypatch.setattr(CompfyuiOllama.PromptServer.instance, "send_sync",
+                        lambda event, data, sid=None: deltas.append(data["delta"]))
+    model = "think-fits-model"
+    with MockOllamaServer(tokens=4, thinking_tokens=10, models=(model,)) as server:
+        result, metrics = generate_v2_on(server, model, think_mode="budget", think_budget=13, stream=True)
+        assert server.requests == 1 and not server.chat_messages
+
+    answer = "".join(f"token{index} " for index in range(4))
+    assert result == answer and "".join(deltas) == answer
+    assert metrics["eval_count"] == 16
+    assert metrics["thinking_tokens"] == 12 and metrics["thinking_tokens_saved"] == 0
+
+
+def test_think_budget_keeps_the_session_context(monkeypatch):
+    """Test that a capped turn with keep_context still returns and stores a context."""
+    from benchmarks.mock_ollama import MockOllamaServer
+    from nodes.ollama import OllamaGenerateV2
+    from nodes.ollama.session_store import SessionStore
+
+    store = SessionStore()
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.SESSION_STORE", store)
+    model = "think-session-model"
+    with MockOllamaServer(tokens=3, thinking_tokens=20, models=(model,)) as server:
+        connection = {"url": server.url, "model": model, "keep_alive": 5, "keep_alive_unit": "minutes"}
+        node = OllamaGenerateV2()
+        result, context, _, _ = node.ollama_generate_v2("system", "prompt", "text", True, connectivity=connection,
+                                                        think_mode="budget", think_budget=5, session_id="capped")
+        assert not server.chat_messages
+
+    assert result == "".join(f"token{index} " for index in range(3))
+    assert context is not None and len(context) > 0
+    assert store.get("capped") == context
+
+
+def test_think_budget_with_context_asks_to_skip_thinking():
+    """Test that a capped request carrying a context is re-issued with that context instead of rebuilt."""
+    from benchmarks.mock_ollama import MockOllamaServer
+
+    model = "think-context-model"
+    with MockOllamaServer(tokens=4, thinking_tokens=20, models=(model,)) as server:
+        result, metrics = generate_v2_on(server, model, think_mode="budget", think_budget=5, context=[1, 2, 3])
+        assert server.requests == 2 and not server.chat_messages
+
+    assert result == "".join(f"token{index} " for index in range(4))
+    assert metrics["thinking_tokens"] == 5
+
+
+def test_chat_history_appends_without_mutating_and_windows_in_blocks():
+    """Test that turns return new histories and truncation drops whole blocks of old turns."""
+    from nodes.ollama.chat_history import ChatHistory
+
+    base = ChatHistory(system="be brief").append("user", "a" * 40)
+    branch = base.append("assistant", "b" * 40, tokens=10)
+    assert len(base) == 1 and len(branch) == 2
+    assert branch.request_messages()[0] == {"role": "system", "content": "be brief"}
+
+    history = base
+    for turn in range(10):
+        history = history.append("assistant", "reply", tokens=10).append("user", "q" * 40)
+    assert history.total_tokens > 100
+
+    windowed, dropped = history.window(100)
+    assert windowed.total_tokens <= 50 and dropped
+    assert windowed.messages[0]['role'] == "user"
+    assert windowed.messages[-1] == history.messages[-1]
+    # The next turns fit again, so the prefix stays the same and the server cache keeps matching.
+    following = windowed.append("assistant", "reply", tokens=10).append("user", "q" * 40)
+    assert following.window(100) == (following, ())
+
+    summarized = windowed.with_summary("earlier talk")
+    assert summarized.request_messages()[1]['content'].endswith("earlier talk")
+    assert "earlier talk" in summarized.summary_request(dropped)[1]['content']
+
+
+def test_chat_node_sends_only_new_turns_to_the_prompt_cache():
+    """Test multi-turn chat against the mock server, which only evaluates messages past the cached prefix."""
+    from benchmarks.mock_ollama import MockOllamaServer
+    from nodes.ollama import OllamaChat
+
+    model = "chat-model"
+    node = OllamaChat()
+    answer = "".join(f"token{index} " for index in range(3))
+    with MockOllamaServer(tokens=3, models=(model,)) as server:
+        connection = {"url": server.url, "model": model, "keep_alive": 5, "keep_alive_unit": "minutes"}
+        result, chat, _, _ = node.ollama_chat("one two", "text", system="sys", connectivity=connection)
+        assert result == answer and len(chat) == 2
+
+        result, chat, meta, _ = node.ollama_chat("three four five", "text", system="sys", chat=chat,
+                                                 connectivity=connection, stream=True)
+        assert result == answer and len(chat) == 4
+        assert meta["metrics"]["prompt_eval_count"] == 3
+        assert server.chat_prompt_tokens == [3, 3]
+
+        node.ollama_chat("six", "text", system="sys", chat=chat, connectivity=connection, truncation="summarize",
+                         max_history_tokens=256)
+        assert server.requests == 3
+
+        long_prompt = " ".join(["word"] * 300)
+        _, summarized, _, _ = node.ollama_chat(long_prompt, "text", system="sys", chat=chat,
+                                               connectivity=connection, truncation="summarize",
+                                               max_history_tokens=256)
+        assert server.requests == 5
+        assert summarized.summary == answer.strip()
+        assert [message['role'] for message in summarized.messages] == ["user", "assistant"]
+
+
+def test_session_store_spills_least_recently_used_sessions(tmp_path):
+    """Test memory accounting, spill to disk and reload of contexts and chat histories."""
+    from nodes.ollama.chat_history import ChatHistory
+    from nodes.ollama.session_store import KIND_CHAT, SessionStore
+
+    spill_path = tmp_path / "sessions.sqlite"
+    store = SessionStore(max_bytes=1000, spill_path=str(spill_path))
+    try:
+        store.put("a", OllamaContext(range(100)))
+        store.put("b", OllamaContext(range(100)))
+        assert store.get("missing") is None and store.sessions() == ["a", "b"]
+        assert store.stats()["spilled_entries"] == 0
+        # The spill file is only created by the first spill.
+        assert not spill_path.exists()
+        history = ChatHistory(system="sys").append("user", "hello")
+        store.put("a", history, KIND_CHAT)
+        assert store.stats()["bytes"] == 800 + history.nbytes
+
+        store.put("c", OllamaContext(range(100)))
+        assert spill_path.exists()
+        stats = store.stats()
+        assert stats["entries"] == 3 and stats["spilled_entries"] == 1 and stats["bytes"] <= 1000
+        assert store.sessions() == ["a", "b", "c"]
+
+        assert store.get("a") == list(range(100))
+        assert store.get("a", KIND_CHAT).request_messages() == history.request_messages()
+        assert store.get("missing") is None
+        assert store.stats()["misses"] == 2
+
+        store.delete("a")
+        assert store.get("a") is None and store.get("a", KIND_CHAT) is None
+    finally:
+        store.close()
+
+    dropping = SessionStore(max_bytes=500)
+    dropping.put("a", OllamaContext(range(100)))
+    dropping.put("b", OllamaContext(range(100)))
+    assert dropping.get("a") is None and dropping.stats()["evictions"] == 1
+
+
+def test_sessions_survive_new_node_instances(monkeypatch, tmp_path):
+    """Test that keep_context and chat state follow the session id instead of the node object."""
+    from benchmarks.mock_ollama import MockOllamaServer
+    from nodes.ollama import OllamaChat, OllamaGenerateV2
+    from nodes.ollama.session_store import SessionStore
+
+    store = SessionStore()
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.SESSION_STORE", store)
+    model = "session-model"
+    with MockOllamaServer(tokens=2, models=(model,)) as server:
+        connection = {"url": server.url, "model": model, "keep_alive": 5, "keep_alive_unit": "minutes"}
+        _, first, _, _ = OllamaGenerateV2().ollama_generate_v2("s", "p", "text", True, connectivity=connection,
+                                                               session_id="story")
+        _, second, _, _ = OllamaGenerateV2().ollama_generate_v2("s", "p", "text", True, connectivity=connection,
+                                                                session_id="story")
+        assert second.tolist()[:len(first)] == first.tolist() and len(second) > len(first)
+        assert store.get("story") == second
+
+        OllamaChat().ollama_chat("hello", "text", connectivity=connection, session_id="talk")
+        _, chat, _, _ = OllamaChat().ollama_chat("again", "text", connectivity=connection, session_id="talk")
+        assert [message['content'] for message in chat.messages if message['role'] == "user"] == ["hello", "again"]
+        assert server.chat_prompt_tokens[-1] == 1
+
+
+def test_embedding_cache_roundtrip_through_memory_map(tmp_path):
+    """Test that vectors come back from the memory mapped file and later appends extend it."""
+    from nodes.ollama.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(str(tmp_path))
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache.put_many("digest", ["a", "b", "c"], vectors)
+    found = cache.get_many("digest", ["c", "a", "x"])
+    assert set(found) == {"a", "c"}
+    np.testing.assert_array_equal(found["c"], vectors[2])
+
+    cache.put_many("digest", ["d"], np.ones((1, 4), dtype=np.float32))
+    np.testing.assert_array_equal(cache.get_many("digest", ["d"])["d"], np.ones(4))
+    assert cache.get_many("other", ["a"]) == {}
+    with pytest.raises(ValueError):
+        cache.put_many("digest", ["e"], np.ones((1, 3)))
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path))
+    np.testing.assert_array_equal(reopened.get_many("digest", ["b"])["b"], vectors[1])
+    assert reopened.stats()["entries"] == 4
+    reopened.close()
+
+
+def test_embed_node_batches_and_reuses_cached_vectors(monkeypatch, tmp_path):
+    """Test that the embed node dedups texts, batches requests and skips cached texts."""
+    from benchmarks.mock_ollama import MockOllamaServer
+    from nodes.ollama import OllamaEmbed
+    from nodes.ollama.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(str(tmp_path))
+    monkeypatch.setattr("nodes.ollama.CompfyuiOllama.EMBEDDING_CACHE", cache)
+    model = "embed-model"
+    texts = [f"text {index}" for index in range(10)]
+    with MockOllamaServer(models=(model,)) as server:
+        connection = {"url": server.url, "model": model, "keep_alive": 5, "keep_alive_unit": "minutes"}
+        node = OllamaEmbed()
+        embeddings, meta, _ = node.ollama_embed(json.dumps(texts + texts[:3]), 4, connectivity=connection)
+        assert embeddings.dtype == np.float32 and embeddings.shape == (13, 8)
+        np.testing.assert_array_equal(embeddings[10:], embeddings[:3])
+        assert sorted(server.embed_batches) == [2, 4, 4]
+        assert meta["metrics"]["embed_requests"] == 3
+
+        more, meta, _ = node.ollama_embed("\n".join(texts[5:] + ["new text"]), 4, connectivity=connection)
+        np.testing.assert_array_equal(more[:5], embeddings[5:10])
+        assert server.embed_batches[-1] == 1
+        assert meta["metrics"]["cached_vectors"] == 5
+
+        node.ollama_embed("text 0", 4, connectivity=connection, vector_cache="disabled")
+        assert server.embed_batches[-1] == 1 and len(server.embed_batches) == 5
+
+        # Called by ComfyUI with INPUT_IS_LIST, an upstream list arrives whole.
+        listed, _, _ = node.ollama_embed(texts[:3], [4], connectivity=[connection], vector_cache=["enabled"])
+        np.testing.assert_array_equal(listed, embeddings[:3])
+
+        # With split 'none' a single connected multi-line text is embedded whole.
+        whole, meta, _ = node.ollama_embed(["text 0\ntext 1"], [4], connectivity=[connection], split=["none"])
+        assert whole.shape == (1, 8) and meta["metrics"]["texts"] == 1
+    cache.close()
@@ -1,7 +1,62 @@
 import { app } from '/scripts/app.js';
+import { api } from '/scripts/api.js';
+import { ComfyWidgets } from '/scripts/widgets.js';
+
+const STREAM_EVENT = 'bcknt.ollama.stream';
+
+const getStreamWidget = (node) => {
+    if (!node.streamWidget) {
+        node.streamWidget = ComfyWidgets['STRING'](node, 'stream_preview', ['STRING', { multiline: true }], app).widget;
+        node.streamWidget.inputEl.readOnly = true;
+        node.streamWidget.serialize = false;
+    }
+    return node.streamWidget;
+};
+
+// Draws the stream throughput at the right of the title bar, leaving the saved title untouched.
+const showStreamStatus = (node, status) => {
+    node.streamStatus = status;
+    if (node.streamStatusDrawn) {
+        return;
+    }
+    node.streamStatusDrawn = true;
+    const originalDrawForeground = node.onDrawForeground;
+    node.onDrawForeground = function (ctx) {
+        if (originalDrawForeground) {
+            originalDrawForeground.apply(this, arguments);
+        }
+        if (!this.streamStatus || this.flags?.collapsed) {
+            return;
+        }
+        const titleHeight = window.LiteGraph?.NODE_TITLE_HEIGHT ?? 30;
+        ctx.save();
+        ctx.font = '12px sans-serif';
+        ctx.fillStyle = '#8c8';
+        ctx.textAlign = 'right';
+        ctx.fillText(this.streamStatus, this.size[0] - 8, -titleHeight / 2 + 4);
+        ctx.restore();
+    };
+};
 
 app.registerExtension({
     name: 'Comfy.OllamaNode.Bcknt',
+    async setup() {
+        api.addEventListener(STREAM_EVENT, ({ detail }) => {
+            const node = app.graph.getNodeById(detail.node);
+            if (!node) {
+                return;
+            }
+            const widget = getStreamWidget(node);
+            if (node.streamDone !== false) {
+                // first event of a new generation.
+                widget.value = '';
+            }
+            widget.value += detail.delta;
+            node.streamDone = detail.done;
+            showStreamStatus(node, `${detail.tokens_per_second} tok/s`);
+            app.graph.setDirtyCanvas(true, false);
+        });
+    },
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
         if (
             [
@@ -21,7 +76,7 @@ app.registerExtension({
                 const urlWidget = this.widgets.find((w) => w.name === 'url');
                 const modelWidget = this.widgets.find((w) => w.name === 'model');
 
-                const fetchModels = async (url) => {
+                const fetchModels = async (url, refresh = false) => {
                     try {
                         const response = await fetch('/ollama/get_models', {
                             method: 'POST',
@@ -29,7 +84,8 @@ app.registerExtension({
                                 'Content-Type': 'application/json'
                             },
                             body: JSON.stringify({
-                                url
+                                url,
+                                refresh
                             })
                         });
 
@@ -47,13 +103,13 @@ app.registerExtension({
                     }
                 };
 
-                const updateModels = async () => {
+                const updateModels = async (refresh = false) => {
                     const url = urlWidget.value;
                     const prevValue = modelWidget.value;
                     modelWidget.value = '';
                     modelWidget.options.values = [];
 
-                    const models = await fetchModels(url);
+                    const models = await fetchModels(url, refresh);
 
                     // Update modelWidget options and value
                     modelWidget.options.values = models;
@@ -68,7 +124,8 @@ app.registerExtension({
                     console.debug('Updated modelWidget.value:', modelWidget.value);
                 };
 
-                urlWidget.callback = updateModels;
+                // an explicit url change bypasses the server side model cache.
+                urlWidget.callback = () => updateModels(true);
 
                 const dummy = async () => {
                     // calling async method will update the widgets with actual value from the browser and not the default from Node definition.